@@ -1,27 +1,45 @@
 # admin.py
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, Response
 from flask_login import login_required, current_user
-from sqlalchemy import func, desc, or_
-from collections import Counter, defaultdict
+from sqlalchemy import func, desc
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
 import re
+import logging
+import threading
 
 from models import (
     SessionLocal,
+    ReadSessionLocal,
     Conversation,
     Message,
     User,
     Role,
     user_roles,
-    Patient,
     create_patient,
-    get_next_global_patient_identifier,
+    allocate_patient,
     delete_conversation_by_id,
+    get_conversation_messages_page,
+    iter_conversation_messages,
+    MESSAGE_PAGE_MAX,
+    message_writer_metrics,
+    read_admin_summary,
+    reconcile_admin_counters,
+    symptom_tallies,
+    symptom_backfill_pending,
+    db_pool_metrics,
+    patient_ordinals,
 )
 
+from disease_likelihoods import get_likelihoods, refresh_likelihoods
+
 # Optional: FAISS-driven disease likelihoods
 from medical_case_faiss import MedicalCaseFAISS
+from stt_gemini import get_stt_metrics, stt_metrics_snapshot
+from live_state import live_state_metrics
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+logger = logging.getLogger(__name__)
 
 # --------------------------
 # Auth guards
@@ -70,38 +88,6 @@ def _safe_text(m: Message) -> str:
     msg = getattr(m, "message", "") or ""
     return TAG_RE.sub("", msg)
 
-# Counter-based symptom extraction for tallies/graphs
-SYMPTOM_LEXICON = [
-    "fever","cough","wheezing","shortness of breath","breathlessness","chest pain","headache",
-    "nausea","vomiting","fatigue","dizziness","joint pain","swelling","stiffness","back pain",
-    "sore throat","runny nose","rash","abdominal pain","diarrhea","constipation","weight loss",
-    "night sweats","palpitations","fainting","tingling","numbness","weakness","pain"
-]
-CANON = {s: s for s in SYMPTOM_LEXICON}
-CANON.update({
-    "sob": "shortness of breath",
-    "dyspnea": "shortness of breath",
-    "tiredness": "fatigue",
-    "lightheadedness": "dizziness",
-    "chest tightness": "chest pain",
-    "loose stools": "diarrhea",
-    "constipated": "constipation",
-    "weightloss": "weight loss",
-})
-
-def extract_symptoms(text: str) -> Counter:
-    t = " " + (text or "").lower() + " "
-    counts = Counter()
-    # phrase-first to catch multi-word entries
-    for phrase in sorted(CANON.keys(), key=len, reverse=True):
-        pattern = r'\b' + re.escape(phrase) + r'\b'
-        hits = re.findall(pattern, t)
-        if hits:
-            counts[CANON[phrase]] += len(hits)
-            # remove to avoid double-counting overlaps
-            t = re.sub(pattern, " ", t)
-    return counts
-
 # Lazy FAISS loader for disease likelihoods
 _faiss = None
 def get_faiss():
@@ -123,72 +109,34 @@ def summary():
     if not _require_admin():
         return admin_guard()
 
-    db = SessionLocal()
-    try:
-        total_users = db.query(User).count()
-        clinicians = (
-            db.query(User)
-              .join(user_roles, user_roles.c.user_id == User.id)
-              .join(Role, Role.id == user_roles.c.role_id)
-              .filter(Role.name == "clinician")
-              .count()
-        )
-        admins = (
-            db.query(User)
-              .join(user_roles, user_roles.c.user_id == User.id)
-              .join(Role, Role.id == user_roles.c.role_id)
-              .filter(Role.name == "admin")
-              .count()
-        )
-        total_convos = db.query(Conversation).count()
-        total_messages = db.query(Message).count()
-        patient_msgs = db.query(Message).filter(Message.role == "patient").count()
-        clinician_msgs = db.query(Message).filter(Message.role == "clinician").count()
-        rec_questions = db.query(Message).filter(Message.type == "question_recommender").count()
-
-        # Conversations per day (last 30 rows by date asc)
-        convs_per_day = (
-            db.query(func.date(Conversation.created_at), func.count(Conversation.id))
-              .group_by(func.date(Conversation.created_at))
-              .order_by(func.date(Conversation.created_at))
-              .limit(30)
-              .all()
-        )
-
-        # Top clinicians by # of conversations (Conversation.owner_user_id, not ConversationOwner)
-        top_clinician_rows = (
-            db.query(User, func.count(Conversation.id).label("cnt"))
-              .join(user_roles, user_roles.c.user_id == User.id)
-              .join(Role, Role.id == user_roles.c.role_id)
-              .filter(Role.name == "clinician")
-              .outerjoin(Conversation, Conversation.owner_user_id == User.id)
-              .group_by(User.id, User.email, User.username)
-              .order_by(desc(func.count(Conversation.id)))
-              .limit(10)
-              .all()
-        )
-        top_clinicians = [
-            {"display_name": _user_display_name(u), "count": c}
-            for u, c in top_clinician_rows
-        ]
-
-        return jsonify({
-            "ok": True,
-            "users": {"total": total_users, "clinicians": clinicians, "admins": admins},
-            "conversations": {"total": total_convos},
-            "messages": {
-                "total": total_messages,
-                "patient": patient_msgs,
-                "clinician": clinician_msgs,
-                "recommended": rec_questions
-            },
-            "series": {
-                "conversations_per_day": [[str(d), c] for d, c in convs_per_day],
-                "top_clinicians": top_clinicians,
-            }
-        })
-    finally:
-        db.close()
+    # Precomputed rollups (models "Admin dashboard counters"), one query.
+    agg = read_admin_summary()
+    c = agg["counters"]
+    reconciled_at = agg["reconciled_at"]
+    return jsonify({
+        "ok": True,
+        "users": {"total": c["users"], "clinicians": c["clinicians"], "admins": c["admins"]},
+        "conversations": {"total": c["conversations"]},
+        "messages": {
+            "total": c["messages"],
+            "patient": c["messages_patient"],
+            "clinician": c["messages_clinician"],
+            "recommended": c["messages_recommended"]
+        },
+        "series": {
+            "conversations_per_day": [[d, n] for d, n in agg["per_day"]],
+            "top_clinicians": [
+                {"display_name": _user_display_name(u), "count": u.value}
+                for u in agg["top_clinicians"]
+            ],
+        },
+        "as_of": {
+            # Counters are exact when maintained incrementally; otherwise
+            # they are as fresh as the last reconciliation.
+            "incremental": agg["incremental"],
+            "reconciled_at": reconciled_at.isoformat() if reconciled_at else None,
+        },
+    })
 
 # --------------------------
 # List clinicians (with conversation counts)
@@ -199,7 +147,7 @@ def clinicians():
     if not _require_admin():
         return admin_guard()
 
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         # Count conversations by Conversation.owner_user_id (not ConversationOwner table)
         rows = (
@@ -234,7 +182,7 @@ def conversations():
     clinician_id = request.args.get("clinician_id", type=int)
     offset = (page - 1) * size
 
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         q = db.query(Conversation)
         if clinician_id is not None:
@@ -271,19 +219,13 @@ def conversations():
             .all()
         )
 
-        # Build per-clinician patient label maps so admin sees Patient 1, Patient 2, ...
+        # Per-clinician "Patient N" labels for every owner on the page, one query
         owner_ids = {owner_id for (_cid, _created, _email, _username, owner_id, _pid, _mc) in rows if owner_id}
-        patient_labels_by_owner: dict[int, dict[int, str]] = {}
-        for oid in owner_ids:
-            patients = (
-                db.query(Patient)
-                  .filter(Patient.clinician_id == oid)
-                  .order_by(Patient.id.asc())
-                  .all()
-            )
-            patient_labels_by_owner[oid] = {
-                p.id: f"Patient {i + 1}" for i, p in enumerate(patients)
-            }
+        page_patient_ids = [pid for (_cid, _created, _email, _username, _oid, pid, _mc) in rows if pid]
+        patient_labels_by_owner = {
+            oid: {pid: f"Patient {n}" for pid, n in ordinals.items()}
+            for oid, ordinals in patient_ordinals(owner_ids, page_patient_ids).items()
+        }
 
         convs = []
         for (cid, created, email, username, owner_id, patient_id, msg_count) in rows:
@@ -332,7 +274,7 @@ def list_users():
     if not _require_admin():
         return admin_guard()
 
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         users = db.query(User).order_by(User.id.desc()).all()
         result = []
@@ -475,7 +417,7 @@ def list_roles():
     if not _require_admin():
         return admin_guard()
 
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         roles = db.query(Role).all()
         return jsonify({
@@ -487,7 +429,7 @@ def list_roles():
 
 
 # --------------------------
-# Admin: create patient (identifier continues from latest in DB)
+# Admin: create patient (identifier allocated from the patient sequence)
 # --------------------------
 @admin_bp.post("/api/patients")
 @login_required
@@ -503,11 +445,15 @@ def admin_create_patient():
         clinician_id = int(clinician_id)
     except (TypeError, ValueError):
         return jsonify({"ok": False, "error": "clinician_id must be an integer"}), 400
-    identifier = (data.get("identifier") or "").strip()
-    if not identifier:
-        identifier = get_next_global_patient_identifier()
+    identifier = (data.get("identifier") or "").strip() or None
     display_name = (data.get("display_name") or "").strip() or None
-    pid = create_patient(identifier=identifier, clinician_id=clinician_id, display_name=display_name)
+    try:
+        if identifier is None:
+            pid, identifier = allocate_patient(clinician_id, display_name)
+        else:
+            pid = create_patient(identifier=identifier, clinician_id=clinician_id, display_name=display_name)
+    except IntegrityError:
+        return jsonify({"ok": False, "error": "identifier already in use"}), 409
     return jsonify({"ok": True, "patient_id": pid, "identifier": identifier})
 
 
@@ -520,36 +466,44 @@ def conversation_detail(cid):
     if not _require_admin():
         return admin_guard()
 
-    db = SessionLocal()
-    try:
-        msgs = (
-            db.query(Message)
-              .filter(Message.conversation_id == cid)
-              .order_by(Message.created_at.asc())
-              .all()
-        )
-
-        out_msgs, recos = [], []
-        for m in msgs:
-            text = _safe_text(m)
-            out_msgs.append({
+    # ?limit=&after=<cursor> reads the transcript forward one keyset page at a
+    # time (next_cursor continues); without limit the whole transcript is
+    # returned, still fetched page by page rather than in one query.
+    after = request.args.get("after") or None
+    next_cursor = None
+    if "limit" in request.args or after:
+        try:
+            limit = max(1, min(int(request.args.get("limit", MESSAGE_PAGE_MAX)), MESSAGE_PAGE_MAX))
+            msgs, next_cursor = get_conversation_messages_page(cid, limit=limit, after=after, from_start=True)
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid cursor or limit"}), 400
+    else:
+        msgs = iter_conversation_messages(cid)
+
+    out_msgs, recos = [], []
+    for m in msgs:
+        text = _safe_text(m)
+        out_msgs.append({
+            "id": m.id,
+            "role": m.role,
+            "type": m.type,
+            "text": text,
+            "timestamp": m.timestamp,
+            "created_at": m.created_at.isoformat(),
+        })
+        if (m.type == "question_recommender") or (m.role == "Question Recommender"):
+            recos.append({
                 "id": m.id,
-                "role": m.role,
-                "type": m.type,
-                "text": text,
-                "timestamp": m.timestamp,
-                "created_at": m.created_at.isoformat(),
+                "question": text,
+                "symptom": _extract_symptom(text)
             })
-            if (m.type == "question_recommender") or (m.role == "Question Recommender"):
-                recos.append({
-                    "id": m.id,
-                    "question": text,
-                    "symptom": _extract_symptom(text)
-                })
-
-        return jsonify({"ok": True, "messages": out_msgs, "recommended_questions": recos})
-    finally:
-        db.close()
+
+    return jsonify({
+        "ok": True,
+        "messages": out_msgs,
+        "recommended_questions": recos,
+        "next_cursor": next_cursor,
+    })
 
 # --------------------------
 # Symptom tallies (global + per-conversation)
@@ -560,76 +514,44 @@ def symptoms_api():
     if not _require_admin():
         return admin_guard()
 
-    db = SessionLocal()
+    # Counts come from message_symptoms (tagged when messages are logged);
+    # ?from=&to= (YYYY-MM-DD, inclusive), ?clinician_id=, ?page=&size=.
     try:
-        # Pull all conversations + owners in one pass (display name, no email)
-        convo_rows = (
-            db.query(
-                Conversation.id,
-                Conversation.created_at,
-                User.email,
-                User.username,
-                Conversation.owner_user_id,
-            )
-            .outerjoin(User, User.id == Conversation.owner_user_id)
-            .order_by(Conversation.created_at.desc())
-            .all()
-        )
-        conv_ids = [cid for (cid, _created, _email, _un, _uid) in convo_rows]
-
-        def _display(e, un, uid):
-            return (un or "").strip() or ((e.split("@")[0] if e else "User")) if (e or un) else (str(uid) if uid is not None else "—")
-
-        owner_map = {
-            cid: {
-                "display_name": _display(email, username, uid),
-                "id": uid,
-                "created_at": created.isoformat(),
-            }
-            for (cid, created, email, username, uid) in convo_rows
-        }
+        page = max(1, int(request.args.get("page", 1)))
+        size = max(1, min(int(request.args.get("size", 50)), 200))
+        start = request.args.get("from")
+        end = request.args.get("to")
+        start = datetime.fromisoformat(start) if start else None
+        end = datetime.fromisoformat(end) + timedelta(days=1) if end else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "Invalid page, size or date"}), 400
+    clinician_id = request.args.get("clinician_id", type=int)
 
-        # No conversations yet
-        if not conv_ids:
-            return jsonify({"ok": True, "global": {}, "by_conversation": []})
-
-        # Only patient utterances for counting (be forgiving on casing)
-        from sqlalchemy import or_
-        msgs = (
-            db.query(Message)
-              .filter(Message.conversation_id.in_(conv_ids))
-              .filter(or_(Message.role == "patient", Message.role == "Patient"))
-              .order_by(Message.created_at.asc())
-              .all()
-        )
+    t = symptom_tallies(start=start, end=end, clinician_id=clinician_id, page=page, size=size)
 
-        from collections import Counter, defaultdict
-        global_counts = Counter()
-        per_conv = defaultdict(Counter)
-
-        for m in msgs:
-            counts = extract_symptoms(m.message or "")  # uses your helper defined above
-            global_counts.update(counts)
-            per_conv[m.conversation_id].update(counts)
-
-        by_conv = []
-        for cid in conv_ids:
-            meta = owner_map.get(cid, {})
-            by_conv.append({
-                "conversation_id": cid,
-                "owner_display_name": meta.get("display_name", "—"),
-                "owner_user_id": meta.get("id"),
-                "created_at": meta.get("created_at"),
-                "symptoms": dict(per_conv[cid].most_common()),
-            })
+    def _display(e, un, uid):
+        return (un or "").strip() or ((e.split("@")[0] if e else "User")) if (e or un) else (str(uid) if uid is not None else "—")
 
-        return jsonify({
-            "ok": True,
-            "global": dict(global_counts.most_common()),
-            "by_conversation": by_conv
-        })
-    finally:
-        db.close()
+    by_conv = [
+        {
+            "conversation_id": c.id,
+            "owner_display_name": _display(c.email, c.username, c.owner_user_id),
+            "owner_user_id": c.owner_user_id,
+            "created_at": c.created_at.isoformat(),
+            "symptoms": dict(symptoms),
+        }
+        for c, symptoms in t["conversations"]
+    ]
+    return jsonify({
+        "ok": True,
+        "global": dict(t["global"]),
+        "by_conversation": by_conv,
+        "page": page,
+        "size": size,
+        "total": t["total"],
+        # True while older patient messages are still being tagged
+        "backfill_pending": symptom_backfill_pending(),
+    })
 
 
 # --------------------------
@@ -641,55 +563,80 @@ def conversation_disease_likelihoods(cid):
     if not _require_admin():
         return admin_guard()
 
-    db = SessionLocal()
+    # Served from conversation_likelihoods while the patient text and the
+    # FAISS index are unchanged; recomputed (and re-cached) otherwise.
+    out = get_likelihoods(get_faiss(), cid)
+    if out is None:
+        return jsonify({"ok": False, "error": "No messages for conversation"}), 404
+    return jsonify({"ok": True, **out})
+
+
+@admin_bp.post("/api/likelihoods/refresh")
+@login_required
+def likelihoods_refresh():
+    """Recompute stale cached likelihoods for all conversations in the background."""
+    if not _require_admin():
+        return admin_guard()
+    f = get_faiss()
+
+    def _run():
+        try:
+            refresh_likelihoods(f)
+        except Exception:
+            logger.exception("Likelihood refresh failed")
+
+    threading.Thread(target=_run, name="likelihood-refresh", daemon=True).start()
+    return jsonify({"ok": True, "started": True, "index_version": f.index_version}), 202
+
+
+# --------------------------
+# Live STT latency metrics
+# --------------------------
+@admin_bp.get("/api/stt/metrics")
+@login_required
+def stt_metrics():
+    """Per-stage latency histograms, outcome counts and recent segment traces (?recent=N)."""
+    if not _require_admin():
+        return admin_guard()
     try:
-        msgs = (
-            db.query(Message)
-              .filter(Message.conversation_id == cid)
-              .order_by(Message.created_at.asc())
-              .all()
-        )
-        if not msgs:
-            return jsonify({"ok": False, "error": "No messages for conversation"}), 404
-
-        # Prefer patient text; fall back to full transcript
-        patient_text = " ".join((m.message or "") for m in msgs if (m.role or "").lower() == "patient").strip()
-        if not patient_text:
-            patient_text = " ".join((m.message or "") for m in msgs if m.message).strip()
-
-        f = get_faiss()
-        # be lenient to get a spread of candidates
-        results = f.search_similar_cases(patient_text, k=8, similarity_threshold=0.05)
-
-        weights = defaultdict(float)
-        for r in results:
-            sim = max(float(r.similarity_score), 0.0)
-            sus = r.Suspected_illness or {}
-            if isinstance(sus, dict):
-                for disease, _val in sus.items():
-                    if (disease or "").strip():
-                        weights[disease.strip()] += sim
-            elif isinstance(sus, str) and sus.strip():
-                weights[sus.strip()] += sim
-
-        total = sum(weights.values()) or 1.0
-        ranked = sorted(
-            ({"disease": k, "weight": v, "likelihood_pct": round(100.0 * v / total, 1)} for k, v in weights.items()),
-            key=lambda x: (-x["weight"], x["disease"])
-        )[:5]
-
-        sym = extract_symptoms(patient_text)
+        recent = max(0, min(int(request.args.get("recent", 50)), 500))
+    except ValueError:
+        recent = 50
+    return jsonify({"ok": True, **stt_metrics_snapshot(recent=recent)})
 
-        return jsonify({
-            "ok": True,
-            "conversation_id": cid,
-            "symptoms": dict(sym.most_common()),
-            "top_diseases": ranked,
-            "faiss_matches": [{
-                "case_id": r.case_id,
-                "similarity": round(float(r.similarity_score), 4),
-                "suspected": r.Suspected_illness
-            } for r in results]
-        })
-    finally:
-        db.close()
+
+@admin_bp.get("/api/live/metrics")
+@login_required
+def live_metrics():
+    """Live-session store: entries, accounted bytes and evictions by reason."""
+    if not _require_admin():
+        return admin_guard()
+    return jsonify({"ok": True, **live_state_metrics()})
+
+
+@admin_bp.get("/metrics/stt")
+@login_required
+def stt_metrics_prometheus():
+    """Same histograms in Prometheus text format, for an authenticated scraper."""
+    if not _require_admin():
+        return admin_guard()
+    return Response(get_stt_metrics().prometheus_text(), mimetype="text/plain; version=0.0.4")
+
+
+@admin_bp.get("/api/db/metrics")
+@login_required
+def db_metrics():
+    """Write-behind message queue depth, batch sizes and sync fallbacks; pool status."""
+    if not _require_admin():
+        return admin_guard()
+    return jsonify({"ok": True, "message_writer": message_writer_metrics(), "pools": db_pool_metrics()})
+
+
+@admin_bp.post("/api/counters/reconcile")
+@login_required
+def counters_reconcile():
+    """Recount the dashboard rollups now; reports any counters that had drifted."""
+    if not _require_admin():
+        return admin_guard()
+    drift = reconcile_admin_counters()
+    return jsonify({"ok": True, "drift": {k: {"was": a, "now": b} for k, (a, b) in drift.items()}})
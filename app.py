@@ -6,7 +6,6 @@ import json
 import logging
 from datetime import datetime
 from urllib.parse import unquote
-from threading import RLock
 
 from dotenv import load_dotenv
 from agent_loader import load_llm
@@ -14,7 +13,12 @@ from flask_login import current_user, login_required
 from flask_wtf import CSRFProtect
 from flask_wtf.csrf import generate_csrf
 
+from sqlalchemy.exc import IntegrityError
+
 from config import Config
+from conversation_store import make_conversation_store
+from live_state import LIVE_SESSIONS, LiveSession, LiveStateStore
+from question_matcher import LIVE_MATCH_EMBEDDINGS, EmbeddingMatcher, add_question, mark_asked, match_asked
 from medical_case_faiss import MedicalCaseFAISS
 from crew_runner import (
     simulate_agent_chat_stepwise,
@@ -27,16 +31,23 @@ from crew_runner import (
 
 from models import (
     init_db,
+    start_counter_reconciler,
+    start_symptom_backfill,
     create_conversation,
     log_message,
-    list_conversations_for_user,
+    list_conversation_summaries_for_user,
     get_conversation_if_owned_by,
     get_conversation_messages,
+    get_conversation_messages_page,
+    iter_conversation_messages,
+    count_conversation_messages,
+    MESSAGE_PAGE_DEFAULT,
+    MESSAGE_PAGE_MAX,
     delete_conversation_if_owned_by,
     list_patients_for_user,
+    patient_ordinals,
     create_patient,
     get_patient,
-    get_next_global_patient_identifier,
 )
 from flask_sock import Sock
 
@@ -122,11 +133,10 @@ def initialize_faiss():
 
 
 # -----------------------------------------------------------------------------
-# Live per-session plan store (in-memory)
-# Keyed by (user_id, conversation_id)
+# Live per-session plan store (backend picked by LIVE_STATE_URL; see live_state.py)
+# Keyed by (user_id, conversation_id); change it only inside a transaction.
 # -----------------------------------------------------------------------------
-LIVE_STATE_LOCK = RLock()
-LIVE_STATE = {}  # (uid, cid) -> {
+LIVE_STATE = LIVE_SESSIONS  # (uid, cid) -> {
 #   "created_at": "...",
 #   "questions": {norm_q: {...}},
 #   "history": [],
@@ -134,26 +144,55 @@ LIVE_STATE = {}  # (uid, cid) -> {
 # }
 
 
+# -----------------------------------------------------------------------------
+# Working transcript per conversation (server-side; the session carries only
+# the conversation id). See conversation_store.py.
+# -----------------------------------------------------------------------------
+CONVERSATIONS = make_conversation_store()
+
+
 def _ensure_conversation_id():
-    """Ensure session['id'] exists, belongs to current user, and conv list exists."""
+    """Ensure session['id'] exists and belongs to current user."""
+    # Transcripts used to ride in the cookie; drop any left in old sessions.
+    session.pop("conv", None)
     existing_cid = session.get("id")
     if existing_cid:
         c = get_conversation_if_owned_by(existing_cid, current_user.id)
         if c is None:
             # Stale or wrong-owner session: start fresh
             session.pop("id", None)
-            session.pop("conv", None)
             session.pop("patient_id", None)
             existing_cid = None
     if not existing_cid:
         patient_id = session.get("patient_id")
         session["id"] = create_conversation(owner_user_id=current_user.id, patient_id=patient_id)
-        session["conv"] = []
-    if "conv" not in session:
-        session["conv"] = []
     return session["id"]
 
 
+def _conversation_turns() -> list:
+    """Working transcript of the session's conversation ([] if there is none yet)."""
+    cid = session.get("id")
+    if not cid:
+        return []
+    try:
+        return CONVERSATIONS.get(cid)
+    except Exception:
+        logger.exception("Failed to load conversation turns")
+        return []
+
+
+def _drop_conversation_turns():
+    """Forget the session's current transcript before it switches conversation."""
+    session.pop("conv", None)
+    cid = session.get("id")
+    if not cid:
+        return
+    try:
+        CONVERSATIONS.clear(cid)
+    except Exception:
+        logger.exception("Failed to clear conversation turns")
+
+
 # FIX #6: _live_key() no longer calls _ensure_conversation_id() (which did a
 # DB write). It now reads the existing session cid without side effects.
 # Callers that genuinely need a conversation id should call
@@ -170,46 +209,29 @@ def _live_key():
     return (str(uid), str(cid))
 
 
-def _get_or_create_live_state():
+def _live_session():
+    """LiveSession for the current conversation; use `with live.transaction() as st:`."""
     key = _live_key()
     if key is None:
-        # No conversation in session yet — return a throwaway dict rather than
+        # No conversation in session yet — return a throwaway state rather than
         # silently triggering a DB write.
-        return {
-            "created_at": datetime.utcnow().isoformat(),
-            "questions": {},
-            "history": [],
-            "last_reco_ts": 0.0,
-        }
-    with LIVE_STATE_LOCK:
-        st = LIVE_STATE.get(key)
-        if not st:
-            st = {
-                "created_at": datetime.utcnow().isoformat(),
-                "questions": {},
-                "history": [],
-                # FIX #4: initialise throttle timestamp
-                "last_reco_ts": 0.0,
-            }
-            LIVE_STATE[key] = st
-        return st
+        return LiveSession(LiveStateStore(max_entries=1), ("anon", ""))
+    return LiveSession(LIVE_STATE, key)
 
 
 def _reset_live_state():
     key = _live_key()
     if key is None:
         return
-    with LIVE_STATE_LOCK:
-        LIVE_STATE.pop(key, None)
+    LIVE_STATE.pop(key)
 
 
 def _append_live_history(role: str, message: str):
-    """Keep a lightweight history server-side too (separate from session['conv'])."""
-    st = _get_or_create_live_state()
+    """Keep a lightweight history in the live state too (separate from CONVERSATIONS)."""
     msg = (message or "").strip()
     if not msg:
         return
-    with LIVE_STATE_LOCK:
+    with _live_session().transaction() as st:
         st["history"].append({"role": role, "message": msg, "ts": datetime.utcnow().isoformat()})
         if len(st["history"]) > 400:
             st["history"] = st["history"][-300:]
@@ -235,9 +257,7 @@ def agent_chat_stream():
     # Ensure conversation id (DB write only happens here, not in _live_key)
     sid = _ensure_conversation_id()
 
-    conv = session.get("conv", [])
-    conv.append({"role": role, "message": message})
-    session["conv"] = conv
+    conv = CONVERSATIONS.append(sid, role, message)
 
     try:
         _append_live_history(role, message)
@@ -250,9 +270,9 @@ def agent_chat_stream():
         except Exception:
             logger.exception("DB log failed")
 
-    # FIX #4: Pass live_state and lock to live_transcription_stream so the
+    # FIX #4: Pass the live session to live_transcription_stream so the
     # throttle uses real server-side timestamps instead of broken client history.
-    live_st = _get_or_create_live_state()
+    live = _live_session()
 
     if mode == "simulated":
         generator = simulate_agent_chat_stepwise(
@@ -269,8 +289,7 @@ def agent_chat_stream():
             conversation_history=conv,
             log_hook=log_hook,
             session_id=sid,
-            live_state=live_st,
-            live_state_lock=LIVE_STATE_LOCK,
+            live_session=live,
         )
     else:
         generator = real_actor_chat_stepwise(
@@ -309,30 +328,30 @@ def live_plan():
     """
     data = request.get_json(force=True, silent=True) or {}
     required = data.get("required") or []
-    st = _get_or_create_live_state()
 
     now = datetime.utcnow().isoformat()
     added = 0
 
-    with LIVE_STATE_LOCK:
+    with _live_session().transaction() as st:
         for item in required:
-            q = (item.get("text") or "").strip()
-            if not q:
-                continue
-            nq = normalize_text(q)
-            if not nq:
-                continue
-
-            if nq not in st["questions"]:
-                st["questions"][nq] = {
-                    "question": q,
-                    "score": None,
-                    "added_at": now,
-                    "asked": False,
-                }
+            if add_question(st, item.get("text") or "", now):
                 added += 1
+        total = len(st["questions"])
 
-    return jsonify({"ok": True, "added": added, "total": len(st["questions"])})
+    return jsonify({"ok": True, "added": added, "total": total})
+
+
+_EMBED_MATCHER = None
+
+
+def _embedding_matcher():
+    """MiniLM matcher over the FAISS system's already-loaded model (LIVE_MATCH_EMBEDDINGS=1)."""
+    global _EMBED_MATCHER
+    if not LIVE_MATCH_EMBEDDINGS or faiss_system is None:
+        return None
+    if _EMBED_MATCHER is None:
+        _EMBED_MATCHER = EmbeddingMatcher(faiss_system.model)
+    return _EMBED_MATCHER
 
 
 @app.route("/live/mark_asked", methods=["POST"])
@@ -342,37 +361,28 @@ def live_mark_asked():
     """
     Mark recommended questions as asked based on a piece of FINAL transcript text.
     Payload: { "text": "..." }
+    Only questions sharing tokens with the text are checked (see question_matcher).
     """
     data = request.get_json(force=True, silent=True) or {}
     final_text = (data.get("text") or "").strip()
     if not final_text:
         return jsonify({"ok": True, "matched": 0})
 
-    st = _get_or_create_live_state()
-    matched = 0
-
-    norm_final = normalize_text(final_text)
-    final_tokens = set(norm_final.split())
-
-    with LIVE_STATE_LOCK:
-        for nq, qobj in st["questions"].items():
-            if qobj.get("asked"):
-                continue
-
-            if nq and nq in norm_final:
-                qobj["asked"] = True
-                matched += 1
-                continue
+    live = _live_session()
+    with live.transaction() as st:
+        asked, near = match_asked(st, final_text)
+    matched = len(asked)
 
-            q_tokens = set(nq.split())
-            if not q_tokens:
-                continue
-            overlap = len(q_tokens & final_tokens)
-            ratio = overlap / max(1, min(len(q_tokens), len(final_tokens)))
-
-            if overlap >= 3 and ratio >= 0.55:
-                qobj["asked"] = True
-                matched += 1
+    matcher = _embedding_matcher()
+    if matcher is not None and near:
+        try:
+            similar = matcher.matches(final_text, near)
+        except Exception:
+            logger.exception("Embedding match failed")
+            similar = []
+        if similar:
+            with live.transaction() as st:
+                matched += sum(mark_asked(st, nq) for nq in similar)
 
     return jsonify({"ok": True, "matched": matched})
 
@@ -386,18 +396,18 @@ def live_unasked():
       { "unasked": [ {"question": "...", "score": 0.92}, ... ] }
     """
     language = (request.args.get("lang") or "bilingual").strip().lower()
-    st = _get_or_create_live_state()
+    live = _live_session()
 
-    with LIVE_STATE_LOCK:
+    with live.transaction() as st:
         questions = [qobj["question"] for qobj in st["questions"].values() if not qobj.get("asked")]
         history = st.get("history") or []
-        if not history:
-            history = session.get("conv", [])
-        convo_text = "\n".join([f"{m.get('role', '')}: {m.get('message', '')}" for m in history])
+    if not history:
+        history = _conversation_turns()
+    convo_text = "\n".join([f"{m.get('role', '')}: {m.get('message', '')}" for m in history])
 
     ranked = rank_questions_for_unasked(convo_text=convo_text, questions=questions, language_mode=language)
 
-    with LIVE_STATE_LOCK:
+    with live.transaction() as st:
         for item in ranked:
             q = (item.get("question") or "").strip()
             nq = normalize_text(q)
@@ -425,13 +435,13 @@ def live_stop_bundle():
     data = request.get_json(force=True, silent=True) or {}
     language = (data.get("lang") or "bilingual").strip().lower()
 
-    st = _get_or_create_live_state()
+    live = _live_session()
 
-    with LIVE_STATE_LOCK:
+    with live.transaction() as st:
         history = st.get("history") or []
-        if not history:
-            history = session.get("conv", [])
-        convo_text = "\n".join([f"{m.get('role', '')}: {m.get('message', '')}" for m in history])
+    if not history:
+        history = _conversation_turns()
+    convo_text = "\n".join([f"{m.get('role', '')}: {m.get('message', '')}" for m in history])
 
     try:
         listener_output = build_listener_bundle(convo_text, language_mode=language)
@@ -439,12 +449,12 @@ def live_stop_bundle():
         logger.exception("Failed to build listener bundle")
         listener_output = "Listener:\n**English Summary:**\n- —\n\n**Swahili Summary:**\n- —\n\n**FINAL PLAN:**\n- Step 1: —"
 
-    with LIVE_STATE_LOCK:
+    with live.transaction() as st:
         questions = [qobj["question"] for qobj in st["questions"].values() if not qobj.get("asked")]
 
     ranked = rank_questions_for_unasked(convo_text=convo_text, questions=questions, language_mode=language)
 
-    with LIVE_STATE_LOCK:
+    with live.transaction() as st:
         for item in ranked:
             q = (item.get("question") or "").strip()
             nq = normalize_text(q)
@@ -454,7 +464,7 @@ def live_stop_bundle():
     ranked.sort(key=lambda x: float(x.get("score", 0.0)), reverse=True)
 
     try:
-        with LIVE_STATE_LOCK:
+        with live.transaction() as st:
             st["post_stop"] = {
                 "convo_text": convo_text[-12000:],
                 "listener_output": listener_output,
@@ -499,8 +509,8 @@ def live_followup_chat():
 
     lang = (data.get("lang") or "bilingual").strip().lower()
 
-    st = _get_or_create_live_state()
-    with LIVE_STATE_LOCK:
+    live = _live_session()
+    with live.transaction() as st:
         post = st.get("post_stop") or {}
         convo_text = (post.get("convo_text") or "").strip()
         listener_output = (post.get("listener_output") or "").strip()
@@ -508,7 +518,7 @@ def live_followup_chat():
         follow_hist = st.get("followup") or []
 
     if not convo_text:
-        conv = session.get("conv", [])
+        conv = _conversation_turns()
         convo_text = "\n".join([f"{m.get('role', '')}: {m.get('message', '')}" for m in conv])
 
     unasked_lines = []
@@ -575,7 +585,7 @@ def live_followup_chat():
         return jsonify({"error": "Failed to generate follow-up response"}), 500
 
     try:
-        with LIVE_STATE_LOCK:
+        with live.transaction() as st:
             st.setdefault("followup", []).append(
                 {"role": "clinician", "message": user_msg, "ts": datetime.utcnow().isoformat()})
             st.setdefault("followup", []).append(
@@ -599,7 +609,7 @@ def reset_conv():
     patient_id = data.get("patient_id")
     if patient_id is not None:
         patient_id = int(patient_id)
-    session["conv"] = []
+    _drop_conversation_turns()
     try:
         _reset_live_state()
     except Exception:
@@ -622,72 +632,122 @@ def _patients_display_order():
     return sorted(patients, key=lambda p: p.id)
 
 
-def _patient_labels_for_current_user():
-    """Stable mapping patient_id -> 'Patient 1', 'Patient 2', ..."""
-    ordered = _patients_display_order()
-    return {p.id: f"Patient {i + 1}" for i, p in enumerate(ordered)}
+def _patient_labels_for_current_user(patient_ids=()):
+    """Stable mapping patient_id -> 'Patient 1', 'Patient 2', ... (cached ordinals)."""
+    ordinals = patient_ordinals([current_user.id], patient_ids)[current_user.id]
+    return {pid: f"Patient {n}" for pid, n in ordinals.items()}
 
 
 @app.route("/api/my-conversations")
 @login_required
 def api_my_conversations():
-    """List current user's conversations. Excludes empty conversations."""
-    convos = list_conversations_for_user(current_user.id)
-    plabels = _patient_labels_for_current_user()
+    """List current user's conversations (newest first, ?limit=&cursor=). Excludes empty conversations."""
+    try:
+        limit = max(1, min(int(request.args.get("limit", 50)), 200))
+    except ValueError:
+        limit = 50
+    try:
+        rows, next_cursor = list_conversation_summaries_for_user(
+            current_user.id, limit=limit, cursor=request.args.get("cursor") or None
+        )
+    except ValueError:
+        return jsonify({"ok": False, "error": "Invalid cursor"}), 400
+    plabels = _patient_labels_for_current_user([r["patient_id"] for r in rows])
     out = []
-    for c in convos:
-        msgs = get_conversation_messages(c.id)
-        if not msgs:
-            continue
-        first_msg = msgs[0].message if msgs and msgs[0].message else ""
+    for r in rows:
+        first_msg = r["first_message"]
         preview = (first_msg[:80] + "…") if len(first_msg) > 80 else first_msg
-        pid = c.patient_id if c.patient_id is not None else (c.patient.id if getattr(c, "patient", None) else None)
+        pid = r["patient_id"]
         patient_label = plabels.get(int(pid)) if pid is not None else None
         if pid is not None and not patient_label:
             patient_label = "Patient"
         out.append({
-            "id": c.id,
-            "created_at": c.created_at.isoformat() if c.created_at else None,
+            "id": r["id"],
+            "created_at": r["created_at"].isoformat() if r["created_at"] else None,
             "patient_id": pid,
             "patient_label": patient_label,
-            "message_count": len(msgs),
+            "message_count": r["message_count"],
             "preview": preview,
         })
-    return jsonify({"ok": True, "conversations": out})
+    return jsonify({"ok": True, "conversations": out, "next_cursor": next_cursor})
+
+
+def _message_json(m):
+    return {
+        "id": m.id,
+        "role": m.role,
+        "type": m.type or "message",
+        "message": m.message,
+        "timestamp": m.timestamp,
+        "created_at": m.created_at.isoformat() if m.created_at else None,
+    }
+
+
+def _page_limit_arg(default: int = MESSAGE_PAGE_DEFAULT) -> int:
+    try:
+        return max(1, min(int(request.args.get("limit", default)), MESSAGE_PAGE_MAX))
+    except ValueError:
+        return default
+
+
+def _stream_messages_json(head: dict, conversation_id: str):
+    """Yield `head` as a JSON object whose "messages" array is filled page by page."""
+    yield json.dumps(head)[:-1] + ', "messages": ['
+    first = True
+    for m in iter_conversation_messages(conversation_id):
+        yield ("" if first else ",") + json.dumps(_message_json(m))
+        first = False
+    yield "]}"
 
 
 @app.route("/api/conversations/<conversation_id>/messages")
 @login_required
 def api_conversation_messages(conversation_id):
-    """Messages for this conversation; 403 if not owned by current user."""
+    """Messages for this conversation; 403 if not owned by current user.
+
+    ?limit=&before=<cursor> pages backwards from the newest message (oldest-first
+    within a page, with older_cursor for the next "load older" call); ?after=
+    pages forwards. ?stream=1 streams the whole transcript as one JSON document.
+    Without any of these the full transcript is returned as before.
+    """
     c = get_conversation_if_owned_by(conversation_id, current_user.id)
     if c is None:
         return jsonify({"ok": False, "error": "Not found or access denied"}), 403
-    msgs = get_conversation_messages(conversation_id)
-    plabels = _patient_labels_for_current_user()
-    out = [
-        {
-            "id": m.id,
-            "role": m.role,
-            "type": m.type or "message",
-            "message": m.message,
-            "timestamp": m.timestamp,
-            "created_at": m.created_at.isoformat() if m.created_at else None,
-        }
-        for m in msgs
-    ]
+    plabels = _patient_labels_for_current_user([c.patient_id])
     pid = c.patient_id if c.patient_id is not None else (c.patient.id if getattr(c, "patient", None) else None)
     patient_label = plabels.get(int(pid)) if pid is not None else None
     if pid is not None and not patient_label:
         patient_label = "Patient"
-    return jsonify({
+    head = {
         "ok": True,
         "conversation_id": conversation_id,
         "created_at": c.created_at.isoformat() if c.created_at else None,
         "patient_id": pid,
         "patient_label": patient_label,
-        "messages": out,
-    })
+    }
+
+    args = request.args
+    if args.get("stream") in ("1", "true"):
+        return Response(
+            stream_with_context(_stream_messages_json(head, conversation_id)),
+            mimetype="application/json",
+        )
+    if any(k in args for k in ("limit", "before", "after")):
+        try:
+            msgs, cursor = get_conversation_messages_page(
+                conversation_id,
+                limit=_page_limit_arg(),
+                before=args.get("before") or None,
+                after=args.get("after") or None,
+            )
+        except ValueError:
+            return jsonify({"ok": False, "error": "Invalid cursor"}), 400
+        head["messages"] = [_message_json(m) for m in msgs]
+        head["next_cursor" if args.get("after") else "older_cursor"] = cursor
+        return jsonify(head)
+
+    head["messages"] = [_message_json(m) for m in get_conversation_messages(conversation_id)]
+    return jsonify(head)
 
 
 @app.route("/api/conversations/<conversation_id>", methods=["DELETE"])
@@ -735,7 +795,7 @@ def new_conversation():
             patient_id = None
     else:
         patient_id = None
-    session["conv"] = []
+    _drop_conversation_turns()
     try:
         _reset_live_state()
     except Exception:
@@ -757,11 +817,12 @@ def new_conversation():
 def api_patients():
     if request.method == "POST":
         data = request.get_json(force=True, silent=True) or {}
-        identifier = (data.get("identifier") or data.get("display_name") or "").strip()
-        if not identifier:
-            identifier = get_next_global_patient_identifier()
+        identifier = (data.get("identifier") or "").strip() or None
         display_name = (data.get("display_name") or "").strip() or None
-        pid = create_patient(identifier=identifier, clinician_id=current_user.id, display_name=display_name)
+        try:
+            pid = create_patient(identifier=identifier, clinician_id=current_user.id, display_name=display_name)
+        except IntegrityError:
+            return jsonify({"ok": False, "error": "identifier already in use"}), 409
         return jsonify({"ok": True, "patient_id": pid})
     ordered = _patients_display_order()
     out = [
@@ -796,8 +857,9 @@ def history_detail_page(conversation_id):
     c = get_conversation_if_owned_by(conversation_id, current_user.id)
     if c is None:
         return "Not found or access denied", 404
-    msgs = get_conversation_messages(conversation_id)
-    plabels = _patient_labels_for_current_user()
+    # Newest page only; "Load older messages" fetches earlier pages from the messages API.
+    msgs, older_cursor = get_conversation_messages_page(conversation_id, limit=MESSAGE_PAGE_DEFAULT)
+    plabels = _patient_labels_for_current_user([c.patient_id])
     pid = c.patient_id if c.patient_id is not None else (c.patient.id if getattr(c, "patient", None) else None)
     patient_label = plabels.get(int(pid)) if pid is not None else None
     if pid is not None and not patient_label:
@@ -809,6 +871,9 @@ def history_detail_page(conversation_id):
         patient_label=patient_label,
         patient_id=pid,
         messages=msgs,
+        message_count=count_conversation_messages(conversation_id) if older_cursor else len(msgs),
+        older_cursor=older_cursor,
+        page_size=MESSAGE_PAGE_DEFAULT,
     )
 
 
@@ -976,6 +1041,9 @@ def admin_page():
 if __name__ == "__main__":
     if initialize_faiss():
         init_db()
+        start_counter_reconciler()
+        start_symptom_backfill()
+        LIVE_STATE.start_sweeper()
         logger.info("Starting Flask application (Gemini-only STT enabled)...")
         app.run(debug=True, host="0.0.0.0", port=5000)
     else:
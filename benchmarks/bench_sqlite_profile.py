@@ -0,0 +1,146 @@
+"""
+Concurrent read/write throughput: stock SQLite engine vs models.make_engine().
+
+  default : create_engine(url) -- rollback journal, synchronous=FULL, no busy timeout
+  tuned   : models.make_engine(url) writer + make_engine(url, read_only=True) reader
+            (WAL, synchronous=NORMAL, mmap, cache_size, temp_store=MEMORY, busy_timeout, QueuePool)
+
+Writer threads insert one message per transaction (the old log_message shape);
+reader threads run the history-list query (conversations for an owner, newest
+first, with a message count). Each profile gets a fresh database file.
+
+Run:
+  python benchmarks/bench_sqlite_profile.py --writers 4 --readers 8 --seconds 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import models  # noqa: E402
+
+READ_SQL = text(
+    "SELECT c.id, c.created_at, COUNT(m.id) FROM conversations c "
+    "LEFT JOIN messages m ON m.conversation_id = c.id "
+    "WHERE c.owner_user_id = :uid GROUP BY c.id ORDER BY c.created_at DESC LIMIT 50"
+)
+WRITE_SQL = text(
+    "INSERT INTO messages (id, conversation_id, role, type, message, timestamp, created_at) "
+    "VALUES (:id, :cid, 'patient', 'message', :msg, '00:00:00', :ts)"
+)
+
+
+def _seed(eng, conversations: int, messages: int) -> list[str]:
+    models.Base.metadata.create_all(eng)
+    cids = [str(uuid.uuid4()) for _ in range(conversations)]
+    now = datetime.utcnow()
+    with eng.begin() as conn:
+        conn.execute(
+            text("INSERT INTO conversations (id, created_at, owner_user_id) VALUES (:id, :ts, :uid)"),
+            [{"id": c, "ts": now, "uid": i % 10} for i, c in enumerate(cids)],
+        )
+        conn.execute(
+            WRITE_SQL,
+            [{"id": str(uuid.uuid4()), "cid": cids[i % len(cids)], "msg": "seed " * 20, "ts": now}
+             for i in range(messages)],
+        )
+    return cids
+
+
+def _run(write_eng, read_eng, cids, writers: int, readers: int, seconds: float) -> dict:
+    stop = time.monotonic() + seconds
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+    write_lat, read_lat = [], []
+
+    def writer(i):
+        n = 0
+        while time.monotonic() < stop:
+            t0 = time.perf_counter()
+            try:
+                with write_eng.begin() as conn:
+                    conn.execute(WRITE_SQL, {"id": str(uuid.uuid4()), "cid": cids[(i + n) % len(cids)],
+                                             "msg": "bench " * 30, "ts": datetime.utcnow()})
+            except OperationalError:
+                with lock:
+                    counts["locked"] += 1
+                continue
+            n += 1
+            with lock:
+                counts["writes"] += 1
+                write_lat.append((time.perf_counter() - t0) * 1000.0)
+
+    def reader(i):
+        while time.monotonic() < stop:
+            t0 = time.perf_counter()
+            try:
+                with read_eng.connect() as conn:
+                    conn.execute(READ_SQL, {"uid": i % 10}).fetchall()
+            except OperationalError:
+                with lock:
+                    counts["locked"] += 1
+                continue
+            with lock:
+                counts["reads"] += 1
+                read_lat.append((time.perf_counter() - t0) * 1000.0)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    def p95(vals):
+        vals = sorted(vals)
+        return vals[int(0.95 * (len(vals) - 1))] if vals else 0.0
+
+    return {
+        "writes_per_s": counts["writes"] / seconds,
+        "reads_per_s": counts["reads"] / seconds,
+        "write_p95_ms": p95(write_lat),
+        "read_p95_ms": p95(read_lat),
+        "locked_errors": counts["locked"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--writers", type=int, default=4)
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--conversations", type=int, default=500)
+    ap.add_argument("--messages", type=int, default=50000)
+    args = ap.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="sqlite_bench_")
+    for name in ("default", "tuned"):
+        url = f"sqlite:///{os.path.join(tmpdir, name + '.db')}"
+        if name == "default":
+            write_eng = read_eng = create_engine(url, future=True)
+        else:
+            write_eng = models.make_engine(url)
+            read_eng = models.make_engine(url, read_only=True)
+        cids = _seed(write_eng, args.conversations, args.messages)
+        r = _run(write_eng, read_eng, cids, args.writers, args.readers, args.seconds)
+        print(f"{name:8s} writes/s={r['writes_per_s']:8.1f}  reads/s={r['reads_per_s']:8.1f}  "
+              f"write p95={r['write_p95_ms']:7.1f}ms  read p95={r['read_p95_ms']:7.1f}ms  "
+              f"'database is locked'={r['locked_errors']}")
+        write_eng.dispose()
+        read_eng.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
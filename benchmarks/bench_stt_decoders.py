@@ -0,0 +1,134 @@
+"""
+Live decoder benchmark: time-to-first-PCM and CPU per /ws/stt session.
+
+Compares the decoders behind stt_gemini.open_pcm_decoder():
+  ffmpeg      : spawn a fresh ffmpeg per session (previous behaviour)
+  ffmpeg_pool : take a pre-spawned ffmpeg from FFmpegProcessPool
+  pyav        : in-process WebM/Opus demux + decode (needs PyAV)
+
+Each session streams the same WebM file in 250 ms MediaRecorder-sized chunks,
+either in real time or as fast as possible (--fast).
+
+Run:
+  python benchmarks/bench_stt_decoders.py --webm sample.webm --sessions 10
+  python benchmarks/bench_stt_decoders.py --sessions 10 --fast   # synthesizes a test WebM with ffmpeg
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import stt_gemini  # noqa: E402
+
+
+def _make_sample_webm(seconds: float) -> str:
+    path = os.path.join(tempfile.gettempdir(), f"stt_bench_{int(seconds)}s.webm")
+    if not os.path.exists(path):
+        subprocess.run(
+            [stt_gemini.FFMPEG_BIN, "-y", "-hide_banner", "-loglevel", "error",
+             "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+             "-c:a", "libopus", "-b:a", "32k", path],
+            check=True,
+        )
+    return path
+
+
+def _cpu_seconds() -> float:
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return me.ru_utime + me.ru_stime + kids.ru_utime + kids.ru_stime
+
+
+def _run_session(kind: str, data: bytes, chunk: int, realtime: bool, out: dict):
+    t0 = time.monotonic()
+    dec = stt_gemini.open_pcm_decoder(kind)
+    opened = time.monotonic()
+    done = threading.Event()
+
+    def feeder():
+        try:
+            for i in range(0, len(data), chunk):
+                dec.feed(data[i:i + chunk])
+                if realtime:
+                    time.sleep(0.25)
+        finally:
+            dec.close_input()
+            done.set()
+
+    threading.Thread(target=feeder, daemon=True).start()
+    pcm_bytes = 0
+    while not dec.finished:
+        block = dec.read(timeout=0.5)
+        if block:
+            pcm_bytes += len(block)
+    dec.close()
+    out["open_ms"] = (opened - t0) * 1000.0
+    out["ttfp_ms"] = ((dec.first_pcm_at or time.monotonic()) - t0) * 1000.0
+    out["pcm_s"] = pcm_bytes / 2 / stt_gemini.SAMPLE_RATE
+
+
+def bench(kind: str, data: bytes, sessions: int, realtime: bool, chunk: int) -> dict:
+    if kind == "ffmpeg_pool":
+        pool = stt_gemini.get_ffmpeg_pool()
+        deadline = time.time() + 5
+        while pool.metrics()["idle"] < pool.size and time.time() < deadline:
+            time.sleep(0.05)
+    cpu0 = _cpu_seconds()
+    results = [dict() for _ in range(sessions)]
+    threads = [threading.Thread(target=_run_session, args=(kind, data, chunk, realtime, r)) for r in results]
+    t0 = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - t0
+    time.sleep(0.2)  # let exited ffmpeg children be reaped into RUSAGE_CHILDREN
+    cpu = _cpu_seconds() - cpu0
+    ttfp = sorted(r["ttfp_ms"] for r in results)
+    return {
+        "ttfp_p50_ms": ttfp[len(ttfp) // 2],
+        "ttfp_max_ms": ttfp[-1],
+        "open_avg_ms": sum(r["open_ms"] for r in results) / sessions,
+        "cpu_ms_per_session": cpu * 1000.0 / sessions,
+        "audio_s": results[0]["pcm_s"],
+        "wall_s": wall,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--webm", help="WebM/Opus recording (default: synthesized 5 s tone)")
+    ap.add_argument("--sessions", type=int, default=8)
+    ap.add_argument("--fast", action="store_true", help="feed as fast as possible instead of real time")
+    ap.add_argument("--chunk-bytes", type=int, default=1000, help="bytes per feed (~250 ms at 32 kbps)")
+    ap.add_argument("--decoders", default="ffmpeg,ffmpeg_pool,pyav")
+    args = ap.parse_args()
+
+    path = args.webm or _make_sample_webm(5)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    print(f"{os.path.basename(path)}: {len(data)} bytes, {args.sessions} concurrent sessions, "
+          f"{'fast' if args.fast else 'real-time'} feed\n")
+    for kind in args.decoders.split(","):
+        kind = kind.strip()
+        if kind == "pyav" and stt_gemini.av is None:
+            print(f"{kind:12s} skipped (PyAV not installed)")
+            continue
+        r = bench(kind, data, args.sessions, not args.fast, args.chunk_bytes)
+        print(f"{kind:12s} time-to-first-PCM p50={r['ttfp_p50_ms']:7.1f}ms max={r['ttfp_max_ms']:7.1f}ms  "
+              f"open={r['open_avg_ms']:6.1f}ms  cpu/session={r['cpu_ms_per_session']:7.1f}ms  "
+              f"audio={r['audio_s']:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
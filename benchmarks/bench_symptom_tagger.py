@@ -0,0 +1,98 @@
+"""
+Symptom extraction throughput: per-phrase regex loop vs the compiled trie tagger.
+
+  legacy : sort CANON, then one re.findall + re.sub per phrase per message
+           (extract_symptoms before the tagger)
+  tagger : symptoms.TAGGER.tag_many() -- one tokenize + trie walk per message
+
+Messages are synthetic patient utterances (English and Swahili) mixing
+symptom phrases, filler and negations. Counts differ where the tagger drops
+negated mentions or knows a Swahili synonym; --check reports how many do.
+
+Run:
+  python benchmarks/bench_symptom_tagger.py --messages 20000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import symptoms  # noqa: E402
+
+FILLER = [
+    "I have been feeling unwell since last week", "it started two days ago", "doctor",
+    "mostly in the evening", "tangu jana", "nimekuwa mgonjwa", "and it is getting worse",
+    "my mother says", "after eating", "kwa siku tatu",
+]
+
+
+def _legacy_extract(text: str) -> Counter:
+    t = " " + (text or "").lower() + " "
+    counts = Counter()
+    for phrase in sorted(symptoms.CANON.keys(), key=len, reverse=True):
+        pattern = r'\b' + re.escape(phrase) + r'\b'
+        hits = re.findall(pattern, t)
+        if hits:
+            counts[symptoms.CANON[phrase]] += len(hits)
+            t = re.sub(pattern, " ", t)
+    return counts
+
+
+def _corpus(n: int, seed: int = 7) -> list[str]:
+    rnd = random.Random(seed)
+    phrases = list(symptoms.CANON) + list(symptoms.CANON_SW)
+    out = []
+    for _ in range(n):
+        parts = []
+        for _ in range(rnd.randint(2, 6)):
+            r = rnd.random()
+            if r < 0.45:
+                parts.append(rnd.choice(phrases))
+            elif r < 0.55:
+                parts.append(rnd.choice(("no ", "sina ", "denies ")) + rnd.choice(phrases))
+            else:
+                parts.append(rnd.choice(FILLER))
+        out.append(", ".join(parts) + ".")
+    return out
+
+
+def _bench(fn, texts, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(texts)
+        best = min(best, time.perf_counter() - t0)
+    return len(texts) / best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--messages", type=int, default=10000)
+    ap.add_argument("--runs", type=int, default=3, help="best of N")
+    ap.add_argument("--check", action="store_true", help="count messages where the two disagree")
+    args = ap.parse_args()
+
+    texts = _corpus(args.messages)
+    avg_chars = sum(map(len, texts)) / len(texts)
+    print(f"{len(texts)} messages, {avg_chars:.0f} chars avg, best of {args.runs}\n")
+
+    legacy = _bench(lambda ts: [_legacy_extract(t) for t in ts], texts, args.runs)
+    tagger = _bench(symptoms.TAGGER.tag_many, texts, args.runs)
+    print(f"{'legacy regex':14s} {legacy:10.0f} msg/s")
+    print(f"{'trie tagger':14s} {tagger:10.0f} msg/s   ({tagger / legacy:.1f}x)")
+
+    if args.check:
+        diff = sum(1 for t in texts if _legacy_extract(t) != symptoms.extract_symptoms(t))
+        print(f"\n{diff} of {len(texts)} messages tagged differently (negations, Swahili synonyms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
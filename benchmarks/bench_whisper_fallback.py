@@ -0,0 +1,108 @@
+"""
+Per-segment latency of the local faster-whisper fallback: temp-WAV vs in-memory.
+
+  legacy    : PCM -> WAV bytes -> NamedTemporaryFile -> model.transcribe(path) -> unlink
+  in-memory : PCM -> float32 array -> model.transcribe(array)   (stt_gemini today)
+
+Both paths use the same loaded model, so the difference is the WAV round trip,
+disk I/O and faster-whisper's file decode.
+
+Run (needs faster-whisper installed):
+  python benchmarks/bench_whisper_fallback.py --runs 20 --seconds 4
+  python benchmarks/bench_whisper_fallback.py --pcm some_segment.s16le
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import stt_gemini  # noqa: E402
+
+
+def _synthetic_pcm(seconds: float) -> bytes:
+    """Speech-band noise bursts; enough to exercise the decoder end to end."""
+    sr = stt_gemini.SAMPLE_RATE
+    t = np.arange(int(sr * seconds)) / sr
+    env = (np.sin(2 * np.pi * 2.0 * t) > 0).astype(np.float32)
+    sig = 0.2 * env * (np.sin(2 * np.pi * 220 * t) + 0.5 * np.sin(2 * np.pi * 660 * t))
+    return (sig * 32767).astype(np.int16).tobytes()
+
+
+def _legacy_transcribe(model, pcm: bytes, language):
+    wav_bytes = stt_gemini.write_wav_bytes(pcm, sample_rate=stt_gemini.SAMPLE_RATE)
+    tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+    try:
+        tmp.write(wav_bytes)
+        tmp.flush()
+        tmp.close()
+        segments, _info = model.transcribe(tmp.name, language=language, beam_size=3, vad_filter=False)
+        return " ".join((s.text or "").strip() for s in segments)
+    finally:
+        os.unlink(tmp.name)
+
+
+def _inmemory_transcribe(model, pcm: bytes, language):
+    segments, _info = model.transcribe(
+        stt_gemini._pcm16_to_whisper_audio(pcm), language=language, beam_size=3, vad_filter=False
+    )
+    return " ".join((s.text or "").strip() for s in segments)
+
+
+def _bench(fn, model, pcm, language, runs):
+    fn(model, pcm, language)  # warm-up
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(model, pcm, language)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    times.sort()
+    return {
+        "p50_ms": times[len(times) // 2],
+        "p95_ms": times[min(len(times) - 1, int(0.95 * (len(times) - 1)))],
+        "mean_ms": sum(times) / len(times),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pcm", help="raw s16le mono file at SAMPLE_RATE (default: synthetic audio)")
+    ap.add_argument("--seconds", type=float, default=4.0, help="synthetic segment length")
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--lang", default="english")
+    args = ap.parse_args()
+
+    if stt_gemini.WhisperModel is None:
+        print("faster-whisper is not installed; nothing to benchmark.")
+        return 1
+
+    t0 = time.perf_counter()
+    model = stt_gemini._get_whisper_model()
+    if model is None:
+        print("faster-whisper model failed to load (is USE_LOCAL_WHISPER_FALLBACK on?)")
+        return 1
+    print(f"model load: {(time.perf_counter() - t0):.1f}s (paid at startup by preload_whisper_model)")
+
+    if args.pcm:
+        with open(args.pcm, "rb") as f:
+            pcm = f.read()
+    else:
+        pcm = _synthetic_pcm(args.seconds)
+    language = stt_gemini._whisper_lang_code(args.lang)
+    seg_s = len(pcm) / 2 / stt_gemini.SAMPLE_RATE
+    print(f"segment: {seg_s:.2f}s audio, {args.runs} runs each\n")
+
+    for name, fn in (("legacy temp-WAV", _legacy_transcribe), ("in-memory array", _inmemory_transcribe)):
+        r = _bench(fn, model, pcm, language, args.runs)
+        print(f"{name:18s} p50={r['p50_ms']:8.1f}ms  p95={r['p95_ms']:8.1f}ms  mean={r['mean_ms']:8.1f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
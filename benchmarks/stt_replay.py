@@ -0,0 +1,312 @@
+"""
+Offline load test for the live STT pipeline: replay recordings through /ws/stt's code.
+
+Each simulated session streams a recording through the same pieces the
+WebSocket handler uses -- open_pcm_decoder() for WebM input, LiveSegmenter for
+VAD cuts and partials, GeminiWorker on a shared STTDispatcher -- and drains
+events the way the handler does. Gemini is replaced by a local stub with
+configurable latency and 503 rate, so no network or API key is needed.
+
+Inputs (repeatable; sessions cycle through them):
+  --webm rec.webm   MediaRecorder WebM/Opus, decoded like a live session
+  --pcm  rec.s16le  raw SAMPLE_RATE s16le mono (skips the decoder)
+  (none)            synthesized speech-like bursts separated by pauses
+
+Run:
+  python benchmarks/stt_replay.py --sessions 50 --speed 4 --latency-ms 600 --error-rate 0.1
+  python benchmarks/stt_replay.py --webm a.webm --webm b.webm --sessions 20 --speed 1 --partials
+  python benchmarks/stt_replay.py --sessions 100 --speed 0 --sync      # as fast as possible, thread pool
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+from google.genai import errors as genai_errors
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import stt_gemini  # noqa: E402
+
+WEBM_CHUNK_BYTES = 1000  # ~250 ms MediaRecorder chunk at 32 kbps
+
+
+# -----------------------------------------------------------------------------
+# Stub Gemini client
+# -----------------------------------------------------------------------------
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StubModels:
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _outcome(self):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+            fail = random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+        return n, fail, delay
+
+    def generate_content(self, model, contents, config):
+        n, fail, delay = self._outcome()
+        time.sleep(delay)
+        if fail:
+            raise genai_errors.ServerError(503, {"error": {"message": "stub overloaded"}})
+        return _StubResponse(f"segment {n}")
+
+
+class _StubAsyncModels:
+    def __init__(self, models: _StubModels):
+        self._models = models
+
+    async def generate_content(self, model, contents, config):
+        n, fail, delay = self._models._outcome()
+        await asyncio.sleep(delay)
+        if fail:
+            raise genai_errors.ServerError(503, {"error": {"message": "stub overloaded"}})
+        return _StubResponse(f"segment {n}")
+
+
+class StubGeminiClient:
+    """Duck-types the parts of genai.Client the STT path uses (sync + .aio)."""
+
+    def __init__(self, models: _StubModels):
+        self.models = models
+        self.aio = type("Aio", (), {})()
+        self.aio.models = _StubAsyncModels(models)
+
+
+# -----------------------------------------------------------------------------
+# Inputs
+# -----------------------------------------------------------------------------
+def _synthetic_pcm(seconds: float, seed: int) -> bytes:
+    """Speech-like voiced bursts (1-3 s) separated by 1.5 s pauses."""
+    rng = np.random.default_rng(seed)
+    sr = stt_gemini.SAMPLE_RATE
+    parts, total = [], 0.0
+    while total < seconds:
+        burst = rng.uniform(1.0, 3.0)
+        t = np.arange(int(sr * burst)) / sr
+        f0 = rng.uniform(110, 220)
+        env = np.sin(2 * np.pi * 4 * t) ** 2
+        sig = 0.3 * env * (np.sin(2 * np.pi * f0 * t) + 0.6 * np.sin(2 * np.pi * 3 * f0 * t)
+                           + 0.4 * np.sin(2 * np.pi * 1250 * t))
+        parts.append(sig)
+        parts.append(np.zeros(int(sr * 1.5)))
+        total += burst + 1.5
+    audio = np.concatenate(parts)
+    return (np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def _load_inputs(args) -> list[tuple[str, bytes]]:
+    inputs = []
+    for path in args.webm or []:
+        with open(path, "rb") as f:
+            inputs.append(("webm", f.read()))
+    for path in args.pcm or []:
+        with open(path, "rb") as f:
+            inputs.append(("pcm", f.read()))
+    if not inputs:
+        inputs = [("pcm", _synthetic_pcm(args.seconds, seed)) for seed in range(4)]
+    return inputs
+
+
+# -----------------------------------------------------------------------------
+# One simulated session
+# -----------------------------------------------------------------------------
+def _pcm_blocks(kind: str, data: bytes, speed: float):
+    """Yield decoded PCM blocks, paced so audio arrives at `speed` x real time (0 = unpaced)."""
+    if kind == "pcm":
+        step = stt_gemini.PCM_READ_CHUNK_BYTES
+        t0 = time.monotonic()
+        for i in range(0, len(data), step):
+            if speed > 0:
+                due = t0 + (i / 2 / stt_gemini.SAMPLE_RATE) / speed
+                time.sleep(max(0.0, due - time.monotonic()))
+            yield data[i:i + step]
+        return
+
+    decoder = stt_gemini.open_pcm_decoder()
+
+    def feeder():
+        try:
+            for i in range(0, len(data), WEBM_CHUNK_BYTES):
+                decoder.feed(data[i:i + WEBM_CHUNK_BYTES])
+                if speed > 0:
+                    time.sleep(0.25 / speed)
+        except Exception:
+            pass
+        finally:
+            decoder.close_input()
+
+    threading.Thread(target=feeder, daemon=True).start()
+    try:
+        while not decoder.finished:
+            block = decoder.read(timeout=0.5)
+            if block:
+                yield block
+    finally:
+        decoder.close()
+
+
+def _drain_events(worker, metrics, out: dict):
+    while True:
+        evt = worker.get_event(timeout=0.001)
+        if not evt:
+            return
+        t0 = time.monotonic()
+        json.dumps(evt)  # stand-in for ws.send
+        metrics.mark_sent(evt.get("seg"), (time.monotonic() - t0) * 1000.0, evt.get("type", "status"))
+        out[evt["type"]] = out.get(evt["type"], 0) + 1
+
+
+def run_session(dispatcher, kind: str, data: bytes, args, out: dict):
+    metrics = stt_gemini.get_stt_metrics()
+    worker = stt_gemini.GeminiWorker(dispatcher=dispatcher)
+    segmenter = stt_gemini.LiveSegmenter(worker, args.lang, emit_partials=args.partials, audio_clock=True)
+    try:
+        for block in _pcm_blocks(kind, data, args.speed):
+            segmenter.push(block)
+            _drain_events(worker, metrics, out)
+        segmenter.flush()
+        deadline = time.monotonic() + args.drain_timeout
+        while (worker._pending or worker._in_flight) and time.monotonic() < deadline:
+            _drain_events(worker, metrics, out)
+            time.sleep(0.01)
+        _drain_events(worker, metrics, out)
+        out["finals_submitted"] = segmenter.finals_submitted
+        out["audio_s"] = segmenter.audio_s
+    finally:
+        worker.close()
+
+
+# -----------------------------------------------------------------------------
+# Report
+# -----------------------------------------------------------------------------
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _pct(vals: list, p: float):
+    return round(stt_gemini._percentile(sorted(vals), p / 100.0), 1) if vals else None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--webm", action="append", help="WebM/Opus recording (repeatable)")
+    ap.add_argument("--pcm", action="append", help="raw s16le mono recording at SAMPLE_RATE (repeatable)")
+    ap.add_argument("--seconds", type=float, default=30.0, help="length of synthesized input")
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--speed", type=float, default=1.0, help="x real time; 0 = as fast as possible")
+    ap.add_argument("--latency-ms", type=float, default=800.0, help="stub Gemini latency")
+    ap.add_argument("--jitter-ms", type=float, default=200.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub calls that 503")
+    ap.add_argument("--lang", default="bilingual")
+    ap.add_argument("--partials", action="store_true", help="emit tail-window partials")
+    ap.add_argument("--sync", action="store_true", help="thread-pool dispatcher instead of the asyncio path")
+    ap.add_argument("--pool-size", type=int, default=stt_gemini.STT_POOL_SIZE)
+    ap.add_argument("--drain-timeout", type=float, default=60.0)
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    ap.add_argument("-v", "--verbose", action="store_true", help="show retry/breaker log lines")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+
+    inputs = _load_inputs(args)
+    stub = _StubModels(args.latency_ms, args.jitter_ms, args.error_rate)
+    stt_gemini._STT_METRICS = stt_gemini.STTMetrics(recent=1_000_000)
+    stt_gemini.GEMINI_RETRY_BASE_DELAY = min(stt_gemini.GEMINI_RETRY_BASE_DELAY, 0.2)
+    dispatcher = stt_gemini.STTDispatcher(
+        pool_size=args.pool_size,
+        use_async=not args.sync,
+        client_factory=lambda: StubGeminiClient(stub),
+    )
+
+    peak_threads = [threading.active_count()]
+    peak_rss = [_rss_mb()]
+    done = threading.Event()
+
+    def sampler():
+        while not done.wait(0.1):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+            peak_rss[0] = max(peak_rss[0], _rss_mb())
+
+    threading.Thread(target=sampler, daemon=True).start()
+
+    results = [dict() for _ in range(args.sessions)]
+    threads = [
+        threading.Thread(target=run_session, args=(dispatcher, *inputs[i % len(inputs)], args, results[i]))
+        for i in range(args.sessions)
+    ]
+    t0 = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - t0
+    done.set()
+
+    snap = stt_gemini.get_stt_metrics().snapshot(recent=1_000_000)
+    finals = [t for t in snap["recent"] if t["kind"] == "final"]
+    e2e = [t["end_to_end_ms"] for t in finals if t["end_to_end_ms"] is not None]
+    queue_ms = [t["queue_ms"] for t in finals if t["queue_ms"] is not None]
+    dm = dispatcher.metrics()
+    report = {
+        "sessions": args.sessions,
+        "speed": args.speed,
+        "mode": "sync" if args.sync else "async",
+        "wall_s": round(wall, 2),
+        "audio_s": round(sum(r.get("audio_s", 0.0) for r in results), 1),
+        "segments_submitted": sum(r.get("finals_submitted", 0) for r in results),
+        "finals_received": sum(r.get("final", 0) for r in results),
+        "partials_received": sum(r.get("partial", 0) for r in results),
+        "segments_per_s": round(len(e2e) / wall, 2) if wall else None,
+        "end_to_end_ms": {"p50": _pct(e2e, 50), "p95": _pct(e2e, 95), "p99": _pct(e2e, 99), "max": _pct(e2e, 100)},
+        "queue_wait_ms": {"p50": _pct(queue_ms, 50), "p95": _pct(queue_ms, 95)},
+        "dropped": dm["dropped"],
+        "partials_superseded": dm["partials_superseded"],
+        "outcomes": snap["outcomes"],
+        "stub_calls": stub.calls,
+        "stub_503s": stub.errors,
+        "peak_threads": peak_threads[0],
+        "peak_rss_mb": round(peak_rss[0], 1),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    for key, val in report.items():
+        if key == "outcomes":
+            val = ", ".join(f"{o['kind']}/{o['outcome']}={o['count']}" for o in val)
+        print(f"{key:20s} {val}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# conversation_store.py
+"""
+Server-side working transcript per conversation (what used to be the
+cookie-backed session["conv"] list). The Flask session now carries only
+the conversation id; turns live here, keyed by that id.
+
+ConversationStore is an in-process LRU in front of a durable backend:
+
+  SQLiteTurnBackend : conversation_turns table in the app database (default)
+  RedisTurnBackend  : a list per conversation on any Redis-compatible server
+                      (Redis, Valkey, KeyDB, a local stand-in); needs `redis`
+
+Every turn is written through to the backend. Cached transcripts carry the
+backend's sequence number for their last turn, so a turn appended by
+another worker is noticed (one indexed lookup) and the transcript reloaded.
+Memory is bounded by CONV_STORE_MAX_CONVERSATIONS cached transcripts of at
+most CONV_STORE_MAX_TURNS turns each; the least recently used is evicted.
+
+Pick the backend with CONVERSATION_STORE_URL ("sqlite" or "redis://...").
+"""
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import select, delete, func
+
+import models
+from models import ConversationTurn
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_STORE_URL = os.getenv("CONVERSATION_STORE_URL", "sqlite")
+CONV_STORE_MAX_CONVERSATIONS = int(os.getenv("CONV_STORE_MAX_CONVERSATIONS", "256"))
+CONV_STORE_MAX_TURNS = int(os.getenv("CONV_STORE_MAX_TURNS", "1000"))
+CONV_STORE_REDIS_TTL_S = int(os.getenv("CONV_STORE_REDIS_TTL_S", str(7 * 24 * 3600)))
+
+
+class SQLiteTurnBackend:
+    """Turns as rows in conversation_turns; seq is the row id."""
+
+    def load(self, cid: str, limit: int) -> tuple[list[dict], int]:
+        db = models.ReadSessionLocal()
+        try:
+            rows = db.execute(
+                select(ConversationTurn.id, ConversationTurn.role, ConversationTurn.message)
+                .where(ConversationTurn.conversation_id == cid)
+                .order_by(ConversationTurn.id.desc()).limit(limit)
+            ).all()
+        finally:
+            db.close()
+        rows.reverse()
+        return [{"role": r, "message": m} for _id, r, m in rows], (rows[-1][0] if rows else 0)
+
+    def head(self, cid: str) -> int:
+        db = models.ReadSessionLocal()
+        try:
+            return db.execute(
+                select(func.max(ConversationTurn.id)).where(ConversationTurn.conversation_id == cid)
+            ).scalar() or 0
+        finally:
+            db.close()
+
+    def append(self, cid: str, turn: dict) -> tuple[int, int]:
+        """Insert a turn; returns (its seq, seq of the turn before it)."""
+        with models._write_transaction(models.engine) as conn:
+            seq = conn.execute(
+                ConversationTurn.__table__.insert()
+                .values(conversation_id=cid, role=turn["role"], message=turn["message"],
+                        created_at=datetime.utcnow())
+                .returning(ConversationTurn.id)
+            ).scalar_one()
+            prev = conn.execute(
+                select(func.max(ConversationTurn.id))
+                .where(ConversationTurn.conversation_id == cid, ConversationTurn.id < seq)
+            ).scalar() or 0
+        return seq, prev
+
+    def clear(self, cid: str):
+        with models._write_transaction(models.engine) as conn:
+            conn.execute(delete(ConversationTurn).where(ConversationTurn.conversation_id == cid))
+
+
+class RedisTurnBackend:
+    """Turns as a JSON list at conv:<cid>:turns, seq counter at conv:<cid>:seq.
+
+    `client` is anything speaking the redis-py API (rpush, lrange, ltrim,
+    incr, get, delete, expire, pipeline).
+    """
+
+    def __init__(self, client, max_turns: int = CONV_STORE_MAX_TURNS, ttl_s: int = CONV_STORE_REDIS_TTL_S):
+        self.client = client
+        self.max_turns = max_turns
+        self.ttl_s = ttl_s
+
+    @staticmethod
+    def _keys(cid: str) -> tuple[str, str]:
+        return f"conv:{cid}:turns", f"conv:{cid}:seq"
+
+    def load(self, cid: str, limit: int) -> tuple[list[dict], int]:
+        turns_key, seq_key = self._keys(cid)
+        pipe = self.client.pipeline()
+        pipe.lrange(turns_key, -limit, -1)
+        pipe.get(seq_key)
+        raw, seq = pipe.execute()
+        return [json.loads(t) for t in raw], int(seq or 0)
+
+    def head(self, cid: str) -> int:
+        return int(self.client.get(self._keys(cid)[1]) or 0)
+
+    def append(self, cid: str, turn: dict) -> tuple[int, int]:
+        turns_key, seq_key = self._keys(cid)
+        pipe = self.client.pipeline()
+        pipe.rpush(turns_key, json.dumps(turn))
+        pipe.ltrim(turns_key, -self.max_turns, -1)
+        pipe.incr(seq_key)
+        pipe.expire(turns_key, self.ttl_s)
+        pipe.expire(seq_key, self.ttl_s)
+        seq = int(pipe.execute()[2])
+        return seq, seq - 1
+
+    def clear(self, cid: str):
+        self.client.delete(*self._keys(cid))
+
+
+class ConversationStore:
+    """LRU of recent transcripts over a backend; safe to share between threads."""
+
+    def __init__(self, backend, max_conversations: int = CONV_STORE_MAX_CONVERSATIONS,
+                 max_turns: int = CONV_STORE_MAX_TURNS):
+        self.backend = backend
+        self.max_conversations = max(1, max_conversations)
+        self.max_turns = max(1, max_turns)
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, tuple[int, list[dict]]] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _put(self, cid: str, seq: int, turns: list[dict]):
+        # caller holds the lock
+        self._cache[cid] = (seq, turns[-self.max_turns:])
+        self._cache.move_to_end(cid)
+        while len(self._cache) > self.max_conversations:
+            self._cache.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, cid: str) -> list[dict]:
+        """Turns of `cid`, oldest first (at most max_turns, newest kept). Returns a copy."""
+        head = self.backend.head(cid)
+        with self._lock:
+            hit = self._cache.get(cid)
+            if hit is not None and hit[0] == head:
+                self._cache.move_to_end(cid)
+                self.stats["hits"] += 1
+                return list(hit[1])
+        turns, seq = self.backend.load(cid, self.max_turns)
+        with self._lock:
+            self.stats["misses"] += 1
+            self._put(cid, seq, turns)
+        return list(turns)
+
+    def append(self, cid: str, role: str, message: str) -> list[dict]:
+        """Add a turn; returns the updated transcript (a copy)."""
+        turn = {"role": role, "message": message}
+        seq, prev = self.backend.append(cid, turn)
+        with self._lock:
+            hit = self._cache.get(cid)
+            if hit is not None and hit[0] == prev:
+                turns = hit[1] + [turn]
+                self._put(cid, seq, turns)
+                return list(turns[-self.max_turns:])
+        return self.get(cid)
+
+    def clear(self, cid: str):
+        self.backend.clear(cid)
+        self.evict(cid)
+
+    def evict(self, cid: str):
+        """Drop the cached copy only; the backend keeps the turns."""
+        with self._lock:
+            self._cache.pop(cid, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+
+def make_conversation_store(url: str | None = None, **kwargs) -> ConversationStore:
+    """Store for CONVERSATION_STORE_URL: "sqlite" (default) or redis://host:port/db."""
+    url = (url if url is not None else CONVERSATION_STORE_URL).strip()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis  # optional: only needed for the Redis backend
+        backend = RedisTurnBackend(redis.Redis.from_url(url),
+                                   max_turns=kwargs.get("max_turns", CONV_STORE_MAX_TURNS))
+    elif url in ("", "sqlite"):
+        backend = SQLiteTurnBackend()
+    else:
+        raise ValueError(f"Unsupported CONVERSATION_STORE_URL: {url!r}")
+    logger.info("Conversation store: %s", type(backend).__name__)
+    return ConversationStore(backend, **kwargs)
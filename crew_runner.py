@@ -50,6 +50,7 @@ from typing import List, Dict, Any
 from difflib import SequenceMatcher
 
 from medical_case_faiss import MedicalCaseFAISS
+from question_matcher import normalize_text  # noqa: F401  (re-exported for app.py)
 
 logger = logging.getLogger(__name__)
 
@@ -147,17 +148,6 @@ def build_listener_bundle(convo_text: str, language_mode: str = "bilingual") ->
 
 # ---------------------------- NEW HELPERS (Live Unasked) ----------------------------
 
-def normalize_text(text: str) -> str:
-    """Normalize text for matching: lowercase, remove punctuation-ish, collapse whitespace."""
-    if not text:
-        return ""
-    t = text.lower().strip()
-    t = re.sub(r"[\r\n\t]+", " ", t)
-    t = re.sub(r"[^a-z0-9\s]", " ", t)
-    t = re.sub(r"\s+", " ", t).strip()
-    return t
-
-
 def _safe_json_from_text(text: str) -> Any:
     """Try hard to parse JSON from model output."""
     if not text:
@@ -398,30 +388,33 @@ def rank_questions_for_unasked(
 # False and the throttle was permanently bypassed, flooding the UI with
 # recommendations on every transcription chunk.
 #
-# Fix: track the last emission time on a module-level dict keyed by
-# (user_id, conversation_id), passed in from app.py via live state.
-# The live state dict already exists per-session in app.py; we expose a
-# helper here that the streaming functions use to read/write it.
+# Fix: track the last emission time in the live session state keyed by
+# (user_id, conversation_id), passed in from app.py as a live_state.LiveSession.
+# The check and the stamp happen in one state transaction, so two workers
+# handling chunks of the same session can't both pass the throttle.
 # ---------------------------------------------------------------------------
 
 LIVE_RECO_MIN_INTERVAL_SEC = 7
 
 
-def should_throttle_reco(live_state: dict, lock) -> bool:
+def claim_reco_slot(live_session) -> bool:
     """
-    Return True if a recommendation was emitted within the throttle window.
-    `live_state` is the per-session dict from app.py's LIVE_STATE.
-    `lock` is the LIVE_STATE_LOCK RLock from app.py.
+    Atomically: if no recommendation was emitted within the throttle window,
+    stamp "now" and return True; otherwise return False (throttled).
+    `live_session` is the live_state.LiveSession from app.py.
     """
-    with lock:
-        last_ts = live_state.get("last_reco_ts", 0.0)
-    return (time.time() - last_ts) < float(LIVE_RECO_MIN_INTERVAL_SEC)
+    with live_session.transaction() as st:
+        now = time.time()
+        if (now - float(st.get("last_reco_ts", 0.0))) < float(LIVE_RECO_MIN_INTERVAL_SEC):
+            return False
+        st["last_reco_ts"] = now
+        return True
 
 
-def record_reco_emitted(live_state: dict, lock) -> None:
+def record_reco_emitted(live_session) -> None:
     """Mark that a recommendation was just emitted (update timestamp)."""
-    with lock:
-        live_state["last_reco_ts"] = time.time()
+    with live_session.transaction() as st:
+        st["last_reco_ts"] = time.time()
 
 
 # ---------------------------- EXISTING CORE ----------------------------
@@ -660,15 +653,14 @@ def live_transcription_stream(
     conversation_history: list | None = None,
     log_hook=None,
     session_id=None,
-    # FIX #4: Accept live_state and lock so throttle uses real server-side timestamps.
-    live_state: dict | None = None,
-    live_state_lock=None,
+    # FIX #4: Accept the live session so throttle uses real server-side timestamps.
+    live_session=None,
 ):
     """
     Live transcription mode (final-driven) with coherence validation.
     - We receive FINAL text once per chunk and recommend next question.
     - Finalize path outputs Listener Summary + Final Plan (Listener-only for live mic mode).
-    - Throttle now uses server-side timestamps stored in live_state["last_reco_ts"].
+    - Throttle now uses server-side timestamps stored in the live state's "last_reco_ts".
     """
     llm = load_llm()
     agents = load_agents_from_yaml(AGENT_PATH, llm)
@@ -698,12 +690,11 @@ def live_transcription_stream(
     yield sse_message("Patient", final_text, log_hook, session_id)
 
     # -------------------- FIX #4: CORRECTED THROTTLE --------------------
-    # Check using live_state["last_reco_ts"] (server-side epoch timestamp).
+    # Check-and-stamp the live state's "last_reco_ts" (server-side epoch timestamp).
     # The old check used conversation_history which never contains
     # question_recommender entries, so it was always False.
-    if live_state is not None and live_state_lock is not None:
-        if should_throttle_reco(live_state, live_state_lock):
-            return
+    if live_session is not None and not claim_reco_slot(live_session):
+        return
     # ---------------------------------------------------------------
 
     # 2) Build recommender context from full history
@@ -733,8 +724,8 @@ def live_transcription_stream(
     yield sse_recommender(english_q, swahili_q, log_hook, session_id)
 
     # Update the server-side throttle timestamp AFTER emitting
-    if live_state is not None and live_state_lock is not None:
-        record_reco_emitted(live_state, live_state_lock)
+    if live_session is not None:
+        record_reco_emitted(live_session)
 
     return
 
@@ -0,0 +1,217 @@
+# disease_likelihoods.py
+"""
+Per-conversation disease likelihoods from FAISS case matches, cached in
+conversation_likelihoods.
+
+A cached row is reused while the conversation's patient text (source_hash)
+and the FAISS index (index_version) are both unchanged, so a new patient
+message or a rebuilt index recomputes only the conversations it affects.
+refresh_likelihoods() is the batch job: it walks all conversations, skips
+the fresh ones and encodes/searches the rest in batches.
+
+`faiss_db` is a loaded MedicalCaseFAISS (anything with index_version and
+search_similar_cases_batch).
+
+Run the batch job:
+  python disease_likelihoods.py [--batch-size 64]
+"""
+import os
+import json
+import hashlib
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import select
+
+from models import (
+    ReadSessionLocal,
+    SessionLocal,
+    Conversation,
+    ConversationLikelihood,
+    Message,
+    PATIENT_ROLES,
+    flush_message_log,
+)
+from symptoms import extract_symptoms
+
+logger = logging.getLogger(__name__)
+
+LIKELIHOOD_K = 8                  # FAISS matches per conversation
+LIKELIHOOD_THRESHOLD = 0.05       # be lenient to get a spread of candidates
+LIKELIHOOD_TOP = 5
+LIKELIHOOD_BATCH = int(os.getenv("LIKELIHOOD_BATCH", "64"))
+LIKELIHOOD_SCAN_CHUNK = 500       # conversations loaded per refresh step
+
+
+def conversation_texts(conversation_ids) -> dict[str, str]:
+    """Patient text per conversation (falls back to the full transcript), one query."""
+    ids = list(conversation_ids)
+    if not ids:
+        return {}
+    flush_message_log()
+    patient, everything = defaultdict(list), defaultdict(list)
+    db = ReadSessionLocal()
+    try:
+        rows = db.execute(
+            select(Message.conversation_id, Message.role, Message.message)
+            .where(Message.conversation_id.in_(ids))
+            .order_by(Message.conversation_id, Message.created_at.asc(), Message.id.asc())
+        )
+        for cid, role, text in rows:
+            if not text:
+                continue
+            everything[cid].append(text)
+            if role in PATIENT_ROLES:
+                patient[cid].append(text)
+    finally:
+        db.close()
+    out = {}
+    for cid in everything:
+        text = " ".join(patient[cid]).strip() or " ".join(everything[cid]).strip()
+        if text:
+            out[cid] = text
+    return out
+
+
+def _source_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def aggregate_likelihoods(results) -> dict:
+    """Similarity-weighted vote over Suspected_illness of the matched cases."""
+    weights = defaultdict(float)
+    for r in results:
+        sim = max(float(r.similarity_score), 0.0)
+        sus = r.Suspected_illness or {}
+        if isinstance(sus, dict):
+            for disease, _val in sus.items():
+                if (disease or "").strip():
+                    weights[disease.strip()] += sim
+        elif isinstance(sus, str) and sus.strip():
+            weights[sus.strip()] += sim
+
+    total = sum(weights.values()) or 1.0
+    ranked = sorted(
+        ({"disease": k, "weight": v, "likelihood_pct": round(100.0 * v / total, 1)} for k, v in weights.items()),
+        key=lambda x: (-x["weight"], x["disease"])
+    )[:LIKELIHOOD_TOP]
+    return {
+        "top_diseases": ranked,
+        "faiss_matches": [{
+            "case_id": r.case_id,
+            "similarity": round(float(r.similarity_score), 4),
+            "suspected": r.Suspected_illness
+        } for r in results],
+    }
+
+
+def _cached_rows(conversation_ids) -> dict[str, ConversationLikelihood]:
+    db = ReadSessionLocal()
+    try:
+        rows = db.execute(
+            select(ConversationLikelihood).where(ConversationLikelihood.conversation_id.in_(list(conversation_ids)))
+        ).scalars().all()
+        return {r.conversation_id: r for r in rows}
+    finally:
+        db.close()
+
+
+def _compute_and_store(faiss_db, items: list[tuple[str, str]], batch_size: int) -> dict[str, dict]:
+    """Search + aggregate for (conversation_id, text) pairs and upsert the cache rows."""
+    if not items:
+        return {}
+    results = faiss_db.search_similar_cases_batch(
+        [text for _cid, text in items], k=LIKELIHOOD_K,
+        similarity_threshold=LIKELIHOOD_THRESHOLD, batch_size=batch_size,
+    )
+    now = datetime.utcnow()
+    out = {}
+    db = SessionLocal()
+    try:
+        for (cid, text), matches in zip(items, results):
+            payload = aggregate_likelihoods(matches)
+            db.merge(ConversationLikelihood(
+                conversation_id=cid,
+                index_version=faiss_db.index_version,
+                source_hash=_source_hash(text),
+                result=json.dumps(payload),
+                computed_at=now,
+            ))
+            out[cid] = {**payload, "computed_at": now}
+        db.commit()
+    finally:
+        db.close()
+    return out
+
+
+def get_likelihoods(faiss_db, conversation_id: str) -> dict | None:
+    """Likelihoods for one conversation, from cache when fresh; None if it has no text."""
+    text = conversation_texts([conversation_id]).get(conversation_id)
+    if text is None:
+        return None
+    row = _cached_rows([conversation_id]).get(conversation_id)
+    if row is not None and row.index_version == faiss_db.index_version and row.source_hash == _source_hash(text):
+        payload, computed_at, cached = json.loads(row.result), row.computed_at, True
+    else:
+        fresh = _compute_and_store(faiss_db, [(conversation_id, text)], batch_size=1)[conversation_id]
+        computed_at = fresh.pop("computed_at")
+        payload, cached = fresh, False
+    return {
+        "conversation_id": conversation_id,
+        "symptoms": dict(extract_symptoms(text).most_common()),
+        **payload,
+        "index_version": faiss_db.index_version,
+        "computed_at": computed_at.isoformat(),
+        "cached": cached,
+    }
+
+
+def refresh_likelihoods(faiss_db, batch_size: int = LIKELIHOOD_BATCH) -> dict:
+    """Batch job: recompute likelihoods for every conversation whose cache is stale."""
+    stats = {"checked": 0, "computed": 0, "fresh": 0, "index_version": faiss_db.index_version}
+    last_id = ""
+    while True:
+        db = ReadSessionLocal()
+        try:
+            ids = db.execute(
+                select(Conversation.id).where(Conversation.id > last_id)
+                .order_by(Conversation.id).limit(LIKELIHOOD_SCAN_CHUNK)
+            ).scalars().all()
+        finally:
+            db.close()
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        texts = conversation_texts(ids)
+        cached = _cached_rows(texts)
+        stale = [
+            (cid, text) for cid, text in texts.items()
+            if cid not in cached
+            or cached[cid].index_version != faiss_db.index_version
+            or cached[cid].source_hash != _source_hash(text)
+        ]
+        _compute_and_store(faiss_db, stale, batch_size)
+        stats["checked"] += len(texts)
+        stats["computed"] += len(stale)
+        stats["fresh"] += len(texts) - len(stale)
+    logger.info("Likelihood refresh: %s", stats)
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import Config
+    from medical_case_faiss import MedicalCaseFAISS
+    from models import init_db
+
+    ap = argparse.ArgumentParser(description="Recompute stale per-conversation disease likelihoods.")
+    ap.add_argument("--batch-size", type=int, default=LIKELIHOOD_BATCH)
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    f = MedicalCaseFAISS()
+    f.load_index(Config.FAISS_INDEX_PATH, Config.FAISS_METADATA_PATH)
+    print(refresh_likelihoods(f, batch_size=args.batch_size))
@@ -0,0 +1,455 @@
+# live_state.py
+"""
+Per-session live-mode state (recommended questions, live history, throttle
+timestamp, post-stop context, follow-up turns), keyed by (user_id,
+conversation_id).
+
+Callers go through a LiveSession handle and change state only inside
+transaction(), an atomic read-modify-write on whichever backend is
+configured (LIVE_STATE_URL):
+
+  memory (default)  : LiveStateStore, this process only
+  sqlite            : SQLiteLiveStateBackend on the app database (WAL), shared
+                      by every worker on the host
+  sqlite:///path.db : same, in its own database file
+  redis://...       : RedisLiveStateBackend on any Redis-compatible server,
+                      shared across nodes; needs `redis`
+
+With a shared backend, requests of one live session can land on any
+worker, so no sticky sessions are needed behind a load balancer. Keep
+transactions short (no LLM calls inside): on SQLite one holds the write lock.
+
+    live = LiveSession(LIVE_SESSIONS, (uid, cid))
+    with live.transaction() as st:
+        st["questions"][nq] = {...}
+
+LiveStateStore (in-process) gives each entry its own lock, so concurrent
+live sessions don't contend with each other; the store-wide lock is only
+held to find, insert or evict an entry. Entries are evicted when:
+
+  - idle for LIVE_STATE_IDLE_TTL_S (a background sweeper checks every
+    LIVE_STATE_SWEEP_S; expired entries are also dropped on access),
+  - the store holds more than LIVE_STATE_MAX_ENTRIES entries or more than
+    LIVE_STATE_MAX_BYTES of accounted state (least recently used first).
+
+Sizes are estimates (string lengths plus per-object overhead), re-measured
+when a caller releases an entry's lock, since that is when it may have
+changed the state.
+
+The shared backends expire idle sessions the same way (sweeper / key TTL).
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func
+
+import models
+from models import LiveSessionState
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATE_MAX_ENTRIES = int(os.getenv("LIVE_STATE_MAX_ENTRIES", "1000"))
+LIVE_STATE_MAX_BYTES = int(os.getenv("LIVE_STATE_MAX_BYTES", str(64 * 1024 * 1024)))
+LIVE_STATE_IDLE_TTL_S = float(os.getenv("LIVE_STATE_IDLE_TTL_S", str(2 * 3600)))
+LIVE_STATE_SWEEP_S = float(os.getenv("LIVE_STATE_SWEEP_S", "60"))
+LIVE_STATE_URL = os.getenv("LIVE_STATE_URL", "memory")
+LIVE_STATE_LOCK_TIMEOUT_S = float(os.getenv("LIVE_STATE_LOCK_TIMEOUT_S", "10"))
+
+
+def new_live_state() -> dict:
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "questions": {},
+        "history": [],
+        "last_reco_ts": 0.0,
+    }
+
+
+def approx_size(obj) -> int:
+    """Rough bytes held by JSON-like state (strings by length, fixed cost per container/scalar)."""
+    stack, total = [obj], 0
+    while stack:
+        o = stack.pop()
+        if isinstance(o, str):
+            total += 49 + len(o)
+        elif isinstance(o, dict):
+            total += 64 + 32 * len(o)
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple)):
+            total += 56 + 8 * len(o)
+            stack.extend(o)
+        else:
+            total += 28
+    return total
+
+
+class _EntryLock:
+    """Re-entrant lock for one entry; re-measures the entry on the outermost release."""
+
+    def __init__(self, store, entry):
+        self._lock = threading.RLock()
+        self._store = store
+        self._entry = entry
+        self._depth = 0
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        outermost = self._depth == 0
+        try:
+            if outermost:
+                self._store._account(self._entry)
+        finally:
+            self._lock.release()
+        return False
+
+    # threading.Lock-style API for callers that don't use `with`
+    def acquire(self):
+        self.__enter__()
+
+    def release(self):
+        self.__exit__(None, None, None)
+
+
+class _Entry:
+    __slots__ = ("key", "state", "lock", "last_access", "nbytes")
+
+    def __init__(self, store, key, state):
+        self.key = key
+        self.state = state
+        self.lock = _EntryLock(store, self)
+        self.last_access = time.monotonic()
+        self.nbytes = approx_size(state)
+
+
+class LiveStateStore:
+    """Bounded, TTL-evicting map of live-session state with per-entry locks."""
+
+    def __init__(self, max_entries: int = LIVE_STATE_MAX_ENTRIES, max_bytes: int = LIVE_STATE_MAX_BYTES,
+                 idle_ttl_s: float = LIVE_STATE_IDLE_TTL_S, clock=time.monotonic):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.idle_ttl_s = idle_ttl_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._evictions = {"idle": 0, "lru": 0, "reset": 0}
+        self._sweeper: _Sweeper | None = None
+
+    def get_or_create(self, key) -> tuple[dict, _EntryLock]:
+        """(state, lock) for `key`, creating fresh state if absent or idle-expired."""
+        now = self._clock()
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None and self.idle_ttl_s > 0 and now - e.last_access > self.idle_ttl_s:
+                self._remove(e, "idle")
+                e = None
+            if e is None:
+                e = _Entry(self, key, new_live_state())
+                self._entries[key] = e
+                self._bytes += e.nbytes
+                self._evict_over_budget(keep=e)
+            else:
+                self._entries.move_to_end(key)
+            e.last_access = now
+            return e.state, e.lock
+
+    @contextmanager
+    def transaction(self, key):
+        st, lock = self.get_or_create(key)
+        with lock:
+            yield st
+
+    def get(self, key) -> dict | None:
+        with self._lock:
+            e = self._entries.get(key)
+            return e.state if e is not None else None
+
+    def pop(self, key):
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None:
+                self._remove(e, "reset")
+
+    def sweep(self) -> int:
+        """Drop idle-expired entries; returns how many."""
+        if self.idle_ttl_s <= 0:
+            return 0
+        cutoff = self._clock() - self.idle_ttl_s
+        n = 0
+        with self._lock:
+            # LRU order: the oldest accesses are at the front
+            while self._entries:
+                e = next(iter(self._entries.values()))
+                if e.last_access > cutoff:
+                    break
+                self._remove(e, "idle")
+                n += 1
+        if n:
+            logger.info("Live state sweep evicted %d idle session(s)", n)
+        return n
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_s": self.idle_ttl_s,
+                "evictions": dict(self._evictions),
+                "largest_entry_bytes": max((e.nbytes for e in self._entries.values()), default=0),
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    # -- internals (store lock held unless noted) --
+
+    def _remove(self, e: _Entry, reason: str):
+        del self._entries[e.key]
+        self._bytes -= e.nbytes
+        self._evictions[reason] += 1
+
+    def _evict_over_budget(self, keep: _Entry):
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or (self.max_bytes > 0 and self._bytes > self.max_bytes)):
+            oldest = next(iter(self._entries.values()))
+            if oldest is keep:
+                break
+            self._remove(oldest, "lru")
+
+    def _account(self, e: _Entry):
+        # called with the entry lock held, not the store lock
+        nbytes = approx_size(e.state)
+        with self._lock:
+            e.last_access = self._clock()
+            if self._entries.get(e.key) is not e:
+                return                      # evicted or reset meanwhile
+            self._bytes += nbytes - e.nbytes
+            e.nbytes = nbytes
+            self._evict_over_budget(keep=e)
+
+    def start_sweeper(self, interval_s: float = LIVE_STATE_SWEEP_S):
+        """Start the background idle sweeper (once per store); no-op when interval_s <= 0."""
+        if interval_s <= 0 or self._sweeper is not None:
+            return self._sweeper
+        self._sweeper = _Sweeper(self, interval_s).start()
+        return self._sweeper
+
+
+class _Sweeper:
+    def __init__(self, store: LiveStateStore, interval_s: float):
+        self.store = store
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="live-state-sweeper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.store.sweep()
+            except Exception:
+                logger.exception("Live state sweep failed")
+
+
+class SQLiteLiveStateBackend:
+    """live_session_state rows; each transaction is one BEGIN IMMEDIATE read-modify-write."""
+
+    def __init__(self, engine=None, max_entries: int = LIVE_STATE_MAX_ENTRIES,
+                 idle_ttl_s: float = LIVE_STATE_IDLE_TTL_S):
+        self._engine = engine               # None: the app database (models.engine)
+        self.max_entries = max(1, max_entries)
+        self.idle_ttl_s = idle_ttl_s
+        self._evictions = {"idle": 0, "lru": 0, "reset": 0}
+        self._stats_lock = threading.Lock()
+        self._sweeper: _Sweeper | None = None
+
+    @property
+    def engine(self):
+        return self._engine if self._engine is not None else models.engine
+
+    @staticmethod
+    def _where(key):
+        uid, cid = key
+        return (LiveSessionState.user_id == str(uid)) & (LiveSessionState.conversation_id == str(cid))
+
+    def _count(self, reason: str, n: int = 1):
+        with self._stats_lock:
+            self._evictions[reason] += n
+
+    @contextmanager
+    def transaction(self, key):
+        now = datetime.utcnow()
+        with models._write_transaction(self.engine) as conn:
+            row = conn.execute(
+                select(LiveSessionState.state, LiveSessionState.updated_at).where(self._where(key))
+            ).first()
+            expired = (row is not None and self.idle_ttl_s > 0
+                       and now - row.updated_at > timedelta(seconds=self.idle_ttl_s))
+            if expired:
+                self._count("idle")
+            state = new_live_state() if row is None or expired else json.loads(row.state)
+            yield state
+            blob = json.dumps(state)
+            if row is None:
+                conn.execute(LiveSessionState.__table__.insert().values(
+                    user_id=str(key[0]), conversation_id=str(key[1]),
+                    state=blob, nbytes=len(blob), updated_at=now))
+            else:
+                conn.execute(LiveSessionState.__table__.update().where(self._where(key))
+                             .values(state=blob, nbytes=len(blob), updated_at=now))
+
+    def get(self, key) -> dict | None:
+        with self.engine.connect() as conn:
+            blob = conn.execute(select(LiveSessionState.state).where(self._where(key))).scalar()
+        return json.loads(blob) if blob is not None else None
+
+    def pop(self, key):
+        with models._write_transaction(self.engine) as conn:
+            n = conn.execute(delete(LiveSessionState).where(self._where(key))).rowcount
+        if n:
+            self._count("reset")
+
+    def sweep(self) -> int:
+        """Delete idle-expired sessions, then the least recently updated beyond max_entries."""
+        idle = lru = 0
+        with models._write_transaction(self.engine) as conn:
+            if self.idle_ttl_s > 0:
+                cutoff = datetime.utcnow() - timedelta(seconds=self.idle_ttl_s)
+                idle = conn.execute(delete(LiveSessionState).where(LiveSessionState.updated_at < cutoff)).rowcount
+            over = conn.execute(select(func.count()).select_from(LiveSessionState)).scalar() - self.max_entries
+            if over > 0:
+                oldest = (select(LiveSessionState.user_id, LiveSessionState.conversation_id)
+                          .order_by(LiveSessionState.updated_at).limit(over))
+                for uid, cid in conn.execute(oldest).all():
+                    lru += conn.execute(delete(LiveSessionState).where(self._where((uid, cid)))).rowcount
+        self._count("idle", idle)
+        self._count("lru", lru)
+        if idle or lru:
+            logger.info("Live state sweep evicted %d idle, %d over-limit session(s)", idle, lru)
+        return idle + lru
+
+    def metrics(self) -> dict:
+        with self.engine.connect() as conn:
+            entries, nbytes, largest = conn.execute(select(
+                func.count(), func.coalesce(func.sum(LiveSessionState.nbytes), 0),
+                func.coalesce(func.max(LiveSessionState.nbytes), 0),
+            ).select_from(LiveSessionState)).one()
+        with self._stats_lock:
+            evictions = dict(self._evictions)
+        return {
+            "backend": "sqlite",
+            "entries": entries,
+            "bytes": nbytes,
+            "max_entries": self.max_entries,
+            "idle_ttl_s": self.idle_ttl_s,
+            "evictions": evictions,             # by this process
+            "largest_entry_bytes": largest,
+        }
+
+    start_sweeper = LiveStateStore.start_sweeper
+
+
+class RedisLiveStateBackend:
+    """One JSON value per session at live:<uid>:<cid>, written under a Redis lock.
+
+    `client` is anything speaking the redis-py API (get, set, delete, lock).
+    Idle sessions expire through the key TTL, so there is nothing to sweep.
+    """
+
+    def __init__(self, client, idle_ttl_s: float = LIVE_STATE_IDLE_TTL_S,
+                 lock_timeout_s: float = LIVE_STATE_LOCK_TIMEOUT_S):
+        self.client = client
+        self.idle_ttl_s = idle_ttl_s
+        self.lock_timeout_s = lock_timeout_s
+
+    @staticmethod
+    def _key(key) -> str:
+        return f"live:{key[0]}:{key[1]}"
+
+    @contextmanager
+    def transaction(self, key):
+        k = self._key(key)
+        with self.client.lock(k + ":lock", timeout=self.lock_timeout_s, blocking_timeout=self.lock_timeout_s):
+            raw = self.client.get(k)
+            state = json.loads(raw) if raw else new_live_state()
+            yield state
+            ttl = int(self.idle_ttl_s) if self.idle_ttl_s > 0 else None
+            self.client.set(k, json.dumps(state), ex=ttl)
+
+    def get(self, key) -> dict | None:
+        raw = self.client.get(self._key(key))
+        return json.loads(raw) if raw else None
+
+    def pop(self, key):
+        self.client.delete(self._key(key))
+
+    def sweep(self) -> int:
+        return 0
+
+    def metrics(self) -> dict:
+        return {"backend": "redis", "idle_ttl_s": self.idle_ttl_s}
+
+    def start_sweeper(self, interval_s: float = LIVE_STATE_SWEEP_S):
+        return None
+
+
+class LiveSession:
+    """Handle on one live session's state in a backend."""
+
+    def __init__(self, backend, key):
+        self.backend = backend
+        self.key = key
+
+    def transaction(self):
+        """Context manager yielding the mutable state; changes are stored atomically on exit."""
+        return self.backend.transaction(self.key)
+
+    def reset(self):
+        self.backend.pop(self.key)
+
+
+def make_live_state_backend(url: str | None = None):
+    """Backend for LIVE_STATE_URL: memory (default), sqlite, sqlite:///path or redis://..."""
+    url = (url if url is not None else LIVE_STATE_URL).strip()
+    if url in ("", "memory"):
+        return LiveStateStore()
+    if url == "sqlite":
+        return SQLiteLiveStateBackend()
+    if url.startswith("sqlite:///"):
+        eng = models.make_engine(url)
+        LiveSessionState.__table__.create(eng, checkfirst=True)
+        return SQLiteLiveStateBackend(eng)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis  # optional: only needed for the Redis backend
+        return RedisLiveStateBackend(redis.Redis.from_url(url))
+    raise ValueError(f"Unsupported LIVE_STATE_URL: {url!r}")
+
+
+LIVE_SESSIONS = make_live_state_backend()
+
+
+def live_state_metrics() -> dict:
+    return LIVE_SESSIONS.metrics()
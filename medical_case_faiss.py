@@ -1,4 +1,5 @@
 import json
+import hashlib
 import numpy as np
 import faiss
 import pickle
@@ -41,10 +42,12 @@ class MedicalCaseFAISS:
             model_name: Name of the sentence transformer model to use for embeddings
         """
         self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
         self.index = None
         self.cases = []
         self.case_embeddings = []
         self.dimension = None
+        self.index_version = None
         logger.info(f"Initialized MedicalCaseFAISS with model: {model_name}")
 
     def _extract_case_text(self, case: Dict[str, Any]) -> str:
@@ -188,9 +191,17 @@ class MedicalCaseFAISS:
 
         # Add embeddings to index
         self.index.add(embeddings.astype('float32'))
+        self.index_version = self._compute_index_version()
 
         logger.info(f"Built FAISS index with {self.index.ntotal} cases")
 
+    def _compute_index_version(self) -> str:
+        """Content fingerprint of the index + embedding model, stored with cached results."""
+        h = hashlib.sha256(self.model_name.encode())
+        h.update(faiss.serialize_index(self.index).tobytes())
+        h.update(str(len(self.cases)).encode())
+        return h.hexdigest()[:16]
+
     def search_similar_cases(self, query: str, k: int = 5, similarity_threshold: float = 0.5) -> List[CaseSearchResult]:
         """
         Search for similar cases based on query
@@ -220,18 +231,17 @@ class MedicalCaseFAISS:
         logger.info(f"Top 5 similarities: {similarities[0][:5]}")
         logger.info(f"Top 5 indices: {indices[0][:5]}")
 
-        # Prepare results and filter by similarity threshold
+        results = self._results_from_row(similarities[0], indices[0], k, similarity_threshold)
+        logger.info(f"Returning {len(results)} results after filtering")
+        return results
+
+    def _results_from_row(self, similarities, indices, k: int, similarity_threshold: float) -> List[CaseSearchResult]:
+        """Top-k CaseSearchResults above the threshold from one row of index.search output."""
         results = []
-        for i, (similarity, idx) in enumerate(zip(similarities[0], indices[0])):
-            # Check if index is valid and similarity meets threshold
+        for similarity, idx in zip(similarities, indices):
             if idx >= 0 and idx < len(self.cases) and similarity >= similarity_threshold:
                 case = self.cases[idx]
-
-                # Additional debug info
-                logger.info(f"Result {i}: case_id={case.get('case_id', f'case_{idx}')}, "
-                            f"similarity={similarity:.4f}, index={idx}")
-
-                result = CaseSearchResult(
+                results.append(CaseSearchResult(
                     case_id=case.get('case_id', f'case_{idx}'),
                     similarity_score=float(similarity),
                     patient_background=case.get('patient_background', {}),
@@ -241,16 +251,41 @@ class MedicalCaseFAISS:
                     recommended_questions=case.get('recommended_questions', []),
                     red_flags=case.get('red_flags', {}),
                     Suspected_illness=case.get('Suspected_illness', {})
-                )
-                results.append(result)
-
-                # Stop if we have enough results
+                ))
                 if len(results) >= k:
                     break
-
-        logger.info(f"Returning {len(results)} results after filtering")
         return results
 
+    def search_similar_cases_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        similarity_threshold: float = 0.5,
+        batch_size: int = 64,
+    ) -> List[List[CaseSearchResult]]:
+        """
+        search_similar_cases for many queries: one batched encode and one
+        index.search per `batch_size` queries instead of one of each per query.
+
+        Returns one result list per query, in order.
+        """
+        if self.index is None:
+            raise ValueError("Database not built. Call build_database() first.")
+        if not queries:
+            return []
+
+        search_k = min(len(self.cases), 50)
+        out = []
+        for start in range(0, len(queries), batch_size):
+            chunk = queries[start:start + batch_size]
+            embeddings = np.asarray(self.model.encode(chunk, batch_size=batch_size), dtype='float32')
+            faiss.normalize_L2(embeddings)
+            similarities, indices = self.index.search(embeddings, search_k)
+            for row_sims, row_idx in zip(similarities, indices):
+                out.append(self._results_from_row(row_sims, row_idx, k, similarity_threshold))
+        logger.info(f"Batch search: {len(queries)} queries")
+        return out
+
     # def suggest_questions(self, query: str, k: int = 3, max_questions: int = 10, similarity_threshold: float = 0.5) -> \
     # List[Dict]:
     #     """
@@ -393,6 +428,7 @@ class MedicalCaseFAISS:
         self.cases = metadata['cases']
         self.case_embeddings = metadata['case_embeddings']
         self.dimension = metadata['dimension']
+        self.index_version = self._compute_index_version()
 
         logger.info(f"Loaded index from {index_path} and metadata from {metadata_path}")
         logger.info(f"Database contains {len(self.cases)} cases")
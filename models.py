@@ -1,25 +1,138 @@
 # models.py
 import os
 import re
+import time
+import base64
+import queue
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from sqlalchemy import (
-    create_engine, Column, String, Text, DateTime,
-    ForeignKey, Integer, Boolean, Table, UniqueConstraint
+    create_engine, event, Column, String, Text, DateTime,
+    ForeignKey, Integer, Boolean, Table, UniqueConstraint, Index,
+    select, func, and_, or_, exists, union_all
 )
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import (
     sessionmaker, declarative_base, relationship,
     scoped_session, joinedload
 )
 import uuid as _uuid
 
+from symptoms import extract_symptoms_many, SYMPTOM_LEXICON_VERSION
+
+logger = logging.getLogger(__name__)
+
 # --- Config ---
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///app.db")
 
+# Write-behind message logging (see MessageWriter)
+MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "true").lower() in ("1", "true", "yes", "y")
+MESSAGE_FLUSH_INTERVAL_MS = int(os.getenv("MESSAGE_FLUSH_INTERVAL_MS", "200"))
+MESSAGE_FLUSH_MAX_ROWS = int(os.getenv("MESSAGE_FLUSH_MAX_ROWS", "200"))
+MESSAGE_QUEUE_MAX = int(os.getenv("MESSAGE_QUEUE_MAX", "5000"))
+
+# Admin dashboard counters: full recount interval (seconds, 0 = never)
+ADMIN_COUNTERS_RECONCILE_S = float(os.getenv("ADMIN_COUNTERS_RECONCILE_S", "900"))
+
+# SQLite connection profile (applied on every new connection)
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() in ("1", "true", "yes", "y")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")             # NORMAL is safe under WAL
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))     # per connection
+
+# Pool sized for threaded Flask (SSE streams hold a connection only per query)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
 # --- SQLAlchemy setup ---
-engine = create_engine(DB_URL, echo=False, future=True)
+
+def _is_memory_sqlite(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _apply_sqlite_pragmas(dbapi_conn, read_only: bool):
+    cur = dbapi_conn.cursor()
+    try:
+        if SQLITE_WAL and not read_only:
+            cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cur.execute("PRAGMA query_only=ON")
+    finally:
+        cur.close()
+
+
+def make_engine(url: str = DB_URL, read_only: bool = False):
+    """Engine with the SQLite profile above (WAL, pragmas, QueuePool).
+
+    `read_only` engines set `PRAGMA query_only`, so reporting code can't write
+    and, under WAL, never waits on the writer. Non-SQLite URLs get a plain
+    pooled engine.
+    """
+    kwargs = {"echo": False, "future": True}
+    backend = make_url(url).get_backend_name()
+    if backend != "sqlite":
+        kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                      pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True)
+        return create_engine(url, **kwargs)
+
+    if not _is_memory_sqlite(url):
+        from sqlalchemy.pool import QueuePool
+        kwargs.update(
+            poolclass=QueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000.0},
+        )
+    eng = create_engine(url, **kwargs)
+
+    @event.listens_for(eng, "connect")
+    def _on_connect(dbapi_conn, _record):
+        _apply_sqlite_pragmas(dbapi_conn, read_only=read_only and not _is_memory_sqlite(url))
+
+    return eng
+
+
+engine = make_engine(DB_URL)
+# In-memory DBs are per-connection, so reporting must share the writer's engine there
+read_engine = engine if _is_memory_sqlite(DB_URL) else make_engine(DB_URL, read_only=True)
 SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False))
+# Read-only sessions for admin reporting / analytics
+ReadSessionLocal = scoped_session(sessionmaker(bind=read_engine, autoflush=False, autocommit=False))
 Base = declarative_base()
 
+
+def configure_database(url: str):
+    """Rebind engine, read_engine and both session factories to `url` (tests, tools)."""
+    global engine, read_engine, DB_URL, _MESSAGE_WRITER
+    if _MESSAGE_WRITER is not None:
+        _MESSAGE_WRITER.stop()
+        _MESSAGE_WRITER = None
+    SessionLocal.remove()
+    ReadSessionLocal.remove()
+    old = {engine, read_engine}
+    DB_URL = url
+    engine = make_engine(url)
+    read_engine = engine if _is_memory_sqlite(url) else make_engine(url, read_only=True)
+    SessionLocal.configure(bind=engine)
+    ReadSessionLocal.configure(bind=read_engine)
+    for e in old:
+        e.dispose()
+    return engine
+
 # --- Auth join table (defined before models that reference it) ---
 user_roles = Table(
     "user_roles",
@@ -44,6 +157,12 @@ class Patient(Base):
     clinician_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    # Patient picker: WHERE clinician_id = ? ORDER BY created_at DESC
+    __table_args__ = (
+        Index("ix_patients_clinician_created", "clinician_id", "created_at"),
+        Index("ux_patients_identifier", "identifier", unique=True),
+    )
+
     # FIX #7: replaced deprecated lazy="dynamic" with lazy="select".
     # SQLAlchemy 2.x removed support for lazy="dynamic"; "select" gives the
     # same lazy-loading behaviour without the deprecation warning.
@@ -61,6 +180,11 @@ class Conversation(Base):
     owner_user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), index=True, nullable=True)
 
+    # History list: WHERE owner_user_id = ? ORDER BY created_at DESC, id DESC
+    __table_args__ = (
+        Index("ix_conversations_owner_created", "owner_user_id", "created_at", "id"),
+    )
+
     messages = relationship(
         "Message",
         back_populates="conversation",
@@ -88,9 +212,86 @@ class Message(Base):
     message = Column(Text, nullable=True)
     timestamp = Column(String, nullable=True)           # "HH:MM:SS"
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    symptoms_version = Column(Integer, nullable=True)   # lexicon version it was tagged with (patient rows)
 
     conversation = relationship("Conversation", back_populates="messages")
 
+    # Keyset pagination over a transcript walks (conversation_id, created_at, id);
+    # symptom/likelihood scans read one role of a conversation in order.
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at", "id"),
+        Index("ix_messages_conversation_role_created", "conversation_id", "role", "created_at"),
+    )
+
+
+class MessageSymptom(Base):
+    """Per-message symptom counts, written when a patient message is logged.
+
+    conversation_id and created_at are copied from the message so the admin
+    tallies group and filter without touching messages.
+    """
+    __tablename__ = "message_symptoms"
+    message_id = Column(String, ForeignKey("messages.id"), primary_key=True)
+    symptom = Column(String(64), primary_key=True)
+    conversation_id = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        Index("ix_message_symptoms_conversation", "conversation_id", "symptom"),
+        Index("ix_message_symptoms_created", "created_at"),
+    )
+
+
+class ConversationLikelihood(Base):
+    """Cached FAISS disease likelihoods for one conversation.
+
+    Valid while both the patient text it was computed from (source_hash)
+    and the FAISS index (index_version) are unchanged.
+    """
+    __tablename__ = "conversation_likelihoods"
+    conversation_id = Column(String, ForeignKey("conversations.id"), primary_key=True)
+    index_version = Column(String(64), nullable=False)
+    source_hash = Column(String(64), nullable=False)
+    result = Column(Text, nullable=False)               # JSON: top_diseases, faiss_matches
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ConversationTurn(Base):
+    """Turn in the working transcript the agents are prompted with (conversation_store).
+
+    Only the typed/transcribed turns the client sends (patient, clinician,
+    finalize), not agent output -- that lives in messages.
+    """
+    __tablename__ = "conversation_turns"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversation_id = Column(String, ForeignKey("conversations.id"), nullable=False)
+    role = Column(String(32), nullable=False)
+    message = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_conversation_turns_conversation_id", "conversation_id", "id"),
+    )
+
+
+class LiveSessionState(Base):
+    """Live-mode state of one (user, conversation), shared by all workers.
+
+    JSON blob read-modified-written under BEGIN IMMEDIATE by
+    live_state.SQLiteLiveStateBackend.
+    """
+    __tablename__ = "live_session_state"
+    user_id = Column(String(64), primary_key=True)
+    conversation_id = Column(String, primary_key=True)
+    state = Column(Text, nullable=False)                 # JSON
+    nbytes = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_live_session_state_updated_at", "updated_at"),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
@@ -131,37 +332,475 @@ class ConversationOwner(Base):
 
 # --- Init / helpers ---
 
-def _migrate_add_patient_fk():
-    """Ensure patients table exists and conversations.patient_id exists (for existing DBs)."""
-    from sqlalchemy import inspect, text
-    insp = inspect(engine)
-    if "patients" not in insp.get_table_names():
-        Base.metadata.tables["patients"].create(engine, checkfirst=True)
-    if "conversations" in insp.get_table_names():
-        cols = [c["name"] for c in insp.get_columns("conversations")]
-        if "patient_id" not in cols:
-            with engine.connect() as conn:
-                conn.execute(text("ALTER TABLE conversations ADD COLUMN patient_id INTEGER"))
-                conn.commit()
-
-
-def _migrate_add_user_username():
-    """Add users.username if missing (for existing DBs)."""
+# --- Admin dashboard counters ---
+# /admin/api/summary reads these instead of counting users/conversations/
+# messages on every load. On SQLite, triggers keep them exact in the same
+# transaction as the write (whatever code path does it: log_message's
+# batched inserts, cascade deletes, role edits). A periodic full recount
+# (reconcile_admin_counters) repairs any drift and is the only source of
+# freshness on backends without the triggers.
+
+ADMIN_COUNTER_NAMES = (
+    "users", "clinicians", "admins", "conversations",
+    "messages", "messages_patient", "messages_clinician", "messages_recommended",
+)
+
+admin_counters = Table(
+    "admin_counters", Base.metadata,
+    Column("name", String(64), primary_key=True),
+    Column("value", Integer, nullable=False, default=0),
+    Column("reconciled_at", DateTime, nullable=True),
+)
+
+admin_daily_conversations = Table(
+    "admin_daily_conversations", Base.metadata,
+    Column("day", String(10), primary_key=True),          # YYYY-MM-DD
+    Column("conversations", Integer, nullable=False, default=0),
+)
+
+admin_owner_conversations = Table(
+    "admin_owner_conversations", Base.metadata,
+    Column("owner_user_id", Integer, primary_key=True),
+    Column("conversations", Integer, nullable=False, default=0),
+)
+
+
+def _message_counter_sql(sign: str, row: str) -> str:
+    return f"""UPDATE admin_counters SET value = value {sign} CASE name
+            WHEN 'messages' THEN 1
+            WHEN 'messages_patient' THEN ({row}.role IS 'patient')
+            WHEN 'messages_clinician' THEN ({row}.role IS 'clinician')
+            WHEN 'messages_recommended' THEN ({row}.type IS 'question_recommender')
+        END
+        WHERE name IN ('messages', 'messages_patient', 'messages_clinician', 'messages_recommended');"""
+
+
+def _role_counter_sql(sign: str, row: str) -> str:
+    return f"""UPDATE admin_counters SET value = value {sign} 1
+        WHERE name = (SELECT CASE r.name WHEN 'clinician' THEN 'clinicians' WHEN 'admin' THEN 'admins' END
+                      FROM roles r WHERE r.id = {row}.role_id);"""
+
+
+def _conversation_counter_sql(sign: str, row: str) -> str:
+    if sign == "+":
+        return f"""UPDATE admin_counters SET value = value + 1 WHERE name = 'conversations';
+        INSERT INTO admin_daily_conversations (day, conversations) VALUES (date({row}.created_at), 1)
+            ON CONFLICT(day) DO UPDATE SET conversations = conversations + 1;
+        INSERT INTO admin_owner_conversations (owner_user_id, conversations)
+            SELECT {row}.owner_user_id, 1 WHERE {row}.owner_user_id IS NOT NULL
+            ON CONFLICT(owner_user_id) DO UPDATE SET conversations = conversations + 1;"""
+    return f"""UPDATE admin_counters SET value = value - 1 WHERE name = 'conversations';
+        UPDATE admin_daily_conversations SET conversations = conversations - 1 WHERE day = date({row}.created_at);
+        UPDATE admin_owner_conversations SET conversations = conversations - 1
+            WHERE owner_user_id = {row}.owner_user_id;"""
+
+
+_ADMIN_COUNTER_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS trg_admin_users_ins AFTER INSERT ON users BEGIN
+        UPDATE admin_counters SET value = value + 1 WHERE name = 'users'; END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_admin_users_del AFTER DELETE ON users BEGIN
+        UPDATE admin_counters SET value = value - 1 WHERE name = 'users'; END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_admin_user_roles_ins AFTER INSERT ON user_roles BEGIN
+        {_role_counter_sql("+", "NEW")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_admin_user_roles_del AFTER DELETE ON user_roles BEGIN
+        {_role_counter_sql("-", "OLD")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_admin_conversations_ins AFTER INSERT ON conversations BEGIN
+        {_conversation_counter_sql("+", "NEW")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_admin_conversations_del AFTER DELETE ON conversations BEGIN
+        {_conversation_counter_sql("-", "OLD")} END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_admin_conversations_owner AFTER UPDATE OF owner_user_id ON conversations
+        WHEN OLD.owner_user_id IS NOT NEW.owner_user_id BEGIN
+        UPDATE admin_owner_conversations SET conversations = conversations - 1
+            WHERE owner_user_id = OLD.owner_user_id;
+        INSERT INTO admin_owner_conversations (owner_user_id, conversations)
+            SELECT NEW.owner_user_id, 1 WHERE NEW.owner_user_id IS NOT NULL
+            ON CONFLICT(owner_user_id) DO UPDATE SET conversations = conversations + 1; END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_admin_messages_ins AFTER INSERT ON messages BEGIN
+        {_message_counter_sql("+", "NEW")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_admin_messages_del AFTER DELETE ON messages BEGIN
+        {_message_counter_sql("-", "OLD")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_admin_messages_upd AFTER UPDATE OF role, type ON messages BEGIN
+        {_message_counter_sql("-", "OLD")}
+        {_message_counter_sql("+", "NEW")} END""",
+]
+
+
+def _recount_admin_counters(conn) -> dict:
+    """Recompute every rollup from the base tables; returns {name: (old, new)} for drifted counters."""
+    from sqlalchemy import text
+    old = dict(conn.execute(select(admin_counters.c.name, admin_counters.c.value)).all())
+
+    def role_count(role):
+        return (select(func.count()).select_from(user_roles)
+                .join(Role, Role.id == user_roles.c.role_id).where(Role.name == role))
+
+    def msg_count(*where):
+        return select(func.count()).select_from(Message).where(*where)
+
+    new = dict(conn.execute(select(
+        select(func.count()).select_from(User).scalar_subquery().label("users"),
+        role_count("clinician").scalar_subquery().label("clinicians"),
+        role_count("admin").scalar_subquery().label("admins"),
+        select(func.count()).select_from(Conversation).scalar_subquery().label("conversations"),
+        msg_count().scalar_subquery().label("messages"),
+        msg_count(Message.role == "patient").scalar_subquery().label("messages_patient"),
+        msg_count(Message.role == "clinician").scalar_subquery().label("messages_clinician"),
+        msg_count(Message.type == "question_recommender").scalar_subquery().label("messages_recommended"),
+    )).mappings().one())
+
+    now = datetime.utcnow()
+    conn.execute(admin_counters.delete())
+    conn.execute(admin_counters.insert(), [
+        {"name": n, "value": new[n], "reconciled_at": now} for n in ADMIN_COUNTER_NAMES
+    ])
+    conn.execute(admin_daily_conversations.delete())
+    conn.execute(text(
+        "INSERT INTO admin_daily_conversations (day, conversations) "
+        "SELECT date(created_at), COUNT(*) FROM conversations GROUP BY date(created_at)"
+    ))
+    conn.execute(admin_owner_conversations.delete())
+    conn.execute(text(
+        "INSERT INTO admin_owner_conversations (owner_user_id, conversations) "
+        "SELECT owner_user_id, COUNT(*) FROM conversations WHERE owner_user_id IS NOT NULL "
+        "GROUP BY owner_user_id"
+    ))
+    return {n: (old.get(n), new[n]) for n in ADMIN_COUNTER_NAMES if old and old.get(n) != new[n]}
+
+
+def reconcile_admin_counters(bind=None) -> dict:
+    """Full recount under the write lock; logs and returns any drift found."""
+    bind = bind if bind is not None else engine
+    with _write_transaction(bind) as conn:
+        drift = _recount_admin_counters(conn)
+    if drift:
+        logger.warning("Admin counters drifted, reconciled: %s", drift)
+    return drift
+
+
+def read_admin_summary(bind=None, days: int = 30, top: int = 10) -> dict:
+    """Dashboard rollups (counters, per-day series, top clinicians) in one query."""
+    from sqlalchemy import literal, null
+    bind = bind if bind is not None else read_engine
+    daily = (
+        select(admin_daily_conversations)
+        .where(admin_daily_conversations.c.conversations > 0)
+        .order_by(admin_daily_conversations.c.day)
+        .limit(days)
+        .subquery()
+    )
+    cnt = func.coalesce(admin_owner_conversations.c.conversations, 0)
+    top_q = (
+        select(User.id, cnt.label("cnt"), User.username, User.email)
+        .join(user_roles, user_roles.c.user_id == User.id)
+        .join(Role, and_(Role.id == user_roles.c.role_id, Role.name == "clinician"))
+        .outerjoin(admin_owner_conversations, admin_owner_conversations.c.owner_user_id == User.id)
+        .order_by(cnt.desc())
+        .limit(top)
+        .subquery()
+    )
+    stmt = union_all(
+        select(literal("counter").label("kind"), admin_counters.c.name.label("key"),
+               admin_counters.c.value.label("value"), null().label("username"), null().label("email"),
+               admin_counters.c.reconciled_at.label("reconciled_at")),
+        select(literal("day"), daily.c.day, daily.c.conversations, null(), null(), null()),
+        select(literal("top"), top_q.c.id, top_q.c.cnt, top_q.c.username, top_q.c.email, null()),
+    )
+    counters = dict.fromkeys(ADMIN_COUNTER_NAMES, 0)
+    out = {"counters": counters, "per_day": [], "top_clinicians": [], "reconciled_at": None}
+    with bind.connect() as conn:
+        for r in conn.execute(stmt):
+            if r.kind == "counter":
+                counters[r.key] = r.value
+                ts = r.reconciled_at
+                if isinstance(ts, str):
+                    ts = datetime.fromisoformat(ts)
+                if ts is not None and (out["reconciled_at"] is None or ts < out["reconciled_at"]):
+                    out["reconciled_at"] = ts
+            elif r.kind == "day":
+                out["per_day"].append((r.key, r.value))
+            else:
+                out["top_clinicians"].append(r)
+    out["incremental"] = bind.dialect.name == "sqlite"
+    return out
+
+
+class _CounterReconciler:
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="admin-counter-reconciler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                reconcile_admin_counters()
+            except Exception:
+                logger.exception("Admin counter reconciliation failed")
+
+
+_COUNTER_RECONCILER: _CounterReconciler | None = None
+
+
+def start_counter_reconciler(interval_s: float = ADMIN_COUNTERS_RECONCILE_S):
+    """Start the periodic full recount (once per process); no-op when interval_s <= 0."""
+    global _COUNTER_RECONCILER
+    if interval_s <= 0 or _COUNTER_RECONCILER is not None:
+        return _COUNTER_RECONCILER
+    _COUNTER_RECONCILER = _CounterReconciler(interval_s).start()
+    return _COUNTER_RECONCILER
+
+
+# --- Identifier sequences ---
+# One row per named counter. Allocation is an UPDATE ... RETURNING in the
+# same transaction as the row that uses the value, so concurrent requests
+# serialize on the write lock and can never hand out the same number.
+
+id_sequences = Table(
+    "id_sequences", Base.metadata,
+    Column("name", String(64), primary_key=True),
+    Column("value", Integer, nullable=False, default=0),
+)
+
+PATIENT_SEQUENCE = "patient"
+
+
+def _next_sequence_value(conn, name: str) -> int:
+    n = conn.execute(
+        id_sequences.update()
+        .where(id_sequences.c.name == name)
+        .values(value=id_sequences.c.value + 1)
+        .returning(id_sequences.c.value)
+    ).scalar_one_or_none()
+    if n is None:
+        conn.execute(id_sequences.insert().values(name=name, value=1))
+        n = 1
+    return n
+
+
+def _bump_sequence_to(conn, name: str, at_least: int):
+    conn.execute(
+        id_sequences.update()
+        .where(id_sequences.c.name == name, id_sequences.c.value < at_least)
+        .values(value=at_least)
+    )
+
+
+def _resync_patient_sequence(conn):
+    """Set the patient sequence to the highest P### in use (full scan; migration/recovery only)."""
+    max_n = 0
+    for (ident,) in conn.execute(select(Patient.identifier)):
+        m = _P_ID_RE.match((ident or "").strip())
+        if m:
+            max_n = max(max_n, int(m.group(1)))
+    if conn.execute(select(id_sequences.c.value).where(id_sequences.c.name == PATIENT_SEQUENCE)).first() is None:
+        conn.execute(id_sequences.insert().values(name=PATIENT_SEQUENCE, value=max_n))
+    else:
+        _bump_sequence_to(conn, PATIENT_SEQUENCE, max_n)
+
+
+# --- Schema migrations ---
+# Versioned, append-only. Each step runs in its own transaction together with
+# its schema_version row, so a failed step leaves no partial schema behind and
+# a re-run picks up where it stopped. Steps must also be safe on databases
+# that create_all() has already brought up to date (fresh installs).
+
+schema_version = Table(
+    "schema_version", Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(128), nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow, nullable=False),
+)
+
+
+def _add_column_if_missing(conn, table: str, column: str, ddl: str):
     from sqlalchemy import inspect, text
-    insp = inspect(engine)
-    if "users" not in insp.get_table_names():
-        return
-    cols = [c["name"] for c in insp.get_columns("users")]
-    if "username" not in cols:
-        with engine.connect() as conn:
-            conn.execute(text("ALTER TABLE users ADD COLUMN username VARCHAR(64)"))
-            conn.commit()
+    insp = inspect(conn)
+    if table in insp.get_table_names() and column not in {c["name"] for c in insp.get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _create_indexes(conn, *names: str):
+    wanted = set(names)
+    for table in Base.metadata.sorted_tables:
+        for ix in table.indexes:
+            if ix.name in wanted:
+                ix.create(conn, checkfirst=True)
+
+
+def _m001_patients(conn):
+    """patients table and conversations.patient_id (pre-patient databases)."""
+    Base.metadata.tables["patients"].create(conn, checkfirst=True)
+    _add_column_if_missing(conn, "conversations", "patient_id", "INTEGER")
+
+
+def _m002_user_username(conn):
+    _add_column_if_missing(conn, "users", "username", "VARCHAR(64)")
+
+
+def _m003_message_keyset_index(conn):
+    _create_indexes(conn, "ix_messages_conversation_created")
+
+
+def _m004_composite_indexes(conn):
+    _create_indexes(
+        conn,
+        "ix_conversations_owner_created",
+        "ix_messages_conversation_role_created",
+        "ix_patients_clinician_created",
+    )
+
+
+def _m005_admin_counters(conn):
+    """Counter tables, their triggers (SQLite) and an initial full count."""
+    for table in (admin_counters, admin_daily_conversations, admin_owner_conversations):
+        table.create(conn, checkfirst=True)
+    if conn.dialect.name == "sqlite":
+        for ddl in _ADMIN_COUNTER_TRIGGERS:
+            conn.exec_driver_sql(ddl)
+    _recount_admin_counters(conn)
+
+
+def _m006_message_symptoms(conn):
+    """message_symptoms table, messages.symptoms_version, cleanup trigger.
+
+    Existing patient messages are tagged by backfill_message_symptoms(), not
+    here, so a large database doesn't hold the migration lock for minutes.
+    """
+    MessageSymptom.__table__.create(conn, checkfirst=True)
+    _add_column_if_missing(conn, "messages", "symptoms_version", "INTEGER")
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS trg_message_symptoms_del AFTER DELETE ON messages BEGIN "
+            "DELETE FROM message_symptoms WHERE message_id = OLD.id; END"
+        )
+
+
+def _m007_conversation_likelihoods(conn):
+    ConversationLikelihood.__table__.create(conn, checkfirst=True)
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS trg_conversation_likelihoods_del AFTER DELETE ON conversations BEGIN "
+            "DELETE FROM conversation_likelihoods WHERE conversation_id = OLD.id; END"
+        )
+
+
+def _m008_patient_identifier_sequence(conn):
+    """id_sequences table seeded past the highest P### in use; unique patient identifiers.
+
+    Duplicate identifiers (from the old read-max-then-insert race) keep the
+    oldest row's value; later rows get "-<id>" appended so the index can be built.
+    """
+    from sqlalchemy import text
+    id_sequences.create(conn, checkfirst=True)
+    dupes = conn.execute(text(
+        "SELECT id, identifier FROM patients p WHERE EXISTS ("
+        "SELECT 1 FROM patients q WHERE q.identifier = p.identifier AND q.id < p.id)"
+    )).all()
+    for pid, ident in dupes:
+        logger.warning("Renaming duplicate patient identifier %r (patient %s)", ident, pid)
+        conn.execute(text("UPDATE patients SET identifier = :new WHERE id = :id"),
+                     {"new": f"{ident}-{pid}", "id": pid})
+    _create_indexes(conn, "ux_patients_identifier")
+    _resync_patient_sequence(conn)
+
+
+def _m009_conversation_turns(conn):
+    ConversationTurn.__table__.create(conn, checkfirst=True)
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS trg_conversation_turns_del AFTER DELETE ON conversations BEGIN "
+            "DELETE FROM conversation_turns WHERE conversation_id = OLD.id; END"
+        )
+
+
+def _m010_live_session_state(conn):
+    LiveSessionState.__table__.create(conn, checkfirst=True)
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS trg_live_session_state_del AFTER DELETE ON conversations BEGIN "
+            "DELETE FROM live_session_state WHERE conversation_id = OLD.id; END"
+        )
+
+
+MIGRATIONS = [
+    (1, "patients", _m001_patients),
+    (2, "user_username", _m002_user_username),
+    (3, "message_keyset_index", _m003_message_keyset_index),
+    (4, "composite_indexes", _m004_composite_indexes),
+    (5, "admin_counters", _m005_admin_counters),
+    (6, "message_symptoms", _m006_message_symptoms),
+    (7, "conversation_likelihoods", _m007_conversation_likelihoods),
+    (8, "patient_identifier_sequence", _m008_patient_identifier_sequence),
+    (9, "conversation_turns", _m009_conversation_turns),
+    (10, "live_session_state", _m010_live_session_state),
+]
+
+
+def _applied_versions(conn) -> set[int]:
+    return set(conn.execute(select(schema_version.c.version)).scalars())
+
+
+@contextmanager
+def _write_transaction(bind):
+    """Connection in one write transaction; on SQLite it starts BEGIN IMMEDIATE.
+
+    pysqlite doesn't BEGIN before DDL by itself, and a deferred transaction
+    that reads before writing can lose its WAL snapshot; taking the write
+    lock up front avoids both.
+    """
+    with bind.connect() as conn:
+        if bind.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def run_migrations(bind=None) -> list[int]:
+    """Apply pending MIGRATIONS in order; returns the versions applied now.
+
+    The version check happens inside the step's write transaction, so two
+    workers starting together apply each step once (the second sees it
+    recorded and skips it).
+    """
+    bind = bind if bind is not None else engine
+    schema_version.create(bind, checkfirst=True)
+    applied = []
+    for version, name, step in MIGRATIONS:
+        try:
+            with _write_transaction(bind) as conn:
+                if version in _applied_versions(conn):
+                    continue
+                step(conn)
+                conn.execute(schema_version.insert().values(version=version, name=name))
+        except Exception:
+            logger.exception("Migration %03d_%s failed", version, name)
+            raise
+        logger.info("Applied migration %03d_%s", version, name)
+        applied.append(version)
+    return applied
+
+
+def current_schema_version(bind=None) -> int:
+    bind = bind if bind is not None else engine
+    schema_version.create(bind, checkfirst=True)
+    with bind.connect() as conn:
+        return max(_applied_versions(conn), default=0)
 
 
 def init_db():
     Base.metadata.create_all(bind=engine)
-    _migrate_add_patient_fk()
-    _migrate_add_user_username()
+    run_migrations(engine)
     _seed_roles()
 
 
@@ -189,21 +828,370 @@ def create_conversation(owner_user_id: int | None = None, patient_id: int | None
 
 
 def log_message(conversation_id: str, role: str, message: str, timestamp: str, type_: str = "message"):
-    """Insert a single message row."""
-    db = SessionLocal()
+    """Record a message row.
+
+    With write-behind enabled the row is queued and inserted by MessageWriter in
+    a batch; created_at is stamped here so ordering reflects when it was logged.
+    """
+    row = {
+        "id": str(_uuid.uuid4()),
+        "conversation_id": conversation_id,
+        "role": role,
+        "type": type_,
+        "message": message,
+        "timestamp": timestamp,
+        "created_at": datetime.utcnow(),
+    }
+    writer = get_message_writer()
+    if writer is not None:
+        writer.submit(row)
+    else:
+        _insert_message_rows(engine, [row])
+
+
+# --- Write-behind message logging ---
+
+PATIENT_ROLES = ("patient", "Patient")
+
+
+def _is_patient_role(role) -> bool:
+    return role in PATIENT_ROLES
+
+
+def _symptom_rows(messages) -> list[dict]:
+    """message_symptoms rows for the patient messages among `messages` (dicts/rows)."""
+    patient = [m for m in messages if _is_patient_role(m["role"])]
+    out = []
+    for m, counts in zip(patient, extract_symptoms_many(m["message"] or "" for m in patient)):
+        for symptom, n in counts.items():
+            out.append({
+                "message_id": m["id"],
+                "symptom": symptom,
+                "conversation_id": m["conversation_id"],
+                "created_at": m["created_at"],
+                "count": n,
+            })
+    return out
+
+
+def _insert_message_rows(bind, rows: list[dict]):
+    """One transaction, one executemany; patient messages are symptom-tagged in it."""
+    rows = [
+        {**r, "symptoms_version": SYMPTOM_LEXICON_VERSION if _is_patient_role(r.get("role")) else None}
+        for r in rows
+    ]
+    sym_rows = _symptom_rows(rows)
+    with bind.begin() as conn:
+        conn.execute(Message.__table__.insert(), rows)
+        if sym_rows:
+            conn.execute(MessageSymptom.__table__.insert(), sym_rows)
+
+
+class MessageWriter:
+    """Bounded queue of Message rows drained by a background thread.
+
+    Rows are inserted in one transaction every `flush_interval_ms` or once
+    `max_rows` are waiting, whichever comes first. When the queue is full the
+    caller writes its row synchronously instead of blocking or dropping it.
+    `flush()` waits until everything queued before the call is committed.
+    """
+
+    def __init__(
+        self,
+        bind=None,
+        flush_interval_ms: int = MESSAGE_FLUSH_INTERVAL_MS,
+        max_rows: int = MESSAGE_FLUSH_MAX_ROWS,
+        max_queue: int = MESSAGE_QUEUE_MAX,
+    ):
+        self.bind = bind if bind is not None else engine
+        self.flush_interval_s = max(1, flush_interval_ms) / 1000.0
+        self.max_rows = max(1, max_rows)
+        self._q: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self._stats = {
+            "enqueued": 0, "written": 0, "batches": 0, "sync_writes": 0,
+            "errors": 0, "max_depth": 0, "last_batch_rows": 0, "last_batch_ms": 0.0,
+        }
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, row: dict) -> bool:
+        """Queue a row. Returns False if it had to be written synchronously."""
+        if not self._stopping:
+            try:
+                self._q.put_nowait(row)
+                with self._lock:
+                    self._stats["enqueued"] += 1
+                    self._stats["max_depth"] = max(self._stats["max_depth"], self._q.qsize())
+                return True
+            except queue.Full:
+                pass
+        with self._lock:
+            self._stats["sync_writes"] += 1
+        _insert_message_rows(self.bind, [row])
+        return False
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until rows queued before this call are committed."""
+        if self._thread is None or not self._thread.is_alive():
+            self._drain_inline()
+            return True
+        done = threading.Event()
+        try:
+            self._q.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping = True
+        self.flush(timeout=timeout)
+
+    def _drain_inline(self):
+        rows = []
+        while True:
+            try:
+                item = self._q.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, dict):
+                rows.append(item)
+            else:
+                item.set()
+        if rows:
+            self._write(rows)
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            rows, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval_s
+            while True:
+                if isinstance(item, dict):
+                    rows.append(item)
+                else:
+                    waiters.append(item)  # flush() marker: write now
+                    break
+                if len(rows) >= self.max_rows:
+                    break
+                try:
+                    item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if rows:
+                self._write(rows)
+            for w in waiters:
+                w.set()
+
+    def _write(self, rows: list[dict]):
+        t0 = time.monotonic()
+        try:
+            _insert_message_rows(self.bind, rows)
+        except Exception:
+            logger.exception("Batched message insert failed; retrying row by row")
+            ok = []
+            for row in rows:
+                try:
+                    _insert_message_rows(self.bind, [row])
+                    ok.append(row)
+                except Exception:
+                    logger.exception("Dropping message row %s", row.get("id"))
+                    with self._lock:
+                        self._stats["errors"] += 1
+            rows = ok
+        with self._lock:
+            self._stats["written"] += len(rows)
+            self._stats["batches"] += 1
+            self._stats["last_batch_rows"] = len(rows)
+            self._stats["last_batch_ms"] = round((time.monotonic() - t0) * 1000.0, 2)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+        out["depth"] = self._q.qsize()
+        out["capacity"] = self._q.maxsize
+        out["running"] = bool(self._thread and self._thread.is_alive())
+        return out
+
+
+_MESSAGE_WRITER: MessageWriter | None = None
+_MESSAGE_WRITER_LOCK = threading.Lock()
+
+
+def _write_behind_supported() -> bool:
+    # An in-memory SQLite DB is per-connection; a writer thread would see a different one
+    return MESSAGE_WRITE_BEHIND and ":memory:" not in str(engine.url) and str(engine.url) != "sqlite://"
+
+
+def get_message_writer() -> MessageWriter | None:
+    """Process-wide writer (started on first use), or None when writes are synchronous."""
+    global _MESSAGE_WRITER
+    if _MESSAGE_WRITER is None and _write_behind_supported():
+        with _MESSAGE_WRITER_LOCK:
+            if _MESSAGE_WRITER is None:
+                _MESSAGE_WRITER = MessageWriter().start()
+    return _MESSAGE_WRITER
+
+
+def flush_message_log(timeout: float = 5.0) -> bool:
+    """Make queued messages visible to readers (no-op without a writer)."""
+    if _MESSAGE_WRITER is None or not _MESSAGE_WRITER.pending():
+        return True
+    return _MESSAGE_WRITER.flush(timeout=timeout)
+
+
+def message_writer_metrics() -> dict | None:
+    return _MESSAGE_WRITER.metrics() if _MESSAGE_WRITER is not None else None
+
+
+def db_pool_metrics() -> dict:
+    """Connection pool status for the read/write and read-only engines."""
+    return {"write": engine.pool.status(), "read": read_engine.pool.status() if read_engine is not engine else None}
+
+
+@atexit.register
+def _shutdown_message_writer():
+    if _MESSAGE_WRITER is not None:
+        _MESSAGE_WRITER.stop()
+
+
+# --- Symptom tallies (message_symptoms) ---
+
+def _symptoms_stale_clause():
+    return and_(
+        Message.role.in_(PATIENT_ROLES),
+        or_(Message.symptoms_version.is_(None), Message.symptoms_version != SYMPTOM_LEXICON_VERSION),
+    )
+
+
+def backfill_message_symptoms(batch_size: int = 500, bind=None) -> int:
+    """Tag patient messages that predate message_symptoms or an older lexicon.
+
+    Works in short batches (one write transaction each) so live logging keeps
+    flowing; returns the number of messages tagged.
+    """
+    from sqlalchemy import delete, update
+    bind = bind if bind is not None else engine
+    cols = (Message.id, Message.conversation_id, Message.role, Message.message, Message.created_at)
+    tagged = 0
+    while True:
+        with _write_transaction(bind) as conn:
+            batch = conn.execute(
+                select(*cols).where(_symptoms_stale_clause()).limit(batch_size)
+            ).mappings().all()
+            if not batch:
+                break
+            ids = [m["id"] for m in batch]
+            conn.execute(delete(MessageSymptom).where(MessageSymptom.message_id.in_(ids)))
+            sym_rows = _symptom_rows(batch)
+            if sym_rows:
+                conn.execute(MessageSymptom.__table__.insert(), sym_rows)
+            conn.execute(
+                update(Message).where(Message.id.in_(ids)).values(symptoms_version=SYMPTOM_LEXICON_VERSION)
+            )
+        tagged += len(batch)
+    if tagged:
+        logger.info("Symptom backfill tagged %d messages", tagged)
+    return tagged
+
+
+def symptom_backfill_pending(bind=None) -> bool:
+    bind = bind if bind is not None else read_engine
+    with bind.connect() as conn:
+        return bool(conn.execute(select(exists().where(_symptoms_stale_clause()))).scalar())
+
+
+def start_symptom_backfill():
+    """Run backfill_message_symptoms once on a daemon thread (app startup)."""
+    def _run():
+        try:
+            backfill_message_symptoms()
+        except Exception:
+            logger.exception("Symptom backfill failed")
+    t = threading.Thread(target=_run, name="symptom-backfill", daemon=True)
+    t.start()
+    return t
+
+
+def symptom_tallies(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    clinician_id: int | None = None,
+    page: int = 1,
+    size: int = 50,
+) -> dict:
+    """Symptom counts from message_symptoms: global totals plus one page of conversations.
+
+    `start`/`end` (end exclusive) bound message time for the counts and
+    conversation start time for the page; `clinician_id` restricts both to
+    that owner's conversations. Conversations are newest first, as before.
+    """
+    flush_message_log()
+    ms = MessageSymptom
+    sym_filters = []
+    if start is not None:
+        sym_filters.append(ms.created_at >= start)
+    if end is not None:
+        sym_filters.append(ms.created_at < end)
+
+    conv_filters = []
+    if clinician_id is not None:
+        conv_filters.append(Conversation.owner_user_id == clinician_id)
+    if start is not None:
+        conv_filters.append(Conversation.created_at >= start)
+    if end is not None:
+        conv_filters.append(Conversation.created_at < end)
+
+    total_q = func.sum(ms.count)
+    global_q = select(ms.symptom, total_q.label("n")).where(*sym_filters)
+    if clinician_id is not None:
+        global_q = global_q.join(Conversation, Conversation.id == ms.conversation_id).where(
+            Conversation.owner_user_id == clinician_id)
+    global_q = global_q.group_by(ms.symptom).order_by(total_q.desc(), ms.symptom)
+
+    page_q = (
+        select(Conversation.id, Conversation.created_at, Conversation.owner_user_id, User.username, User.email)
+        .outerjoin(User, User.id == Conversation.owner_user_id)
+        .where(*conv_filters)
+        .order_by(Conversation.created_at.desc(), Conversation.id.desc())
+        .offset((page - 1) * size)
+        .limit(size)
+    )
+
+    db = ReadSessionLocal()
     try:
-        db.add(Message(
-            id=str(_uuid.uuid4()),
-            conversation_id=conversation_id,
-            role=role,
-            type=type_,
-            message=message,
-            timestamp=timestamp
-        ))
-        db.commit()
+        global_counts = [(r.symptom, int(r.n)) for r in db.execute(global_q)]
+        total = db.execute(select(func.count()).select_from(Conversation).where(*conv_filters)).scalar_one()
+        convs = db.execute(page_q).all()
+        per_conv = {c.id: [] for c in convs}
+        if convs:
+            rows = db.execute(
+                select(ms.conversation_id, ms.symptom, total_q.label("n"))
+                .where(ms.conversation_id.in_(list(per_conv)), *sym_filters)
+                .group_by(ms.conversation_id, ms.symptom)
+                .order_by(ms.conversation_id, total_q.desc(), ms.symptom)
+            )
+            for r in rows:
+                per_conv[r.conversation_id].append((r.symptom, int(r.n)))
     finally:
         db.close()
 
+    return {
+        "global": global_counts,
+        "conversations": [(c, per_conv[c.id]) for c in convs],
+        "total": total,
+    }
+
 
 # admin helpers
 def list_conversations():
@@ -229,6 +1217,95 @@ def list_conversations_for_user(user_id: int):
         db.close()
 
 
+# --- Keyset cursors: opaque "<created_at iso>|<id>" tokens ---
+
+def encode_cursor(created_at: datetime, row_id) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError on a malformed token."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), row_id
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+CONVERSATION_PREVIEW_CHARS = 80
+
+
+def list_conversation_summaries_for_user(user_id: int, limit: int | None = 50, cursor: str | None = None):
+    """History list in one statement: non-empty conversations, newest first.
+
+    Returns (rows, next_cursor). Each row has id, created_at, patient_id,
+    message_count and first_message (cut to CONVERSATION_PREVIEW_CHARS + 1 so
+    callers can tell it was truncated). A window function numbers/counts the
+    messages of only the conversations on this page.
+    """
+    flush_message_log()
+    conds = [
+        Conversation.owner_user_id == user_id,
+        exists().where(Message.conversation_id == Conversation.id),
+    ]
+    if cursor:
+        c_ts, c_id = decode_cursor(cursor)
+        conds.append(or_(
+            Conversation.created_at < c_ts,
+            and_(Conversation.created_at == c_ts, Conversation.id < c_id),
+        ))
+    page = (
+        select(Conversation.id, Conversation.created_at, Conversation.patient_id)
+        .where(*conds)
+        .order_by(Conversation.created_at.desc(), Conversation.id.desc())
+    )
+    if limit is not None:
+        page = page.limit(limit + 1)
+    page = page.cte("page")
+
+    ranked = (
+        select(
+            Message.conversation_id,
+            func.row_number().over(
+                partition_by=Message.conversation_id,
+                order_by=(Message.created_at.asc(), Message.id.asc()),
+            ).label("rn"),
+            func.count().over(partition_by=Message.conversation_id).label("message_count"),
+            func.substr(Message.message, 1, CONVERSATION_PREVIEW_CHARS + 1).label("first_message"),
+        )
+        .join(page, page.c.id == Message.conversation_id)
+        .subquery("ranked")
+    )
+    stmt = (
+        select(page.c.id, page.c.created_at, page.c.patient_id, ranked.c.message_count, ranked.c.first_message)
+        .join(ranked, and_(ranked.c.conversation_id == page.c.id, ranked.c.rn == 1))
+        .order_by(page.c.created_at.desc(), page.c.id.desc())
+    )
+
+    db = ReadSessionLocal()
+    try:
+        rows = [
+            {
+                "id": r.id,
+                "created_at": r.created_at,
+                "patient_id": r.patient_id,
+                "message_count": r.message_count,
+                "first_message": r.first_message or "",
+            }
+            for r in db.execute(stmt)
+        ]
+    finally:
+        db.close()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return rows, next_cursor
+
+
 def get_conversation_if_owned_by(conversation_id: str, user_id: int):
     """Return conversation only if it belongs to this user (or None). Loads patient."""
     db = SessionLocal()
@@ -267,6 +1344,7 @@ def update_conversation_patient(conversation_id: str, user_id: int, patient_id:
 
 def delete_conversation_by_id(conversation_id: str) -> bool:
     """Admin helper: delete a conversation (and its messages) regardless of owner."""
+    flush_message_log()
     db = SessionLocal()
     try:
         c = db.query(Conversation).filter(Conversation.id == conversation_id).first()
@@ -281,6 +1359,7 @@ def delete_conversation_by_id(conversation_id: str) -> bool:
 
 def delete_conversation_if_owned_by(conversation_id: str, user_id: int) -> bool:
     """Delete this conversation if owned by user (messages cascade). Returns True if deleted."""
+    flush_message_log()
     db = SessionLocal()
     try:
         c = (
@@ -304,19 +1383,22 @@ def delete_conversation_if_owned_by(conversation_id: str, user_id: int) -> bool:
 _P_ID_RE = re.compile(r"^P(\d+)$", re.IGNORECASE)
 
 
+def format_patient_identifier(n: int) -> str:
+    return f"P{n:03d}"
+
+
 def get_next_global_patient_identifier() -> str:
-    """Next patient identifier (P001, P002, ...) counting from latest in DB."""
+    """Identifier the next allocation will most likely get (P001, P002, ...).
+
+    A preview only -- it reserves nothing. Use allocate_patient() to create a
+    patient with a guaranteed-unique identifier.
+    """
     db = SessionLocal()
     try:
-        rows = db.query(Patient.identifier).all()
-        max_n = 0
-        for (ident,) in rows:
-            if not ident:
-                continue
-            m = _P_ID_RE.match(ident.strip())
-            if m:
-                max_n = max(max_n, int(m.group(1)))
-        return f"P{max_n + 1:03d}"
+        n = db.execute(
+            select(id_sequences.c.value).where(id_sequences.c.name == PATIENT_SEQUENCE)
+        ).scalar_one_or_none()
+        return format_patient_identifier((n or 0) + 1)
     finally:
         db.close()
 
@@ -335,16 +1417,117 @@ def list_patients_for_user(clinician_id: int):
         db.close()
 
 
-def create_patient(identifier: str, clinician_id: int | None = None, display_name: str | None = None) -> int:
-    """Create a patient; returns new patient id."""
-    db = SessionLocal()
+def _insert_patient(conn, identifier: str, clinician_id, display_name) -> int:
+    return conn.execute(
+        Patient.__table__.insert()
+        .values(identifier=identifier, clinician_id=clinician_id, display_name=display_name)
+        .returning(Patient.id)
+    ).scalar_one()
+
+
+def allocate_patient(clinician_id: int | None = None, display_name: str | None = None) -> tuple[int, str]:
+    """Create a patient with the next global P### identifier; returns (patient_id, identifier).
+
+    The sequence bump and the insert commit together. If the number is
+    already taken (a row inserted around the sequence), the sequence is
+    resynced from the table and allocation retried.
+    """
+    from sqlalchemy.exc import IntegrityError
+    for attempt in range(3):
+        try:
+            with _write_transaction(engine) as conn:
+                identifier = format_patient_identifier(_next_sequence_value(conn, PATIENT_SEQUENCE))
+                pid = _insert_patient(conn, identifier, clinician_id, display_name)
+            break
+        except IntegrityError:
+            if attempt == 2:
+                raise
+            logger.warning("Patient identifier collision; resyncing sequence")
+            with _write_transaction(engine) as conn:
+                _resync_patient_sequence(conn)
+    if clinician_id is not None:
+        invalidate_patient_ordinals(clinician_id)
+    return pid, identifier
+
+
+def create_patient(identifier: str | None = None, clinician_id: int | None = None,
+                   display_name: str | None = None) -> int:
+    """Create a patient; returns new patient id.
+
+    Without an identifier one is allocated (see allocate_patient). An explicit
+    identifier must be unique (IntegrityError otherwise); an explicit P###
+    moves the sequence past it so allocation never collides with it.
+    """
+    if identifier is None:
+        return allocate_patient(clinician_id, display_name)[0]
+    with _write_transaction(engine) as conn:
+        pid = _insert_patient(conn, identifier, clinician_id, display_name)
+        m = _P_ID_RE.match(identifier.strip())
+        if m:
+            _bump_sequence_to(conn, PATIENT_SEQUENCE, int(m.group(1)))
+    if clinician_id is not None:
+        invalidate_patient_ordinals(clinician_id)
+    return pid
+
+
+# --- Patient ordinals ("Patient N" labels) ---
+# N is the patient's rank by id among its clinician's patients. Maps are
+# cached per clinician and dropped by create_patient; the TTL and the
+# refetch-on-unknown-id below cover patients created by other processes.
+PATIENT_ORDINAL_CACHE_TTL_S = float(os.getenv("PATIENT_ORDINAL_CACHE_TTL_S", "300"))
+_PATIENT_ORDINALS: dict[int, tuple[float, dict[int, int]]] = {}
+_PATIENT_ORDINALS_LOCK = threading.Lock()
+
+
+def invalidate_patient_ordinals(clinician_id: int | None = None):
+    with _PATIENT_ORDINALS_LOCK:
+        if clinician_id is None:
+            _PATIENT_ORDINALS.clear()
+        else:
+            _PATIENT_ORDINALS.pop(int(clinician_id), None)
+
+
+def _fetch_patient_ordinals(clinician_ids) -> dict[int, dict[int, int]]:
+    """One windowed query: {clinician_id: {patient_id: ordinal}}."""
+    rn = func.row_number().over(partition_by=Patient.clinician_id, order_by=Patient.id).label("n")
+    stmt = select(Patient.clinician_id, Patient.id, rn).where(Patient.clinician_id.in_(list(clinician_ids)))
+    out = {c: {} for c in clinician_ids}
+    db = ReadSessionLocal()
     try:
-        p = Patient(identifier=identifier, clinician_id=clinician_id, display_name=display_name)
-        db.add(p)
-        db.commit()
-        return p.id
+        for clinician_id, patient_id, n in db.execute(stmt):
+            out[clinician_id][patient_id] = n
     finally:
         db.close()
+    return out
+
+
+def patient_ordinals(clinician_ids, patient_ids=()) -> dict[int, dict[int, int]]:
+    """{clinician_id: {patient_id: ordinal}} for every given clinician, in at most one query.
+
+    Pass the patient ids you are about to label as `patient_ids`: if any is
+    missing from the cached maps they are refetched (it may be a patient
+    created by another worker since the maps were cached).
+    """
+    wanted = {int(c) for c in clinician_ids if c is not None}
+    now = time.monotonic()
+    out, missing = {}, set()
+    with _PATIENT_ORDINALS_LOCK:
+        for c in wanted:
+            entry = _PATIENT_ORDINALS.get(c)
+            if entry is not None and now - entry[0] < PATIENT_ORDINAL_CACHE_TTL_S:
+                out[c] = entry[1]
+            else:
+                missing.add(c)
+    known = set().union(*out.values()) if out else set()
+    if any(p is not None and int(p) not in known for p in patient_ids):
+        missing |= set(out)
+    if missing:
+        fetched = _fetch_patient_ordinals(missing)
+        with _PATIENT_ORDINALS_LOCK:
+            for c, ordinals in fetched.items():
+                _PATIENT_ORDINALS[c] = (now, ordinals)
+        out.update(fetched)
+    return out
 
 
 def get_patient(patient_id: int):
@@ -357,13 +1540,103 @@ def get_patient(patient_id: int):
 
 
 def get_conversation_messages(conversation_id: str):
+    flush_message_log()
     db = SessionLocal()
     try:
         return (
             db.query(Message)
             .filter(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.asc())
+            .order_by(Message.created_at.asc(), Message.id.asc())
             .all()
         )
     finally:
         db.close()
+
+
+# --- Transcript pagination (keyset over (created_at, id)) ---
+MESSAGE_PAGE_DEFAULT = int(os.getenv("MESSAGE_PAGE_DEFAULT", "100"))
+MESSAGE_PAGE_MAX = int(os.getenv("MESSAGE_PAGE_MAX", "500"))
+
+
+def count_conversation_messages(conversation_id: str) -> int:
+    flush_message_log()
+    db = ReadSessionLocal()
+    try:
+        return db.execute(
+            select(func.count()).select_from(Message).where(Message.conversation_id == conversation_id)
+        ).scalar_one()
+    finally:
+        db.close()
+
+
+def get_conversation_messages_page(
+    conversation_id: str,
+    limit: int = MESSAGE_PAGE_DEFAULT,
+    before: str | None = None,
+    after: str | None = None,
+    from_start: bool = False,
+):
+    """One page of a transcript, always returned oldest-first.
+
+    By default (or with `before`) this is the newest `limit` messages older
+    than the cursor -- the "load older" direction. With `from_start` it is the
+    first `limit` messages, and with `after` the next `limit` after the cursor,
+    for reading forward. Returns (messages, cursor); cursor continues in the
+    same direction and is None when there is nothing further. Raises
+    ValueError on a bad cursor.
+    """
+    if before and (after or from_start):
+        raise ValueError("before cannot be combined with a forward read")
+    forward = from_start or bool(after)
+    limit = max(1, min(int(limit), MESSAGE_PAGE_MAX))
+    flush_message_log()
+
+    stmt = select(Message).where(Message.conversation_id == conversation_id)
+    if forward:
+        if after:
+            c_ts, c_id = decode_cursor(after)
+            stmt = stmt.where(or_(
+                Message.created_at > c_ts,
+                and_(Message.created_at == c_ts, Message.id > c_id),
+            ))
+        stmt = stmt.order_by(Message.created_at.asc(), Message.id.asc())
+    else:
+        if before:
+            c_ts, c_id = decode_cursor(before)
+            stmt = stmt.where(or_(
+                Message.created_at < c_ts,
+                and_(Message.created_at == c_ts, Message.id < c_id),
+            ))
+        stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc())
+    stmt = stmt.limit(limit + 1)
+
+    db = ReadSessionLocal()
+    try:
+        msgs = list(db.scalars(stmt))
+    finally:
+        db.close()
+
+    cursor = None
+    if len(msgs) > limit:
+        msgs = msgs[:limit]
+        edge = msgs[-1]
+        cursor = encode_cursor(edge.created_at, edge.id)
+    if not forward:
+        msgs.reverse()
+    return msgs, cursor
+
+
+def iter_conversation_messages(conversation_id: str, batch_size: int = MESSAGE_PAGE_MAX):
+    """Yield a whole transcript oldest-first, one keyset page at a time.
+
+    Each page runs on its own short read session, so a long export never
+    holds a connection (or every row) for the length of the response.
+    """
+    cursor = None
+    while True:
+        msgs, cursor = get_conversation_messages_page(
+            conversation_id, limit=batch_size, after=cursor, from_start=True
+        )
+        yield from msgs
+        if cursor is None:
+            return
@@ -0,0 +1,171 @@
+# question_matcher.py
+"""
+Marks planned live-mode questions as asked when a final transcript chunk
+covers them.
+
+The index lives in the live session state itself (plain JSON, so it works
+with every live_state backend):
+
+  st["questions"][nq]["tokens"]  sorted token list of the normalized question
+  st["q_index"][token]           normalized questions, not yet asked, containing token
+
+/live/plan adds questions through add_question(); /live/mark_asked calls
+match_asked(), which only looks at questions sharing at least one token
+with the transcript (overlap counted from the postings), so the cost
+follows the transcript length, not the plan size. Asked questions leave the
+index.
+
+A question is asked when the transcript contains it as a phrase, or when
+they share >= MIN_OVERLAP tokens covering >= MIN_RATIO of the shorter side.
+Optionally (LIVE_MATCH_EMBEDDINGS=1) remaining candidates are compared by
+MiniLM embedding; question vectors are cached per process.
+
+No Flask/DB imports, like symptoms.py.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+MIN_OVERLAP = 3
+MIN_RATIO = 0.55
+
+LIVE_MATCH_EMBEDDINGS = os.getenv("LIVE_MATCH_EMBEDDINGS", "0") == "1"
+LIVE_MATCH_EMBED_SIM = float(os.getenv("LIVE_MATCH_EMBED_SIM", "0.8"))
+LIVE_MATCH_EMBED_MIN_OVERLAP = int(os.getenv("LIVE_MATCH_EMBED_MIN_OVERLAP", "2"))
+LIVE_MATCH_EMBED_CACHE = int(os.getenv("LIVE_MATCH_EMBED_CACHE", "4096"))
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for matching: lowercase, remove punctuation-ish, collapse whitespace."""
+    if not text:
+        return ""
+    t = text.lower().strip()
+    t = re.sub(r"[\r\n\t]+", " ", t)
+    t = re.sub(r"[^a-z0-9\s]", " ", t)
+    t = re.sub(r"\s+", " ", t).strip()
+    return t
+
+
+def ensure_index(st: dict) -> dict:
+    """The state's token -> [nq] index, (re)built if the state predates it."""
+    index = st.get("q_index")
+    if index is None:
+        index = st["q_index"] = {}
+        for nq, qobj in st["questions"].items():
+            qobj["tokens"] = sorted(set(nq.split()))
+            if not qobj.get("asked"):
+                for tok in qobj["tokens"]:
+                    index.setdefault(tok, []).append(nq)
+    return index
+
+
+def add_question(st: dict, question: str, added_at: str) -> bool:
+    """Add a planned question (deduplicated by normalized text); True if new."""
+    q = (question or "").strip()
+    nq = normalize_text(q)
+    if not nq:
+        return False
+    index = ensure_index(st)
+    if nq in st["questions"]:
+        return False
+    tokens = sorted(set(nq.split()))
+    st["questions"][nq] = {
+        "question": q,
+        "score": None,
+        "added_at": added_at,
+        "asked": False,
+        "tokens": tokens,
+    }
+    for tok in tokens:
+        index.setdefault(tok, []).append(nq)
+    return True
+
+
+def mark_asked(st: dict, nq: str) -> bool:
+    """Mark one question asked and drop it from the index; False if unknown or already asked."""
+    qobj = st["questions"].get(nq)
+    if qobj is None or qobj.get("asked"):
+        return False
+    qobj["asked"] = True
+    index = ensure_index(st)
+    for tok in qobj.get("tokens") or nq.split():
+        postings = index.get(tok)
+        if postings and nq in postings:
+            postings.remove(nq)
+            if not postings:
+                del index[tok]
+    return True
+
+
+def match_asked(st: dict, final_text: str) -> tuple[list[str], list[tuple[str, str]]]:
+    """Mark questions covered by `final_text` as asked.
+
+    Returns (newly asked nqs, near misses as (nq, question)) -- the near
+    misses share >= LIVE_MATCH_EMBED_MIN_OVERLAP tokens and are what an
+    embedding check should look at.
+    """
+    norm_final = normalize_text(final_text)
+    final_tokens = set(norm_final.split())
+    if not final_tokens:
+        return [], []
+    index = ensure_index(st)
+
+    overlap = defaultdict(int)
+    for tok in final_tokens:
+        for nq in index.get(tok, ()):
+            overlap[nq] += 1
+
+    padded = f" {norm_final} "
+    asked, near = [], []
+    for nq, n in overlap.items():
+        qobj = st["questions"][nq]
+        n_tokens = len(qobj.get("tokens") or ()) or 1
+        ratio = n / max(1, min(n_tokens, len(final_tokens)))
+        if (n == n_tokens and f" {nq} " in padded) or (n >= MIN_OVERLAP and ratio >= MIN_RATIO):
+            asked.append(nq)
+        elif n >= LIVE_MATCH_EMBED_MIN_OVERLAP:
+            near.append((nq, qobj["question"]))
+    for nq in asked:
+        mark_asked(st, nq)
+    return asked, near
+
+
+class EmbeddingMatcher:
+    """Cosine check of a transcript against candidate questions with a SentenceTransformer.
+
+    Question vectors are kept in an LRU (questions recur across sessions);
+    the transcript is encoded once per call.
+    """
+
+    def __init__(self, model, threshold: float = LIVE_MATCH_EMBED_SIM, max_cached: int = LIVE_MATCH_EMBED_CACHE):
+        self.model = model
+        self.threshold = threshold
+        self.max_cached = max(1, max_cached)
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _vectors(self, texts: list[str]) -> list:
+        with self._lock:
+            hits = {t: self._cache[t] for t in texts if t in self._cache}
+            for t in hits:
+                self._cache.move_to_end(t)
+        missing = [t for t in dict.fromkeys(texts) if t not in hits]
+        if missing:
+            vecs = self.model.encode(missing, normalize_embeddings=True, show_progress_bar=False)
+            with self._lock:
+                for t, v in zip(missing, vecs):
+                    hits[t] = self._cache[t] = v
+                    self._cache.move_to_end(t)
+                while len(self._cache) > self.max_cached:
+                    self._cache.popitem(last=False)
+        return [hits[t] for t in texts]
+
+    def matches(self, final_text: str, candidates: list[tuple[str, str]]) -> list[str]:
+        """nqs of the candidates whose question is similar enough to `final_text`."""
+        if not candidates:
+            return []
+        final_vec = self.model.encode([final_text], normalize_embeddings=True, show_progress_bar=False)[0]
+        q_vecs = self._vectors([nq for nq, _q in candidates])
+        return [nq for (nq, _q), v in zip(candidates, q_vecs)
+                if float((v * final_vec).sum()) >= self.threshold]
@@ -760,28 +760,50 @@ window.openCreatePatientModal = openCreatePatientModal;
 window.handleCreatePatient = handleCreatePatient;
 
 // ===== Analytics (Symptoms & Disease Likelihoods) =====
-async function loadAnalyticsData() {
+const symptomState = {
+  page: 1,
+  size: 50,
+  loading: false,
+  done: false
+};
+
+async function loadAnalyticsData(append = false) {
+  if (symptomState.loading) return;
+  if (append && symptomState.done) return;
+  if (!append) {
+    symptomState.page = 1;
+    symptomState.done = false;
+  }
+
+  symptomState.loading = true;
   showLoading();
   try {
-    const data = await getJSON('/admin/api/symptoms');
+    const params = new URLSearchParams({ page: symptomState.page, size: symptomState.size });
+    const data = await getJSON(`/admin/api/symptoms?${params}`);
     if (!data.ok) throw new Error(data.error || 'Failed to load symptoms data');
 
-    renderGlobalSymptomsChart(data);
-    renderPerConversationSymptoms(data.by_conversation || []);
+    if (!append) renderGlobalSymptomsChart(data);
+    renderPerConversationSymptoms(data.by_conversation || [], append);
+
+    symptomState.page += 1;
+    symptomState.done = (symptomState.page - 1) * symptomState.size >= (data.total || 0);
+    const btn = document.getElementById('load-more-symptoms');
+    if (btn) btn.disabled = symptomState.done;
   } catch (err) {
     showAlert(err.message);
   } finally {
+    symptomState.loading = false;
     hideLoading();
   }
 }
 
-function renderPerConversationSymptoms(conversations) {
+function renderPerConversationSymptoms(conversations, append = false) {
   const tbody = document.querySelector('#tbl-conv-symptoms tbody');
   if (!tbody) return;
 
-  tbody.innerHTML = '';
+  if (!append) tbody.innerHTML = '';
 
-  if (conversations.length === 0) {
+  if (conversations.length === 0 && !append) {
     tbody.innerHTML = '<tr><td colspan="3" class="text-center text-muted">No symptom data available</td></tr>';
     return;
   }
@@ -894,6 +916,11 @@ function initSearchAndFilters() {
   if (loadMoreBtn) {
     loadMoreBtn.addEventListener('click', () => loadConversations(true));
   }
+
+  const moreSymptomsBtn = document.getElementById('load-more-symptoms');
+  if (moreSymptomsBtn) {
+    moreSymptomsBtn.addEventListener('click', () => loadAnalyticsData(true));
+  }
 }
 
 // ===== Main Initialization =====
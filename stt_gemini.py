@@ -5,17 +5,21 @@
 
 import os
 import io
+import asyncio
+import concurrent.futures
 import json
 import time
 import uuid
 import queue
 import shutil
-import tempfile
 import threading
 import subprocess
 import logging
 import wave
 import random
+import re
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
 from typing import Optional, Callable, Any
 
 import numpy as np
@@ -54,6 +58,8 @@ STT_MAX_SEGMENT_MS = int(os.getenv("STT_MAX_SEGMENT_MS", "10000"))
 
 EMIT_PARTIALS = os.getenv("EMIT_PARTIALS", "false").lower() in ("1", "true", "yes", "y")
 STT_PARTIAL_MIN_INTERVAL_MS = int(os.getenv("STT_PARTIAL_MIN_INTERVAL_MS", "700"))
+STT_PARTIAL_WINDOW_MS = int(os.getenv("STT_PARTIAL_WINDOW_MS", "3000"))  # tail re-sent per partial
+STT_PARTIAL_MIN_MS = int(os.getenv("STT_PARTIAL_MIN_MS", "800"))
 
 # Retry behavior (overload handling)
 GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "6"))
@@ -64,6 +70,18 @@ GEMINI_RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8.0"))
 USE_LOCAL_WHISPER_FALLBACK = os.getenv("USE_LOCAL_WHISPER_FALLBACK", "true").lower() in ("1", "true", "yes", "y")
 WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "small")
 WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")  # int8 / float16 etc.
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))  # 0 = library default
+
+# Cross-session batching of local Whisper decodes
+WHISPER_BATCHING = os.getenv("WHISPER_BATCHING", "true").lower() in ("1", "true", "yes", "y")
+WHISPER_BATCH_WINDOW_MS = int(os.getenv("WHISPER_BATCH_WINDOW_MS", "40"))
+WHISPER_BATCH_MAX = int(os.getenv("WHISPER_BATCH_MAX", "8"))
+WHISPER_EXECUTOR_THREADS = int(os.getenv("WHISPER_EXECUTOR_THREADS", "2"))  # unbatched decodes
+
+# Live WebM/Opus -> PCM decoding: "ffmpeg_pool" (default), "ffmpeg" or "pyav"
+STT_DECODER = os.getenv("STT_DECODER", "ffmpeg_pool").strip().lower()
+STT_FFMPEG_POOL_SIZE = int(os.getenv("STT_FFMPEG_POOL_SIZE", "4"))
+STT_FFMPEG_INPUT_ARGS = os.getenv("STT_FFMPEG_INPUT_ARGS", "").split()  # e.g. "-fflags nobuffer"
 
 # -----------------------------------------------------------------------------
 # Optional faster-whisper
@@ -73,29 +91,67 @@ try:
 except Exception:  # pragma: no cover
     WhisperModel = None
 
+try:
+    from faster_whisper import BatchedInferencePipeline  # type: ignore  (faster-whisper >= 1.1)
+except Exception:  # pragma: no cover
+    BatchedInferencePipeline = None
+
 _WHISPER_MODEL: Optional[Any] = None
+_WHISPER_LOAD_FAILED = False
+_WHISPER_LOCK = threading.Lock()
+
 
+def _get_whisper_model(wait: bool = True) -> Optional[Any]:
+    """Return the shared faster-whisper model (if installed), loading it once.
 
-def _get_whisper_model() -> Optional[Any]:
-    """Lazy-load faster-whisper model (if installed)."""
-    global _WHISPER_MODEL
+    With wait=False this never blocks behind a load already in progress (e.g. the
+    startup preload), so the live path treats "still loading" as "unavailable".
+    """
+    global _WHISPER_MODEL, _WHISPER_LOAD_FAILED
     if not USE_LOCAL_WHISPER_FALLBACK:
         return None
     if WhisperModel is None:
         return None
-    if _WHISPER_MODEL is not None:
+    if _WHISPER_MODEL is not None or _WHISPER_LOAD_FAILED:
         return _WHISPER_MODEL
-
-    # If CUDA is available, faster-whisper can use it automatically when device='cuda'.
-    # We default to 'auto' to avoid hard failures.
-    device = os.getenv("WHISPER_DEVICE", "auto")
+    if not _WHISPER_LOCK.acquire(blocking=wait):
+        return None
     try:
-        _WHISPER_MODEL = WhisperModel(WHISPER_MODEL_SIZE, device=device, compute_type=WHISPER_COMPUTE_TYPE)
-        logger.info(f"Loaded faster-whisper model: size={WHISPER_MODEL_SIZE}, device={device}, compute={WHISPER_COMPUTE_TYPE}")
-    except Exception:
-        logger.exception("Failed to load faster-whisper model; local fallback disabled")
-        _WHISPER_MODEL = None
-    return _WHISPER_MODEL
+        if _WHISPER_MODEL is not None or _WHISPER_LOAD_FAILED:
+            return _WHISPER_MODEL
+
+        # If CUDA is available, faster-whisper can use it automatically when device='cuda'.
+        # We default to 'auto' to avoid hard failures.
+        device = os.getenv("WHISPER_DEVICE", "auto")
+        t0 = time.monotonic()
+        try:
+            _WHISPER_MODEL = WhisperModel(
+                WHISPER_MODEL_SIZE,
+                device=device,
+                compute_type=WHISPER_COMPUTE_TYPE,
+                cpu_threads=WHISPER_CPU_THREADS,
+            )
+            logger.info(
+                f"Loaded faster-whisper model: size={WHISPER_MODEL_SIZE}, device={device}, "
+                f"compute={WHISPER_COMPUTE_TYPE}, cpu_threads={WHISPER_CPU_THREADS or 'auto'} "
+                f"in {time.monotonic() - t0:.1f}s"
+            )
+        except Exception:
+            logger.exception("Failed to load faster-whisper model; local fallback disabled")
+            _WHISPER_MODEL = None
+            _WHISPER_LOAD_FAILED = True
+        return _WHISPER_MODEL
+    finally:
+        _WHISPER_LOCK.release()
+
+
+def preload_whisper_model() -> Optional[threading.Thread]:
+    """Load the fallback model on a background thread so no live segment pays for it."""
+    if not USE_LOCAL_WHISPER_FALLBACK or WhisperModel is None or _WHISPER_MODEL is not None:
+        return None
+    t = threading.Thread(target=_get_whisper_model, name="whisper-preload", daemon=True)
+    t.start()
+    return t
 
 
 def _whisper_lang_code(lang: str) -> Optional[str]:
@@ -107,26 +163,35 @@ def _whisper_lang_code(lang: str) -> Optional[str]:
     return None  # auto
 
 
+WHISPER_SAMPLE_RATE = 16000  # faster-whisper expects 16 kHz mono float32 arrays
+
+
+def _pcm16_to_whisper_audio(pcm_s16le: bytes) -> np.ndarray:
+    """PCM16 mono bytes -> float32 array at 16 kHz, straight from the buffer."""
+    audio = pcm_s16le_bytes_to_float32(pcm_s16le)
+    if SAMPLE_RATE != WHISPER_SAMPLE_RATE and audio.size:
+        n_out = int(round(audio.size * WHISPER_SAMPLE_RATE / SAMPLE_RATE))
+        x_old = np.linspace(0.0, 1.0, num=audio.size, endpoint=False)
+        x_new = np.linspace(0.0, 1.0, num=n_out, endpoint=False)
+        audio = np.interp(x_new, x_old, audio).astype(np.float32)
+    return audio
+
+
 def whisper_transcribe_pcm16(pcm_s16le: bytes, lang: str) -> str:
-    """Transcribe a PCM16 mono segment using faster-whisper (local fallback)."""
+    """Transcribe a PCM16 mono segment using faster-whisper (local fallback).
+
+    The segment is handed to the model as an in-memory float32 array: no WAV
+    encoding and no temp file per segment.
+    """
     model = _get_whisper_model()
     if model is None:
         return ""
 
-    wav_bytes = write_wav_bytes(pcm_s16le, sample_rate=SAMPLE_RATE)
-
-    # Write to temp wav for faster-whisper (simple + reliable)
-    tmp = None
+    t0 = time.monotonic()
     try:
-        tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-        tmp.write(wav_bytes)
-        tmp.flush()
-        tmp.close()
-
-        language = _whisper_lang_code(lang)
         segments, _info = model.transcribe(
-            tmp.name,
-            language=language,
+            _pcm16_to_whisper_audio(pcm_s16le),
+            language=_whisper_lang_code(lang),
             beam_size=int(os.getenv("WHISPER_BEAM_SIZE", "3")),
             vad_filter=False,
         )
@@ -140,11 +205,190 @@ def whisper_transcribe_pcm16(pcm_s16le: bytes, lang: str) -> str:
         logger.exception("Local faster-whisper fallback transcription failed")
         return ""
     finally:
-        try:
-            if tmp is not None and os.path.exists(tmp.name):
-                os.unlink(tmp.name)
-        except Exception:
-            pass
+        _WHISPER_STATS.add((time.monotonic() - t0) * 1000.0)
+
+
+# -----------------------------------------------------------------------------
+# Batched local Whisper (one shared model, segments from every session)
+# -----------------------------------------------------------------------------
+WHISPER_BATCH_GAP_S = 0.5  # silence between packed clips so decodes never bleed together
+
+_WHISPER_PIPELINE: Optional[Any] = None
+
+
+def _get_whisper_pipeline(model) -> Optional[Any]:
+    global _WHISPER_PIPELINE
+    if BatchedInferencePipeline is None:
+        return None
+    if _WHISPER_PIPELINE is None:
+        _WHISPER_PIPELINE = BatchedInferencePipeline(model=model)
+    return _WHISPER_PIPELINE
+
+
+def _whisper_transcribe_batch(pcm_segments: list[bytes], language: Optional[str]) -> list[str]:
+    """Decode several segments in one batched pass of the shared model.
+
+    Segments are packed into one array separated by silence and passed as
+    clip_timestamps, so the pipeline encodes/decodes them as a single batch.
+    Falls back to one-by-one decoding when batching is unavailable.
+    """
+    model = _get_whisper_model()
+    if model is None:
+        return [""] * len(pcm_segments)
+    pipeline = _get_whisper_pipeline(model)
+    if pipeline is None or len(pcm_segments) == 1:
+        lang = language or "bilingual"
+        return [whisper_transcribe_pcm16(pcm, lang) for pcm in pcm_segments]
+
+    sr = WHISPER_SAMPLE_RATE
+    gap = np.zeros(int(sr * WHISPER_BATCH_GAP_S), dtype=np.float32)
+    parts, clips, pos = [], [], 0
+    for pcm in pcm_segments:
+        audio = _pcm16_to_whisper_audio(pcm)
+        clips.append({"start": pos / sr, "end": (pos + audio.size) / sr})
+        parts += [audio, gap]
+        pos += audio.size + gap.size
+
+    t0 = time.monotonic()
+    try:
+        segments, _info = pipeline.transcribe(
+            np.concatenate(parts),
+            language=language,
+            beam_size=int(os.getenv("WHISPER_BEAM_SIZE", "3")),
+            batch_size=len(pcm_segments),
+            clip_timestamps=clips,
+            vad_filter=False,
+        )
+        segments = list(segments)
+    except Exception:
+        logger.exception("Batched faster-whisper decode failed; decoding one by one")
+        lang = language or "bilingual"
+        return [whisper_transcribe_pcm16(pcm, lang) for pcm in pcm_segments]
+
+    # Attribute every segment to the clip its midpoint falls in. Never by
+    # position: a clip can yield zero or several segments, so equal counts
+    # don't mean one segment per clip.
+    texts: list[list[str]] = [[] for _ in pcm_segments]
+    for seg in segments:
+        mid = (float(seg.start) + float(seg.end)) / 2.0
+        for i, clip in enumerate(clips):
+            if clip["start"] <= mid < clip["end"] + WHISPER_BATCH_GAP_S:
+                texts[i].append((seg.text or "").strip())
+                break
+
+    per_segment_ms = (time.monotonic() - t0) * 1000.0 / len(pcm_segments)
+    for _ in pcm_segments:
+        _WHISPER_STATS.add(per_segment_ms)
+    return [" ".join(t for t in parts if t).strip() for parts in texts]
+
+
+class WhisperBatchScheduler:
+    """Collects local-fallback segments from all sessions and decodes them in batches.
+
+    Segments arriving within WHISPER_BATCH_WINDOW_MS of the first one are grouped
+    by language hint (_whisper_lang_code) and decoded together, at most
+    WHISPER_BATCH_MAX per pass, on a single thread that owns the shared model.
+    """
+
+    def __init__(self, window_ms: int = WHISPER_BATCH_WINDOW_MS, max_batch: int = WHISPER_BATCH_MAX):
+        self.window_s = max(0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._q: "queue.Queue[tuple[bytes, str, concurrent.futures.Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._segments = 0
+        self._largest = 0
+        self.thread = threading.Thread(target=self._run, name="whisper-batch", daemon=True)
+        self.thread.start()
+
+    def submit(self, pcm_segment: bytes, lang: str) -> "concurrent.futures.Future[str]":
+        fut: "concurrent.futures.Future[str]" = concurrent.futures.Future()
+        self._q.put((pcm_segment, lang, fut))
+        return fut
+
+    def _collect(self) -> list:
+        batch = [self._q.get()]
+        deadline = time.monotonic() + self.window_s
+        # Sessions submit independently: wait a moment so concurrent segments share a pass
+        while len(batch) < self.max_batch * 4:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            groups: dict[Optional[str], list] = {}
+            for item in batch:
+                groups.setdefault(_whisper_lang_code(item[1]), []).append(item)
+            for language, items in groups.items():
+                for i in range(0, len(items), self.max_batch):
+                    chunk = items[i:i + self.max_batch]
+                    try:
+                        texts = _whisper_transcribe_batch([pcm for pcm, _lang, _fut in chunk], language)
+                    except Exception as e:
+                        logger.exception("Local Whisper batch failed")
+                        for _pcm, _lang, fut in chunk:
+                            fut.set_exception(e)
+                        continue
+                    for (_pcm, _lang, fut), text in zip(chunk, texts):
+                        fut.set_result(text)
+                    with self._lock:
+                        self._batches += 1
+                        self._segments += len(chunk)
+                        self._largest = max(self._largest, len(chunk))
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self._q.qsize(),
+                "batches": self._batches,
+                "segments": self._segments,
+                "avg_batch": round(self._segments / self._batches, 2) if self._batches else 0.0,
+                "largest_batch": self._largest,
+            }
+
+
+_WHISPER_BATCHER: Optional[WhisperBatchScheduler] = None
+_WHISPER_BATCHER_LOCK = threading.Lock()
+
+
+def get_whisper_batcher() -> WhisperBatchScheduler:
+    global _WHISPER_BATCHER
+    if _WHISPER_BATCHER is None:
+        with _WHISPER_BATCHER_LOCK:
+            if _WHISPER_BATCHER is None:
+                _WHISPER_BATCHER = WhisperBatchScheduler()
+    return _WHISPER_BATCHER
+
+
+_WHISPER_EXECUTOR: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+
+def _whisper_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _WHISPER_EXECUTOR
+    if _WHISPER_EXECUTOR is None:
+        with _WHISPER_BATCHER_LOCK:
+            if _WHISPER_EXECUTOR is None:
+                _WHISPER_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max(1, WHISPER_EXECUTOR_THREADS), thread_name_prefix="whisper")
+    return _WHISPER_EXECUTOR
+
+
+def whisper_transcribe_async(pcm_segment: bytes, lang: str) -> "concurrent.futures.Future[str]":
+    """Queue a segment for local decoding; batched across sessions when enabled.
+
+    Either way the decode runs off the caller's thread, so awaiting the
+    future from the STT event loop never blocks it.
+    """
+    if WHISPER_BATCHING:
+        return get_whisper_batcher().submit(pcm_segment, lang)
+    return _whisper_executor().submit(whisper_transcribe_pcm16, pcm_segment, lang)
 
 
 # -----------------------------------------------------------------------------
@@ -188,11 +432,308 @@ def _gemini_model_candidates() -> list[str]:
 
 def _is_overload_error(e: Exception) -> bool:
     # 503 overload is the important one here
+    if isinstance(e, GeminiCircuitOpenError):
+        return True
     if isinstance(e, genai_errors.ServerError):
-        return getattr(e, "status_code", None) == 503
+        # genai's APIError exposes the HTTP status as `.code`
+        return (getattr(e, "code", None) or getattr(e, "status_code", None)) == 503
     return False
 
 
+# -----------------------------------------------------------------------------
+# Circuit breakers (one per Gemini model, shared by every session)
+# -----------------------------------------------------------------------------
+STT_BREAKER_WINDOW_S = float(os.getenv("STT_BREAKER_WINDOW_S", "30"))
+STT_BREAKER_MIN_CALLS = int(os.getenv("STT_BREAKER_MIN_CALLS", "4"))
+STT_BREAKER_FAILURE_RATE = float(os.getenv("STT_BREAKER_FAILURE_RATE", "0.5"))
+STT_BREAKER_OPEN_S = float(os.getenv("STT_BREAKER_OPEN_S", "20"))
+STT_BREAKER_HALF_OPEN_TRIALS = int(os.getenv("STT_BREAKER_HALF_OPEN_TRIALS", "1"))
+STT_BREAKER_SLOW_CALL_MS = float(os.getenv("STT_BREAKER_SLOW_CALL_MS", "0"))  # 0 = latency never trips
+
+
+class GeminiCircuitOpenError(RuntimeError):
+    """Every candidate Gemini model is short-circuited; treated like a 503."""
+
+
+def _percentile(sorted_vals: list, p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(p * (len(sorted_vals) - 1))))]
+
+
+class _RollingStats:
+    """Keeps the last N samples (ms) for cheap avg/p50/p95/max snapshots."""
+
+    def __init__(self, maxlen: int = 512):
+        self._samples: "deque[float]" = deque(maxlen=maxlen)
+        self._count = 0
+
+    def add(self, value_ms: float):
+        self._samples.append(float(value_ms))
+        self._count += 1
+
+    def snapshot(self) -> dict:
+        vals = sorted(self._samples)
+        if not vals:
+            return {"count": self._count, "avg_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+
+        return {
+            "count": self._count,
+            "avg_ms": round(sum(vals) / len(vals), 1),
+            "p50_ms": round(_percentile(vals, 0.50), 1),
+            "p95_ms": round(_percentile(vals, 0.95), 1),
+            "max_ms": round(vals[-1], 1),
+        }
+
+
+# Per-segment latency of the local faster-whisper fallback
+_WHISPER_STATS = _RollingStats()
+
+
+class CircuitBreaker:
+    """Closed -> open on a high 503 (or slow-call) rate over a sliding window.
+
+    While open, callers skip the model entirely. After STT_BREAKER_OPEN_S the
+    breaker goes half-open and lets a few trial requests through: a success
+    closes it, another overload re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window_s: float = STT_BREAKER_WINDOW_S,
+        min_calls: int = STT_BREAKER_MIN_CALLS,
+        failure_rate: float = STT_BREAKER_FAILURE_RATE,
+        open_s: float = STT_BREAKER_OPEN_S,
+        half_open_trials: int = STT_BREAKER_HALF_OPEN_TRIALS,
+        slow_call_ms: float = STT_BREAKER_SLOW_CALL_MS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.window_s = window_s
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.open_s = open_s
+        self.half_open_trials = max(1, half_open_trials)
+        self.slow_call_ms = slow_call_ms
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls: "deque[tuple[float, bool, float]]" = deque()  # (ts, failed, latency_ms)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._opens = 0
+
+    def _prune(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_s:
+            self._calls.popleft()
+
+    def _maybe_half_open(self, now: float):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_s:
+            self._state = self.HALF_OPEN
+            self._trials = 0
+
+    def _open(self, now: float):
+        if self._state != self.OPEN:
+            self._opens += 1
+            logger.warning(f"Gemini circuit breaker OPEN for model={self.name}")
+        self._state = self.OPEN
+        self._opened_at = now
+        self._trials = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(self._clock())
+            return self._state
+
+    def is_open(self) -> bool:
+        """True if a request would be refused right now (does not consume a trial)."""
+        with self._lock:
+            self._maybe_half_open(self._clock())
+            if self._state == self.OPEN:
+                return True
+            return self._state == self.HALF_OPEN and self._trials >= self.half_open_trials
+
+    def allow(self) -> bool:
+        """Reserve permission for one request; half-open allows a few trials."""
+        with self._lock:
+            self._maybe_half_open(self._clock())
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._trials < self.half_open_trials:
+                self._trials += 1
+                return True
+            return False
+
+    def _record(self, failed: bool, latency_ms: float):
+        now = self._clock()
+        with self._lock:
+            self._calls.append((now, failed, latency_ms))
+            self._prune(now)
+            if self._state == self.HALF_OPEN:
+                if failed:
+                    self._open(now)
+                else:
+                    logger.info(f"Gemini circuit breaker CLOSED for model={self.name}")
+                    self._state = self.CLOSED
+                    self._calls.clear()
+                return
+            if self._state == self.CLOSED and len(self._calls) >= self.min_calls:
+                rate = sum(1 for _ts, f, _ms in self._calls if f) / len(self._calls)
+                if rate >= self.failure_rate:
+                    self._open(now)
+
+    def record_success(self, latency_ms: float):
+        slow = self.slow_call_ms > 0 and latency_ms >= self.slow_call_ms
+        self._record(slow, latency_ms)
+
+    def record_overload(self, latency_ms: float):
+        self._record(True, latency_ms)
+
+    def record_neutral(self):
+        """Non-overload error: not counted, but frees a half-open trial slot."""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            self._maybe_half_open(now)
+            self._prune(now)
+            lat = sorted(ms for _ts, _f, ms in self._calls)
+            failures = sum(1 for _ts, f, _ms in self._calls if f)
+            return {
+                "model": self.name,
+                "state": self._state,
+                "calls": len(self._calls),
+                "failure_rate": round(failures / len(self._calls), 3) if self._calls else 0.0,
+                "p50_ms": round(_percentile(lat, 0.50), 1),
+                "p95_ms": round(_percentile(lat, 0.95), 1),
+                "p99_ms": round(_percentile(lat, 0.99), 1),
+                "opens": self._opens,
+                "open_for_s": round(max(0.0, self.open_s - (now - self._opened_at)), 1) if self._state == self.OPEN else 0.0,
+            }
+
+
+_BREAKERS: dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    with _BREAKERS_LOCK:
+        br = _BREAKERS.get(model)
+        if br is None:
+            br = _BREAKERS[model] = CircuitBreaker(model)
+        return br
+
+
+def circuit_breakers_snapshot() -> list[dict]:
+    with _BREAKERS_LOCK:
+        breakers = list(_BREAKERS.values())
+    return [b.snapshot() for b in breakers]
+
+
+def _gemini_short_circuited() -> bool:
+    """True when every candidate model's breaker would refuse a request."""
+    return all(get_circuit_breaker(m).is_open() for m in _gemini_model_candidates())
+
+
+class _GeminiRetry:
+    """Per-call retry bookkeeping shared by the sync and async generate paths.
+
+    Owns model fallback, circuit-breaker accounting, the optional trace and the
+    backoff schedule, so the two callers only differ in how they call the API
+    and how they sleep.
+    """
+
+    def __init__(self, max_attempts, base_delay, max_delay, on_retry, on_model_switch, trace):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_retry = on_retry
+        self.on_model_switch = on_model_switch
+        self.trace = trace
+        self.last_err: Optional[Exception] = None
+        self.tried = False
+        self.model: Optional[str] = None
+        self.breaker: Optional[CircuitBreaker] = None
+        self.delay = base_delay
+
+    def models(self):
+        """Yield the candidate models whose circuit breaker lets a request through."""
+        for model_i, model in enumerate(_gemini_model_candidates()):
+            breaker = get_circuit_breaker(model)
+            if not breaker.allow():
+                logger.info(f"Skipping Gemini model={model}: circuit breaker open")
+                continue
+            if model_i > 0 and self.on_model_switch:
+                self.on_model_switch(model)
+            self.tried = True
+            if self.trace is not None:
+                self.trace.model = model
+            self.model, self.breaker, self.delay = model, breaker, self.base_delay
+            yield model
+            logger.warning(f"Exhausted retries for model={model}; trying fallback if available...")
+
+    def begin(self) -> float:
+        if self.trace is not None:
+            self.trace.attempts += 1
+        return time.monotonic()
+
+    def succeeded(self, t0: float):
+        elapsed_ms = (time.monotonic() - t0) * 1000.0
+        self.breaker.record_success(elapsed_ms)
+        if self.trace is not None:
+            self.trace.provider_ms += elapsed_ms
+
+    def failed(self, err: Exception, attempt: int, t0: float) -> Optional[float]:
+        """Account a failed attempt: seconds to back off, None to move to the next model.
+
+        Non-overload errors are re-raised (don't spam retries).
+        """
+        self.last_err = err
+        elapsed_ms = (time.monotonic() - t0) * 1000.0
+        if self.trace is not None:
+            self.trace.provider_ms += elapsed_ms
+
+        if not _is_overload_error(err):
+            self.breaker.record_neutral()
+            raise err
+        self.breaker.record_overload(elapsed_ms)
+        if self.breaker.is_open():
+            # Provider is down for everyone: stop paying backoff on this model
+            return None
+        if attempt == self.max_attempts:
+            # Nothing left to retry on this model: fall back without sleeping
+            return None
+        # backoff + jitter, then retry same model
+        sleep_s = min(self.max_delay, self.delay) * (0.8 + random.random() * 0.4)
+        logger.warning(
+            f"Gemini overloaded (503) on model={self.model}. "
+            f"Retry {attempt}/{self.max_attempts} after {sleep_s:.2f}s"
+        )
+        if self.on_retry:
+            try:
+                self.on_retry(self.model, attempt, self.max_attempts, sleep_s)
+            except Exception:
+                pass
+        if self.trace is not None:
+            self.trace.retry_sleep_ms += sleep_s * 1000.0
+        self.delay *= 2
+        return sleep_s
+
+    def give_up(self):
+        if self.last_err:
+            raise self.last_err
+        if not self.tried:
+            raise GeminiCircuitOpenError("All Gemini models are short-circuited")
+        raise RuntimeError("Gemini generate_content failed with unknown error")
+
+
 def gemini_generate_with_retry(
     client: genai.Client,
     contents,
@@ -202,50 +743,124 @@ def gemini_generate_with_retry(
     max_delay: float = GEMINI_RETRY_MAX_DELAY,
     on_retry: Optional[Callable[[str, int, int, float], None]] = None,
     on_model_switch: Optional[Callable[[str], None]] = None,
+    trace: Optional["SegmentTrace"] = None,
 ):
-    """Retry on 503 overload with exponential backoff + jitter; try fallback models."""
-    last_err: Optional[Exception] = None
-    models = _gemini_model_candidates()
+    """Retry on 503 overload with exponential backoff + jitter; try fallback models.
 
-    for model_i, model in enumerate(models):
-        if model_i > 0 and on_model_switch:
-            on_model_switch(model)
-
-        delay = base_delay
+    Models whose circuit breaker is open are skipped; if none can be tried this
+    raises GeminiCircuitOpenError without touching the network. A `trace`, if
+    given, records the model used, attempts, provider time and backoff.
+    """
+    retry = _GeminiRetry(max_attempts, base_delay, max_delay, on_retry, on_model_switch, trace)
+    for model in retry.models():
         for attempt in range(1, max_attempts + 1):
+            t0 = retry.begin()
             try:
-                return client.models.generate_content(
+                resp = client.models.generate_content(
                     model=model,
                     contents=contents,
                     config=config,
                 )
             except Exception as e:
-                last_err = e
-
-                if _is_overload_error(e):
-                    # backoff + jitter, then retry same model
-                    sleep_s = min(max_delay, delay) * (0.8 + random.random() * 0.4)
-                    logger.warning(
-                        f"Gemini overloaded (503) on model={model}. "
-                        f"Retry {attempt}/{max_attempts} after {sleep_s:.2f}s"
-                    )
-                    if on_retry:
-                        try:
-                            on_retry(model, attempt, max_attempts, sleep_s)
-                        except Exception:
-                            pass
-                    time.sleep(sleep_s)
-                    delay *= 2
-                    continue
+                sleep_s = retry.failed(e, attempt, t0)
+                if sleep_s is None:
+                    break
+                time.sleep(sleep_s)
+                continue
+            retry.succeeded(t0)
+            return resp
+    retry.give_up()
+
+
+# -----------------------------------------------------------------------------
+# Async Gemini path (dedicated event-loop thread, non-blocking backoff)
+# -----------------------------------------------------------------------------
+STT_ASYNC_GEMINI = os.getenv("STT_ASYNC_GEMINI", "true").lower() in ("1", "true", "yes", "y")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+STT_ASYNC_MAX_IN_FLIGHT = int(os.getenv("STT_ASYNC_MAX_IN_FLIGHT", "1024"))
+
+
+class _AsyncLoopThread:
+    """One asyncio loop on a daemon thread; sync code hands it coroutines."""
+
+    def __init__(self, name: str = "stt-asyncio"):
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        # Global cap on concurrent Gemini calls (created on the loop it guards)
+        self.gemini_semaphore: asyncio.Semaphore = self.run(self._make_semaphore())
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    @staticmethod
+    async def _make_semaphore() -> asyncio.Semaphore:
+        return asyncio.Semaphore(max(1, GEMINI_MAX_CONCURRENCY))
+
+    def submit(self, coro) -> "concurrent.futures.Future":
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
 
-                # Non-overload errors: don't spam retries
-                raise
+    def run(self, coro, timeout: Optional[float] = None):
+        """Block the calling (non-loop) thread until `coro` finishes."""
+        return self.submit(coro).result(timeout=timeout)
 
-        logger.warning(f"Exhausted retries for model={model}; trying fallback if available...")
 
-    if last_err:
-        raise last_err
-    raise RuntimeError("Gemini generate_content failed with unknown error")
+_ASYNC_LOOP: Optional[_AsyncLoopThread] = None
+_ASYNC_LOOP_LOCK = threading.Lock()
+
+
+def get_stt_event_loop() -> _AsyncLoopThread:
+    """Return the process-wide STT event-loop thread, starting it on first use."""
+    global _ASYNC_LOOP
+    if _ASYNC_LOOP is None:
+        with _ASYNC_LOOP_LOCK:
+            if _ASYNC_LOOP is None:
+                _ASYNC_LOOP = _AsyncLoopThread()
+    return _ASYNC_LOOP
+
+
+async def gemini_generate_with_retry_async(
+    client: genai.Client,
+    contents,
+    config,
+    max_attempts: int = GEMINI_MAX_ATTEMPTS,
+    base_delay: float = GEMINI_RETRY_BASE_DELAY,
+    max_delay: float = GEMINI_RETRY_MAX_DELAY,
+    on_retry: Optional[Callable[[str, int, int, float], None]] = None,
+    on_model_switch: Optional[Callable[[str], None]] = None,
+    trace: Optional["SegmentTrace"] = None,
+):
+    """Async twin of gemini_generate_with_retry.
+
+    Must run on the STT event loop: calls go through `client.aio` under the global
+    concurrency semaphore, and backoff is an `asyncio.sleep` (the slot is released
+    while waiting), so a retrying segment costs a coroutine rather than a thread.
+    """
+    semaphore = get_stt_event_loop().gemini_semaphore
+    retry = _GeminiRetry(max_attempts, base_delay, max_delay, on_retry, on_model_switch, trace)
+    for model in retry.models():
+        for attempt in range(1, max_attempts + 1):
+            t0 = retry.begin()
+            try:
+                async with semaphore:
+                    resp = await client.aio.models.generate_content(
+                        model=model,
+                        contents=contents,
+                        config=config,
+                    )
+            except Exception as e:
+                sleep_s = retry.failed(e, attempt, t0)
+                if sleep_s is None:
+                    break
+                await asyncio.sleep(sleep_s)
+                continue
+            retry.succeeded(t0)
+            return resp
+    retry.give_up()
 
 
 def _effective_engine_name() -> str:
@@ -257,29 +872,6 @@ def _effective_engine_name() -> str:
 # Audio utilities
 # -----------------------------------------------------------------------------
 
-def convert_to_wav_16k(src_path: str) -> str:
-    """Convert any input audio to 16kHz mono WAV."""
-    dst_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4().hex}.wav")
-    cmd = [
-        FFMPEG_BIN,
-        "-y",
-        "-hide_banner",
-        "-loglevel",
-        "error",
-        "-i",
-        src_path,
-        "-ac",
-        "1",
-        "-ar",
-        str(SAMPLE_RATE),
-        "-f",
-        "wav",
-        dst_path,
-    ]
-    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-    return dst_path
-
-
 def pcm_s16le_bytes_to_float32(pcm: bytes) -> np.ndarray:
     a = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
     return a / 32768.0
@@ -315,58 +907,206 @@ def _lang_prompt(lang: str) -> str:
     return "Transcribe the audio. The speaker may use English and/or Swahili."
 
 
-def gemini_transcribe_wav_file(wav_path: str, lang: str = "bilingual") -> str:
-    """Batch transcription for a WAV file."""
-    client = _gemini_client()
-    prompt = _lang_prompt(lang)
+# -----------------------------------------------------------------------------
+# Streaming batch path: upload -> ffmpeg pipe -> PCM in memory -> VAD chunks
+# -----------------------------------------------------------------------------
+STT_UPLOAD_MAX_BYTES = int(os.getenv("STT_UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))  # compressed upload
+STT_UPLOAD_MAX_SECONDS = int(os.getenv("STT_UPLOAD_MAX_SECONDS", "1800"))              # decoded audio
+STT_UPLOAD_DECODE_TIMEOUT_S = float(os.getenv("STT_UPLOAD_DECODE_TIMEOUT_S", "120"))
+STT_UPLOAD_READ_BYTES = 64 * 1024
+STT_BATCH_CHUNK_MS = int(os.getenv("STT_BATCH_CHUNK_MS", "30000"))         # aim for ~30 s chunks
+STT_BATCH_MAX_CHUNK_MS = int(os.getenv("STT_BATCH_MAX_CHUNK_MS", "45000"))  # hard cut if nobody pauses
+STT_BATCH_CUT_SILENCE_MS = int(os.getenv("STT_BATCH_CUT_SILENCE_MS", "300"))
+
+
+class AudioTooLargeError(ValueError):
+    """Upload (or its decoded PCM) exceeds the configured size cap."""
 
-    with open(wav_path, "rb") as f:
-        wav_bytes = f.read()
 
-    audio_part = genai_types.Part.from_bytes(data=wav_bytes, mime_type="audio/wav")
+def _open_batch_decoder() -> "PCMDecoder":
+    # Uploads can be any container, so always ffmpeg (PyAV is pinned to WebM)
+    if STT_DECODER == "ffmpeg_pool":
+        return FFmpegDecoder(get_ffmpeg_pool().acquire())
+    return FFmpegDecoder()
 
-    contents = [
-        genai_types.Content(
-            role="user",
-            parts=[
-                genai_types.Part.from_text(text=prompt),
-                audio_part,
-            ],
-        )
+
+def decode_stream_to_pcm(
+    stream,
+    max_input_bytes: int = STT_UPLOAD_MAX_BYTES,
+    max_seconds: int = STT_UPLOAD_MAX_SECONDS,
+    decoder: Optional["PCMDecoder"] = None,
+) -> bytes:
+    """Pipe a file-like `stream` through an ffmpeg decoder; return SAMPLE_RATE s16le PCM.
+
+    Nothing touches disk, and the decoder is always torn down, including when the
+    upload blows a cap (AudioTooLargeError) or the client disconnects mid-body.
+    """
+    max_pcm_bytes = max_seconds * SAMPLE_RATE * 2
+    dec = decoder or _open_batch_decoder()
+    pcm = bytearray()
+
+    def _take(timeout: float):
+        data = dec.read(timeout=timeout)
+        if data:
+            pcm.extend(data)
+            if len(pcm) > max_pcm_bytes:
+                raise AudioTooLargeError(f"decoded audio exceeds {max_seconds}s")
+        return data
+
+    try:
+        total = 0
+        while True:
+            chunk = stream.read(STT_UPLOAD_READ_BYTES)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_input_bytes:
+                raise AudioTooLargeError(f"upload exceeds {max_input_bytes} bytes")
+            try:
+                dec.feed(chunk)
+            except (BrokenPipeError, ValueError):
+                break  # ffmpeg stopped reading; keep whatever it decoded
+            while _take(timeout=0):
+                pass
+        dec.close_input()
+
+        deadline = time.monotonic() + STT_UPLOAD_DECODE_TIMEOUT_S
+        while not dec.finished:
+            if time.monotonic() > deadline:
+                raise TimeoutError("ffmpeg decode timed out")
+            _take(timeout=0.5)
+        return bytes(pcm)
+    finally:
+        dec.close()
+        proc = getattr(dec, "proc", None)
+        if proc is not None:
+            try:
+                proc.wait(timeout=2)
+            except Exception:
+                proc.kill()
+
+
+def _vad_frame_flags(pcm_s16le: bytes, frame_ms: int = VAD_FRAME_MS) -> list[bool]:
+    """Per-frame webrtcvad speech flags for a whole recording."""
+    vad = webrtcvad.Vad(STT_VAD_AGGRESSIVENESS)
+    frame_bytes = int(SAMPLE_RATE * frame_ms / 1000) * 2
+    return [
+        vad.is_speech(pcm_s16le[i : i + frame_bytes], SAMPLE_RATE)
+        for i in range(0, len(pcm_s16le) - frame_bytes + 1, frame_bytes)
     ]
 
-    resp = gemini_generate_with_retry(
-        client=client,
-        contents=contents,
-        config=genai_types.GenerateContentConfig(temperature=0.0),
-    )
 
+def split_pcm_on_vad(
+    pcm_s16le: bytes,
+    target_ms: int = STT_BATCH_CHUNK_MS,
+    max_ms: int = STT_BATCH_MAX_CHUNK_MS,
+    cut_silence_ms: int = STT_BATCH_CUT_SILENCE_MS,
+    frame_ms: int = VAD_FRAME_MS,
+) -> list[bytes]:
+    """Split a long recording into ~target_ms chunks, cutting inside pauses.
+
+    Once a chunk reaches target_ms it is cut in the middle of the next run of
+    at least cut_silence_ms non-speech frames, or forced at max_ms. Chunks with
+    no speech at all are dropped so silence is never sent to the provider.
+    """
+    frame_bytes = int(SAMPLE_RATE * frame_ms / 1000) * 2
+    flags = _vad_frame_flags(pcm_s16le, frame_ms)
+    if not flags:
+        return [pcm_s16le] if pcm_s16le else []
+
+    target_f = max(1, target_ms // frame_ms)
+    max_f = max(target_f, max_ms // frame_ms)
+    silence_f = max(1, cut_silence_ms // frame_ms)
+
+    cuts = []  # frame indices where a new chunk starts
+    start = 0
+    silent_run = 0
+    for i, voiced in enumerate(flags):
+        silent_run = 0 if voiced else silent_run + 1
+        length = i + 1 - start
+        if length >= target_f and silent_run >= silence_f:
+            cut = i + 1 - silent_run // 2
+        elif length >= max_f:
+            cut = i + 1
+        else:
+            continue
+        cuts.append(cut)
+        start = cut
+        silent_run = 0
+
+    bounds = [0] + cuts + [len(flags)]
+    chunks = []
+    for a, b in zip(bounds, bounds[1:]):
+        if b <= a or not any(flags[a:b]):
+            continue
+        end = len(pcm_s16le) if b == len(flags) else b * frame_bytes
+        chunks.append(pcm_s16le[a * frame_bytes : end])
+    return chunks
+
+
+async def _transcribe_chunk_async(client: genai.Client, pcm_chunk: bytes, lang: str) -> str:
+    if _should_route_local():
+        return await asyncio.wrap_future(whisper_transcribe_async(pcm_chunk, lang))
+    try:
+        resp = await gemini_generate_with_retry_async(
+            client=client,
+            contents=_build_segment_contents(pcm_chunk, lang),
+            config=genai_types.GenerateContentConfig(temperature=0.0),
+        )
+    except Exception as e:
+        if _is_overload_error(e) and _local_fallback_ready():
+            logger.warning("Gemini overloaded on a batch chunk; using local Whisper fallback")
+            return await asyncio.wrap_future(whisper_transcribe_async(pcm_chunk, lang))
+        raise
     return (resp.text or "").strip()
 
 
+async def _transcribe_chunks_async(client: genai.Client, chunks: list[bytes], lang: str) -> list[str]:
+    # gather() keeps input order; the loop's Gemini semaphore bounds the fan-out
+    return list(await asyncio.gather(*(_transcribe_chunk_async(client, c, lang) for c in chunks)))
+
+
+def gemini_transcribe_pcm(pcm_s16le: bytes, lang: str = "bilingual") -> str:
+    """Batch transcription for in-memory PCM: VAD-chunked, concurrent, stitched in order."""
+    chunks = split_pcm_on_vad(pcm_s16le)
+    if not chunks:
+        return ""
+    texts = get_stt_event_loop().run(_transcribe_chunks_async(_gemini_client(), chunks, lang))
+    return " ".join(t for t in texts if t)
+
+
 # -----------------------------------------------------------------------------
 # REST endpoint: POST /transcribe_audio
 # -----------------------------------------------------------------------------
 
 @stt_bp.post("/transcribe_audio")
 def transcribe_audio():
-    """Accept multipart form: audio file + lang; returns {text, engine}."""
+    """Accept multipart form (audio file + lang) or a raw audio body (?lang=); returns {text, engine}."""
     try:
-        audio = request.files.get("audio")
-        language = (request.form.get("lang") or "bilingual").lower()
-
-        if not audio:
+        if request.content_length and request.content_length > STT_UPLOAD_MAX_BYTES:
+            return jsonify({"error": "Audio upload too large"}), 413
+
+        if request.mimetype.startswith("multipart/"):
+            audio = request.files.get("audio")
+            language = (request.form.get("lang") or "bilingual").lower()
+            if not audio:
+                return jsonify({"error": "No audio uploaded"}), 400
+            stream = audio.stream
+        else:
+            # Raw body (e.g. fetch(url, {body: blob})): read straight off the socket
+            language = (request.args.get("lang") or "bilingual").lower()
+            stream = request.stream
+
+        pcm = decode_stream_to_pcm(stream)
+        if not pcm:
             return jsonify({"error": "No audio uploaded"}), 400
 
-        with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as tmp:
-            audio.save(tmp.name)
-            src_path = tmp.name
-
-        wav_path = convert_to_wav_16k(src_path)
-
-        text = gemini_transcribe_wav_file(wav_path, lang=language)
+        text = gemini_transcribe_pcm(pcm, lang=language)
         return jsonify({"text": text, "engine": _effective_engine_name()})
 
+    except AudioTooLargeError as e:
+        logger.info(f"Rejected audio upload: {e}")
+        return jsonify({"error": "Audio upload too large"}), 413
     except Exception:
         logger.exception("Gemini audio transcription failed")
         return jsonify({"error": "Audio transcription failed"}), 500
@@ -383,6 +1123,7 @@ def start_ffmpeg_decoder():
             "-hide_banner",
             "-loglevel",
             "error",
+            *STT_FFMPEG_INPUT_ARGS,
             "-i",
             "pipe:0",
             "-ar",
@@ -399,6 +1140,254 @@ def start_ffmpeg_decoder():
     )
 
 
+# -----------------------------------------------------------------------------
+# Pluggable live decoders: WebM/Opus bytes in, SAMPLE_RATE s16le mono out
+# -----------------------------------------------------------------------------
+try:
+    import av  # type: ignore  (PyAV, optional: in-process demux + decode)
+except Exception:  # pragma: no cover
+    av = None
+
+PCM_READ_CHUNK_BYTES = int(SAMPLE_RATE * 0.1) * 2  # 100 ms
+
+
+class PCMDecoder:
+    """Base class for live decoders.
+
+    `feed()` takes container bytes as they arrive from the browser, `read()`
+    returns the next PCM block (or None on timeout), and `finished` turns true
+    once the input is closed and every PCM block has been read.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.pcm_q: "queue.Queue[bytes]" = queue.Queue()
+        self.eof = threading.Event()
+        self.created_at = time.monotonic()
+        self.first_pcm_at: Optional[float] = None
+
+    def feed(self, data: bytes):
+        raise NotImplementedError
+
+    def close_input(self):
+        raise NotImplementedError
+
+    def close(self):
+        self.close_input()
+
+    def _put_pcm(self, pcm: bytes):
+        if self.first_pcm_at is None:
+            self.first_pcm_at = time.monotonic()
+        self.pcm_q.put(pcm)
+
+    def read(self, timeout: float = 0.5) -> Optional[bytes]:
+        try:
+            return self.pcm_q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    @property
+    def finished(self) -> bool:
+        return self.eof.is_set() and self.pcm_q.empty()
+
+
+class FFmpegDecoder(PCMDecoder):
+    """Pipes the stream through an ffmpeg subprocess (optionally pre-spawned)."""
+
+    name = "ffmpeg"
+
+    def __init__(self, proc: Optional[subprocess.Popen] = None):
+        super().__init__()
+        self.proc = proc or start_ffmpeg_decoder()
+        self._reader = threading.Thread(target=self._read_loop, name="ffmpeg-pcm", daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        try:
+            while True:
+                data = self.proc.stdout.read(PCM_READ_CHUNK_BYTES)
+                if not data:
+                    break
+                self._put_pcm(data)
+        except Exception:
+            pass
+        finally:
+            self.eof.set()
+
+    def feed(self, data: bytes):
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def close_input(self):
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+
+    def close(self):
+        self.close_input()
+        try:
+            self.proc.terminate()
+        except Exception:
+            pass
+
+
+class FFmpegProcessPool:
+    """Keeps a few ffmpeg decoders already spawned and waiting on stdin.
+
+    A WebM stream carries its own header, so a process cannot be handed a second
+    stream after stdin EOF; instead each acquire() takes a warm process and a
+    background thread spawns its replacement off the request path.
+    """
+
+    def __init__(self, size: int = STT_FFMPEG_POOL_SIZE):
+        self.size = max(0, size)
+        self._idle: "deque[subprocess.Popen]" = deque()
+        self._lock = threading.Lock()
+        self._want = threading.Event()
+        self._hits = 0
+        self._misses = 0
+        self._want.set()
+        threading.Thread(target=self._refill_loop, name="ffmpeg-pool", daemon=True).start()
+
+    def _refill_loop(self):
+        while True:
+            self._want.wait()
+            self._want.clear()
+            while True:
+                with self._lock:
+                    # Drop processes that died while idle
+                    self._idle = deque(p for p in self._idle if p.poll() is None)
+                    if len(self._idle) >= self.size:
+                        break
+                try:
+                    proc = start_ffmpeg_decoder()
+                except Exception:
+                    logger.exception("Failed to pre-spawn ffmpeg decoder")
+                    time.sleep(1.0)
+                    break
+                with self._lock:
+                    self._idle.append(proc)
+
+    def acquire(self) -> subprocess.Popen:
+        proc = None
+        with self._lock:
+            while self._idle:
+                cand = self._idle.popleft()
+                if cand.poll() is None:
+                    proc = cand
+                    break
+            if proc is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        self._want.set()
+        return proc or start_ffmpeg_decoder()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"idle": len(self._idle), "size": self.size, "hits": self._hits, "misses": self._misses}
+
+
+class _BlockingByteStream(io.RawIOBase):
+    """File-like read side of a byte pipe; read() blocks until data or EOF."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._cv = threading.Condition()
+        self._closed_input = False
+
+    def readable(self) -> bool:
+        return True
+
+    def write_bytes(self, data: bytes):
+        with self._cv:
+            self._buf += data
+            self._cv.notify()
+
+    def close_input(self):
+        with self._cv:
+            self._closed_input = True
+            self._cv.notify()
+
+    def readinto(self, b) -> int:
+        with self._cv:
+            while not self._buf and not self._closed_input:
+                self._cv.wait()
+            n = min(len(b), len(self._buf))
+            b[:n] = self._buf[:n]
+            del self._buf[:n]
+            return n
+
+
+class PyAVDecoder(PCMDecoder):
+    """In-process WebM/Opus demux + decode + resample with PyAV (no subprocess)."""
+
+    name = "pyav"
+
+    def __init__(self):
+        if av is None:
+            raise RuntimeError("PyAV is not installed")
+        super().__init__()
+        self._stream = _BlockingByteStream()
+        self._thread = threading.Thread(target=self._decode_loop, name="pyav-pcm", daemon=True)
+        self._thread.start()
+
+    def _decode_loop(self):
+        container = None
+        try:
+            container = av.open(self._stream, mode="r", format="webm")
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+            for frame in container.decode(audio=0):
+                for out in resampler.resample(frame):
+                    self._put_pcm(out.to_ndarray().tobytes())
+            for out in resampler.resample(None):
+                self._put_pcm(out.to_ndarray().tobytes())
+        except Exception as e:
+            if not self._stream._closed_input:
+                logger.warning(f"PyAV live decode stopped: {e}")
+        finally:
+            if container is not None:
+                try:
+                    container.close()
+                except Exception:
+                    pass
+            self.eof.set()
+
+    def feed(self, data: bytes):
+        self._stream.write_bytes(data)
+
+    def close_input(self):
+        self._stream.close_input()
+
+
+_FFMPEG_POOL: Optional[FFmpegProcessPool] = None
+_FFMPEG_POOL_LOCK = threading.Lock()
+
+
+def get_ffmpeg_pool() -> FFmpegProcessPool:
+    global _FFMPEG_POOL
+    if _FFMPEG_POOL is None:
+        with _FFMPEG_POOL_LOCK:
+            if _FFMPEG_POOL is None:
+                _FFMPEG_POOL = FFmpegProcessPool()
+    return _FFMPEG_POOL
+
+
+def open_pcm_decoder(kind: Optional[str] = None) -> PCMDecoder:
+    """Create the live decoder selected by STT_DECODER (or `kind`)."""
+    kind = (kind or STT_DECODER).lower()
+    if kind == "pyav":
+        if av is not None:
+            return PyAVDecoder()
+        logger.warning("STT_DECODER=pyav but PyAV is not installed; using the ffmpeg pool")
+        kind = "ffmpeg_pool"
+    if kind == "ffmpeg_pool":
+        return FFmpegDecoder(get_ffmpeg_pool().acquire())
+    return FFmpegDecoder()
+
+
 def parse_lang_query(qs: str) -> str:
     qs = qs or ""
     lang_raw = "bilingual"
@@ -430,26 +1419,916 @@ def vad_voiced_ratio(pcm_s16le: bytes, sample_rate: int, vad: webrtcvad.Vad, fra
     return voiced / float(n)
 
 
+def _build_segment_contents(pcm_segment: bytes, lang: str):
+    wav_bytes = write_wav_bytes(pcm_segment, sample_rate=SAMPLE_RATE)
+    audio_part = genai_types.Part.from_bytes(data=wav_bytes, mime_type="audio/wav")
+    return [
+        genai_types.Content(
+            role="user",
+            parts=[
+                genai_types.Part.from_text(text=_lang_prompt(lang)),
+                audio_part,
+            ],
+        )
+    ]
+
+
+def _segment_callbacks(worker: "GeminiWorker"):
+    """on_retry / on_model_switch hooks that surface provider trouble to the browser."""
+
+    def _on_retry(model: str, attempt: int, max_attempts: int, sleep_s: float):
+        # Tell the browser this may be delayed
+        worker._emit_status(
+            message=f"STT delayed: Gemini model overloaded; retrying ({attempt}/{max_attempts})…",
+            level="warning",
+            code="STT_RETRYING",
+        )
+
+    def _on_switch(new_model: str):
+        worker._emit_status(
+            message=f"STT delayed: switching to fallback model ({new_model})…",
+            level="warning",
+            code="STT_MODEL_FALLBACK",
+        )
+
+    return _on_retry, _on_switch
+
+
+def _emit_gemini_result(worker: "GeminiWorker", resp):
+    text = (resp.text or "").strip()
+    if text:
+        worker._emit_final(text=text, engine=_effective_engine_name())
+        # Clear banner hint once we get a clean final
+        worker._emit_status(message="STT recovered.", level="info", code="STT_OK")
+
+
+def _local_fallback_ready() -> bool:
+    return USE_LOCAL_WHISPER_FALLBACK and _get_whisper_model(wait=False) is not None
+
+
+def _should_route_local() -> bool:
+    """Skip Gemini entirely while every model's breaker is open and Whisper is loaded."""
+    return _local_fallback_ready() and _gemini_short_circuited()
+
+
+_ROUTE_LOCAL_MSG = "STT degraded: Gemini is unavailable; transcribing locally until it recovers."
+_FALLBACK_LOCAL_MSG = "STT degraded: Gemini is overloaded; using local Whisper fallback."
+
+
+def _emit_local_text(worker: "GeminiWorker", local_text: str) -> bool:
+    if local_text:
+        worker._emit_final(text=local_text, engine="local/faster-whisper")
+        return True
+    return False
+
+
+def _transcribe_locally(worker: "GeminiWorker", pcm_segment: bytes, lang: str, message: str) -> bool:
+    worker._emit_status(message=message, level="warning", code="STT_FALLBACK_LOCAL")
+    return _emit_local_text(worker, whisper_transcribe_async(pcm_segment, lang).result())
+
+
+async def _transcribe_locally_async(worker: "GeminiWorker", pcm_segment: bytes, lang: str, message: str) -> bool:
+    worker._emit_status(message=message, level="warning", code="STT_FALLBACK_LOCAL")
+    return _emit_local_text(worker, await asyncio.wrap_future(whisper_transcribe_async(pcm_segment, lang)))
+
+
+def _report_segment_failure(worker: "GeminiWorker", e: Exception):
+    trace = _worker_trace(worker)
+    if trace is not None:
+        trace.outcome = "error"
+    if _is_overload_error(e):
+        # If no fallback, surface degraded status (but don't kill the worker)
+        worker._emit_status(
+            message="STT degraded: Gemini is overloaded and no fallback is available. You may miss a few seconds.",
+            level="warning",
+            code="STT_DEGRADED",
+        )
+        return
+
+    # Non-overload errors: log + surface a status (still keep worker alive)
+    logger.error("Gemini live transcription worker failed", exc_info=e)
+    worker._emit_status(
+        message="STT error: transcription failed for a segment.",
+        level="warning",
+        code="STT_ERROR",
+    )
+
+
+def _handle_segment_failure(worker: "GeminiWorker", e: Exception, pcm_segment: bytes, lang: str):
+    """Gemini gave up on a segment: try local Whisper on overload, else surface a status."""
+    if _is_overload_error(e) and _local_fallback_ready():
+        if _transcribe_locally(worker, pcm_segment, lang, _FALLBACK_LOCAL_MSG):
+            worker._emit_status(message="STT recovered.", level="info", code="STT_OK")
+            return
+    _report_segment_failure(worker, e)
+
+
+def _transcribe_segment(worker: "GeminiWorker", client: genai.Client, pcm_segment: bytes, lang: str):
+    """Transcribe one live segment and push final/status events onto the worker's queue."""
+    if _should_route_local():
+        _transcribe_locally(worker, pcm_segment, lang, _ROUTE_LOCAL_MSG)
+        return
+    contents = _build_segment_contents(pcm_segment, lang)
+    on_retry, on_switch = _segment_callbacks(worker)
+    try:
+        resp = gemini_generate_with_retry(
+            client=client,
+            contents=contents,
+            config=genai_types.GenerateContentConfig(temperature=0.0),
+            on_retry=on_retry,
+            on_model_switch=on_switch,
+            trace=_worker_trace(worker),
+        )
+    except Exception as e:
+        _handle_segment_failure(worker, e, pcm_segment, lang)
+        return
+    _emit_gemini_result(worker, resp)
+
+
+async def _transcribe_segment_async(worker: "GeminiWorker", client: genai.Client, pcm_segment: bytes, lang: str):
+    """Coroutine version of _transcribe_segment (runs on the STT event loop).
+
+    Local Whisper work is awaited as a future from the batch scheduler, so it
+    never runs on (or blocks) the event loop.
+    """
+    if _should_route_local():
+        await _transcribe_locally_async(worker, pcm_segment, lang, _ROUTE_LOCAL_MSG)
+        return
+    contents = _build_segment_contents(pcm_segment, lang)
+    on_retry, on_switch = _segment_callbacks(worker)
+    try:
+        resp = await gemini_generate_with_retry_async(
+            client=client,
+            contents=contents,
+            config=genai_types.GenerateContentConfig(temperature=0.0),
+            on_retry=on_retry,
+            on_model_switch=on_switch,
+            trace=_worker_trace(worker),
+        )
+    except Exception as e:
+        if _is_overload_error(e) and _local_fallback_ready():
+            if await _transcribe_locally_async(worker, pcm_segment, lang, _FALLBACK_LOCAL_MSG):
+                worker._emit_status(message="STT recovered.", level="info", code="STT_OK")
+                return
+        _report_segment_failure(worker, e)
+        return
+    _emit_gemini_result(worker, resp)
+
+
+# -----------------------------------------------------------------------------
+# Segment tracing + latency histograms
+# -----------------------------------------------------------------------------
+STT_TRACE_RECENT = int(os.getenv("STT_TRACE_RECENT", "200"))        # finished traces kept for /admin
+STT_TRACE_MAX_OPEN = int(os.getenv("STT_TRACE_MAX_OPEN", "4096"))   # emitted but not yet sent
+STT_LATENCY_BUCKETS_MS = tuple(
+    float(b) for b in os.getenv(
+        "STT_LATENCY_BUCKETS_MS", "25,50,100,250,500,1000,2000,4000,8000,16000,32000"
+    ).split(",")
+)
+
+
+@dataclass
+class SegmentTrace:
+    """Timeline of one segment from VAD cut to WebSocket send (monotonic seconds)."""
+
+    segment_id: str
+    session_id: str
+    kind: str
+    bytes: int
+    voiced_ratio: Optional[float] = None
+    buffer_ms: Optional[float] = None        # first PCM of the segment -> VAD cut
+    enqueued: float = field(default_factory=time.monotonic)
+    dequeued: Optional[float] = None
+    done: Optional[float] = None
+    emitted: Optional[float] = None
+    sent: Optional[float] = None
+    model: Optional[str] = None
+    attempts: int = 0
+    provider_ms: float = 0.0                 # time inside generate_content, all attempts
+    retry_sleep_ms: float = 0.0
+    engine: Optional[str] = None
+    outcome: str = "pending"                 # ok|empty|error|dropped|superseded|stale
+
+    @property
+    def audio_ms(self) -> float:
+        return self.bytes / 2 / SAMPLE_RATE * 1000.0
+
+    def to_dict(self) -> dict:
+        def ms(a, b):
+            return round((b - a) * 1000.0, 1) if a is not None and b is not None else None
+
+        return {
+            "segment_id": self.segment_id,
+            "session_id": self.session_id,
+            "kind": self.kind,
+            "bytes": self.bytes,
+            "audio_ms": round(self.audio_ms, 1),
+            "voiced_ratio": None if self.voiced_ratio is None else round(self.voiced_ratio, 3),
+            "buffer_ms": None if self.buffer_ms is None else round(self.buffer_ms, 1),
+            "queue_ms": ms(self.enqueued, self.dequeued),
+            "transcribe_ms": ms(self.dequeued, self.done),
+            "provider_ms": round(self.provider_ms, 1),
+            "retry_sleep_ms": round(self.retry_sleep_ms, 1),
+            "ws_send_ms": ms(self.emitted, self.sent),
+            "end_to_end_ms": ms(self.enqueued, self.sent),
+            "model": self.model,
+            "attempts": self.attempts,
+            "engine": self.engine,
+            "outcome": self.outcome,
+        }
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram in Prometheus layout (cumulative on export)."""
+
+    def __init__(self, buckets=STT_LATENCY_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value_ms: float):
+        i = 0
+        while i < len(self.buckets) and value_ms > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value_ms
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        cumulative, acc = {}, 0
+        for b, c in zip(self.buckets + (float("inf"),), self.counts):
+            acc += c
+            cumulative["+Inf" if b == float("inf") else f"{b:g}"] = acc
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 1),
+            "avg_ms": round(self.sum / self.count, 1) if self.count else 0.0,
+            "p50_le_ms": self.quantile(0.5),
+            "p95_le_ms": self.quantile(0.95),
+            "p99_le_ms": self.quantile(0.99),
+            "buckets": cumulative,
+        }
+
+
+class STTMetrics:
+    """Process-wide segment traces and per-stage latency histograms.
+
+    Stages: decode_first_pcm (per session), vad_buffer, queue_wait, transcribe,
+    provider, retry_sleep, ws_send, end_to_end (VAD cut -> event on the wire).
+    Histograms are keyed by (stage, kind) with kind final/partial/session.
+    """
+
+    STAGES = ("decode_first_pcm", "vad_buffer", "queue_wait", "transcribe",
+              "provider", "retry_sleep", "ws_send", "end_to_end")
+
+    def __init__(self, recent: int = STT_TRACE_RECENT, max_open: int = STT_TRACE_MAX_OPEN):
+        self._lock = threading.Lock()
+        self._hist: dict[tuple[str, str], LatencyHistogram] = {}
+        self._outcomes: dict[tuple[str, str, str], int] = {}
+        self._open: "OrderedDict[str, SegmentTrace]" = OrderedDict()
+        self._recent: "deque[dict]" = deque(maxlen=max(1, recent))
+        self.max_open = max(1, max_open)
+
+    def observe(self, stage: str, kind: str, value_ms: Optional[float]):
+        if value_ms is None:
+            return
+        with self._lock:
+            h = self._hist.get((stage, kind))
+            if h is None:
+                h = self._hist[(stage, kind)] = LatencyHistogram()
+            h.observe(max(0.0, value_ms))
+
+    def new_trace(self, session_id: str, kind: str, pcm: bytes, voiced_ratio=None, buffer_ms=None) -> SegmentTrace:
+        trace = SegmentTrace(
+            segment_id=uuid.uuid4().hex[:12],
+            session_id=session_id,
+            kind=kind,
+            bytes=len(pcm),
+            voiced_ratio=voiced_ratio,
+            buffer_ms=buffer_ms,
+        )
+        self.observe("vad_buffer", kind, buffer_ms)
+        return trace
+
+    def emitted(self, trace: Optional[SegmentTrace], engine: str):
+        """An event for this segment was queued for the socket; wait for mark_sent()."""
+        if trace is None:
+            return
+        with self._lock:
+            trace.engine = engine
+            trace.outcome = "ok"
+            if trace.emitted is None:
+                trace.emitted = time.monotonic()
+            self._open[trace.segment_id] = trace
+            while len(self._open) > self.max_open:
+                _sid, old = self._open.popitem(last=False)
+                self._recent.append(old.to_dict())
+
+    def finish(self, trace: Optional[SegmentTrace], outcome: Optional[str] = None):
+        """The job left the dispatcher (done, dropped, superseded, ...)."""
+        if trace is None:
+            return
+        trace.done = trace.done or time.monotonic()
+        if outcome:
+            trace.outcome = outcome
+        elif trace.outcome == "pending":
+            trace.outcome = "empty"
+        if trace.dequeued is not None:
+            self.observe("queue_wait", trace.kind, (trace.dequeued - trace.enqueued) * 1000.0)
+            self.observe("transcribe", trace.kind, (trace.done - trace.dequeued) * 1000.0)
+            if trace.attempts:
+                self.observe("provider", trace.kind, trace.provider_ms)
+                self.observe("retry_sleep", trace.kind, trace.retry_sleep_ms)
+        with self._lock:
+            key = (trace.kind, trace.engine or "-", trace.outcome)
+            self._outcomes[key] = self._outcomes.get(key, 0) + 1
+            if trace.emitted is None or trace.sent is not None:
+                self._open.pop(trace.segment_id, None)
+                self._recent.append(trace.to_dict())
+
+    def mark_sent(self, segment_id: Optional[str], send_ms: float, event_type: str):
+        """The WebSocket handler finished sending an event (closes the segment timeline)."""
+        self.observe("ws_send", event_type, send_ms)
+        if not segment_id:
+            return
+        with self._lock:
+            trace = self._open.get(segment_id)
+            if trace is None or trace.sent is not None:
+                return
+            trace.sent = time.monotonic()
+            if trace.done is not None:
+                self._open.pop(segment_id, None)
+                self._recent.append(trace.to_dict())
+        self.observe("end_to_end", trace.kind, (trace.sent - trace.enqueued) * 1000.0)
+
+    def snapshot(self, recent: int = 50) -> dict:
+        with self._lock:
+            hist = {f"{stage}:{kind}": h.snapshot() for (stage, kind), h in sorted(self._hist.items())}
+            outcomes = [
+                {"kind": k, "engine": e, "outcome": o, "count": n}
+                for (k, e, o), n in sorted(self._outcomes.items())
+            ]
+            traces = list(self._recent)[-recent:] if recent > 0 else []
+            awaiting_send = len(self._open)
+        return {"histograms": hist, "outcomes": outcomes, "awaiting_send": awaiting_send, "recent": traces}
+
+    def prometheus_text(self) -> str:
+        """Prometheus text exposition (version 0.0.4)."""
+        lines = [
+            "# HELP stt_stage_latency_ms Live STT per-stage latency in milliseconds.",
+            "# TYPE stt_stage_latency_ms histogram",
+        ]
+        with self._lock:
+            for (stage, kind), h in sorted(self._hist.items()):
+                labels = f'stage="{stage}",kind="{kind}"'
+                acc = 0
+                for b, c in zip(h.buckets + (float("inf"),), h.counts):
+                    acc += c
+                    le = "+Inf" if b == float("inf") else f"{b:g}"
+                    lines.append(f'stt_stage_latency_ms_bucket{{{labels},le="{le}"}} {acc}')
+                lines.append(f"stt_stage_latency_ms_sum{{{labels}}} {h.sum:.3f}")
+                lines.append(f"stt_stage_latency_ms_count{{{labels}}} {h.count}")
+            lines.append("# HELP stt_segments_total Live STT segments by kind, engine and outcome.")
+            lines.append("# TYPE stt_segments_total counter")
+            for (k, e, o), n in sorted(self._outcomes.items()):
+                lines.append(f'stt_segments_total{{kind="{k}",engine="{e}",outcome="{o}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+_STT_METRICS = STTMetrics()
+
+
+def get_stt_metrics() -> STTMetrics:
+    return _STT_METRICS
+
+
+def stt_metrics_snapshot(recent: int = 50) -> dict:
+    """Everything /admin shows about live STT: stage histograms, traces, pools, breakers."""
+    out = get_stt_metrics().snapshot(recent=recent)
+    out["dispatcher"] = _DISPATCHER.metrics() if _DISPATCHER is not None else None
+    out["ffmpeg_pool"] = _FFMPEG_POOL.metrics() if _FFMPEG_POOL is not None else None
+    out["circuit_breakers"] = circuit_breakers_snapshot()
+    return out
+
+
+def _worker_trace(worker: "GeminiWorker") -> Optional[SegmentTrace]:
+    job = getattr(worker, "_current", None)
+    return job.trace if job is not None else None
+
+
+# -----------------------------------------------------------------------------
+# Incremental partials: tail-window hypotheses stitched by word overlap
+# -----------------------------------------------------------------------------
+STT_PARTIAL_MAX_OVERLAP_WORDS = 16
+
+
+def _norm_word(w: str) -> str:
+    return re.sub(r"[^\w']", "", w.lower())
+
+
+def stitch_partial_text(prev: str, hyp: str, max_overlap: int = STT_PARTIAL_MAX_OVERLAP_WORDS) -> str:
+    """Merge a tail-window hypothesis into the running partial transcript.
+
+    1. Longest suffix of `prev` equal to a prefix of `hyp` -> append the rest.
+    2. Otherwise find where the window's opening words (skipping a word the cut
+       may have clipped) re-appear in the tail of `prev`; the newer hypothesis
+       wins from there, so revisions of recent words replace the old guess.
+    3. No alignment at all -> append.
+    """
+    prev_w, hyp_w = prev.split(), hyp.split()
+    if not prev_w:
+        return hyp.strip()
+    if not hyp_w:
+        return prev.strip()
+    pn = [_norm_word(w) for w in prev_w]
+    hn = [_norm_word(w) for w in hyp_w]
+
+    for k in range(min(len(pn), len(hn), max_overlap), 0, -1):
+        if pn[-k:] == hn[:k]:
+            return " ".join(prev_w + hyp_w[k:])
+
+    floor = max(0, len(pn) - max_overlap)
+    for skip in (0, 1):
+        anchor = hn[skip : skip + 2]
+        if len(anchor) < 2:
+            break
+        for i in range(len(pn) - 2, floor - 1, -1):
+            if pn[i : i + 2] == anchor:
+                return " ".join(prev_w[:i] + hyp_w[skip:])
+
+    return " ".join(prev_w + hyp_w)
+
+
+class PartialsEngine:
+    """Per-session partial state: which audio to send next and the stitched text.
+
+    Only the last `window_ms` of the growing segment is submitted, so each
+    partial costs a bounded amount of audio no matter how long the utterance
+    runs. `generation` changes when the utterance is finalized; results for an
+    older generation are discarded.
+    """
+
+    def __init__(
+        self,
+        window_ms: int = STT_PARTIAL_WINDOW_MS,
+        min_interval_ms: int = STT_PARTIAL_MIN_INTERVAL_MS,
+        min_ms: int = STT_PARTIAL_MIN_MS,
+    ):
+        self.window_bytes = int(SAMPLE_RATE * window_ms / 1000) * 2
+        self.min_bytes = int(SAMPLE_RATE * min_ms / 1000) * 2
+        self.min_interval_s = min_interval_ms / 1000.0
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.text = ""
+        self._last_submit = 0.0
+
+    def next_window(self, segment: bytes, now: float) -> Optional[tuple[bytes, bool]]:
+        """(tail_pcm, covers_whole_segment) if a partial is due, else None."""
+        if now - self._last_submit < self.min_interval_s or len(segment) < self.min_bytes:
+            return None
+        self._last_submit = now
+        if len(segment) <= self.window_bytes:
+            return bytes(segment), True
+        return bytes(segment[-self.window_bytes :]), False
+
+    def reset(self):
+        with self._lock:
+            self.generation += 1
+            self.text = ""
+            self._last_submit = 0.0
+
+    def merge(self, generation: int, hyp: str, full: bool) -> Optional[str]:
+        """Fold a hypothesis in; returns the new partial text, or None if stale."""
+        with self._lock:
+            if generation != self.generation:
+                return None
+            self.text = hyp.strip() if full else stitch_partial_text(self.text, hyp)
+            return self.text
+
+
+def _transcribe_partial(worker: "GeminiWorker", client: genai.Client, job: "SegmentJob"):
+    """Best-effort partial: one attempt, no retry banners, no local fallback.
+
+    Finals carry the reliable text; a partial that fails is simply not shown.
+    """
+    if job.generation != worker.partials.generation or _gemini_short_circuited():
+        _mark_outcome(job, "stale")
+        return
+    try:
+        resp = gemini_generate_with_retry(
+            client=client,
+            contents=_build_segment_contents(job.pcm, job.lang),
+            config=genai_types.GenerateContentConfig(temperature=0.0),
+            max_attempts=1,
+            trace=job.trace,
+        )
+    except Exception as e:
+        logger.debug(f"Partial transcription skipped: {e}")
+        _mark_outcome(job, "error")
+        return
+    _emit_partial_result(worker, job, resp)
+
+
+async def _transcribe_partial_async(worker: "GeminiWorker", client: genai.Client, job: "SegmentJob"):
+    if job.generation != worker.partials.generation or _gemini_short_circuited():
+        _mark_outcome(job, "stale")
+        return
+    try:
+        resp = await gemini_generate_with_retry_async(
+            client=client,
+            contents=_build_segment_contents(job.pcm, job.lang),
+            config=genai_types.GenerateContentConfig(temperature=0.0),
+            max_attempts=1,
+            trace=job.trace,
+        )
+    except Exception as e:
+        logger.debug(f"Partial transcription skipped: {e}")
+        _mark_outcome(job, "error")
+        return
+    _emit_partial_result(worker, job, resp)
+
+
+def _mark_outcome(job: "SegmentJob", outcome: str):
+    if job.trace is not None:
+        job.trace.outcome = outcome
+
+
+def _emit_partial_result(worker: "GeminiWorker", job: "SegmentJob", resp):
+    hyp = (resp.text or "").strip()
+    if not hyp:
+        return
+    text = worker.partials.merge(job.generation, hyp, job.full)
+    if text:
+        worker._emit_partial(text=text, engine=_effective_engine_name())
+    else:
+        _mark_outcome(job, "stale")
+
+
+# -----------------------------------------------------------------------------
+# Shared STT dispatcher (process-wide worker pool)
+# -----------------------------------------------------------------------------
+STT_POOL_SIZE = int(os.getenv("STT_POOL_SIZE", "4"))
+STT_CLIENT_POOL_SIZE = int(os.getenv("STT_CLIENT_POOL_SIZE", "2"))
+STT_SESSION_MAX_PENDING = int(os.getenv("STT_SESSION_MAX_PENDING", "8"))
+STT_BACKPRESSURE_DEPTH = int(os.getenv("STT_BACKPRESSURE_DEPTH", "3"))
+STT_SESSION_MAX_EVENTS = int(os.getenv("STT_SESSION_MAX_EVENTS", "256"))
+
+
+@dataclass
+class SegmentJob:
+    """One unit of dispatcher work: a final segment or a partial tail window."""
+
+    pcm: bytes
+    lang: str
+    kind: str = "final"  # "final" | "partial"
+    generation: int = 0  # PartialsEngine generation (partials only)
+    full: bool = False   # partial window covers the whole utterance so far
+    enqueued: float = field(default_factory=time.monotonic)
+    trace: Optional[SegmentTrace] = None
+
+
+class _GeminiClientPool:
+    """Small round-robin pool of genai clients shared by all STT workers.
+
+    `factory` defaults to _gemini_client; the replay harness passes a stub.
+    """
+
+    def __init__(self, size: int, factory: Optional[Callable[[], Any]] = None):
+        self._size = max(1, size)
+        self._factory = factory or _gemini_client
+        self._clients: list[genai.Client] = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def get(self) -> genai.Client:
+        with self._lock:
+            if len(self._clients) < self._size:
+                client = self._factory()
+                self._clients.append(client)
+                return client
+            client = self._clients[self._next % len(self._clients)]
+            self._next += 1
+            return client
+
+
+class STTDispatcher:
+    """Process-wide pool that transcribes segments for every live STT session.
+
+    Each session owns a bounded FIFO of pending segments. Workers pick sessions
+    round-robin and only one segment per session is in flight at a time, so
+    finals stay in order and a chatty session cannot starve the others.
+    At most one partial per session waits in the queue: a newer partial (or
+    the utterance's final) supersedes it before it costs a provider call.
+
+    With `use_async` (STT_ASYNC_GEMINI) a single dispatch thread hands segments
+    to the STT event loop instead of blocking a pool thread per call; up to
+    STT_ASYNC_MAX_IN_FLIGHT segments may then be pending as coroutines.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = STT_POOL_SIZE,
+        client_pool_size: int = STT_CLIENT_POOL_SIZE,
+        max_pending: int = STT_SESSION_MAX_PENDING,
+        backpressure_depth: int = STT_BACKPRESSURE_DEPTH,
+        use_async: bool = STT_ASYNC_GEMINI,
+        client_factory: Optional[Callable[[], Any]] = None,
+    ):
+        self.use_async = use_async
+        self._async_slots = threading.BoundedSemaphore(max(1, STT_ASYNC_MAX_IN_FLIGHT)) if use_async else None
+        self.max_pending = max(1, max_pending)
+        self.backpressure_depth = max(1, min(backpressure_depth, self.max_pending))
+        self._clients = _GeminiClientPool(client_pool_size, factory=client_factory)
+        self._cv = threading.Condition()
+        self._ready: "deque[GeminiWorker]" = deque()
+        self._sessions: dict[str, "GeminiWorker"] = {}
+        self._busy = 0
+        self._submitted = 0
+        self._completed = 0
+        self._dropped = 0
+        self._superseded = 0
+        self._wait = _RollingStats()
+        self._transcribe = _RollingStats()
+        self._threads = []
+        for i in range(1 if use_async else max(1, pool_size)):
+            t = threading.Thread(target=self._worker_loop, name=f"stt-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    # -- session lifecycle ---------------------------------------------------
+    def register(self, worker: "GeminiWorker"):
+        with self._cv:
+            self._sessions[worker.session_id] = worker
+
+    def unregister(self, worker: "GeminiWorker"):
+        with self._cv:
+            self._sessions.pop(worker.session_id, None)
+            dropped = len(worker._pending)
+            for job in worker._pending:
+                get_stt_metrics().finish(job.trace, "dropped")
+            worker._pending.clear()
+            try:
+                self._ready.remove(worker)
+            except ValueError:
+                pass
+            self._dropped += dropped
+
+    # -- queueing ------------------------------------------------------------
+    def _drop_queued_partials(self, worker: "GeminiWorker"):
+        stale = [j for j in worker._pending if j.kind == "partial"]
+        for job in stale:
+            worker._pending.remove(job)
+            get_stt_metrics().finish(job.trace, "superseded")
+        self._superseded += len(stale)
+
+    def cancel_partials(self, worker: "GeminiWorker"):
+        with self._cv:
+            self._drop_queued_partials(worker)
+
+    def submit_partial(self, worker: "GeminiWorker", job: SegmentJob) -> bool:
+        """Queue a partial, replacing any partial of this session still waiting."""
+        with self._cv:
+            if worker.session_id not in self._sessions:
+                return False
+            self._drop_queued_partials(worker)
+            if len(worker._pending) >= self.max_pending:
+                # Finals take priority over a full queue; the partial is just skipped
+                self._superseded += 1
+                get_stt_metrics().finish(job.trace, "superseded")
+                return False
+            worker._pending.append(job)
+            self._submitted += 1
+            if not worker._in_flight and worker not in self._ready:
+                self._ready.append(worker)
+                self._cv.notify()
+        return True
+
+    def submit(
+        self,
+        worker: "GeminiWorker",
+        pcm_segment: bytes,
+        lang: str,
+        voiced_ratio: Optional[float] = None,
+        buffer_ms: Optional[float] = None,
+    ) -> bool:
+        """Queue a segment for `worker`. Returns False if an older segment had to be dropped."""
+        accepted = True
+        trace = get_stt_metrics().new_trace(worker.session_id, "final", pcm_segment, voiced_ratio, buffer_ms)
+        with self._cv:
+            if worker.session_id not in self._sessions:
+                return False
+            # The final covers the same audio as any partial still waiting
+            self._drop_queued_partials(worker)
+            if len(worker._pending) >= self.max_pending:
+                get_stt_metrics().finish(worker._pending.popleft().trace, "dropped")
+                self._dropped += 1
+                accepted = False
+            worker._pending.append(SegmentJob(pcm=pcm_segment, lang=lang, trace=trace))
+            self._submitted += 1
+            depth = len(worker._pending)
+            if not worker._in_flight and worker not in self._ready:
+                self._ready.append(worker)
+                self._cv.notify()
+
+        if not accepted:
+            worker._emit_status(
+                message="STT overloaded: an older audio segment was skipped.",
+                level="warning",
+                code="STT_DROPPED",
+            )
+        elif depth >= self.backpressure_depth and not worker._backpressured:
+            worker._backpressured = True
+            worker._emit_status(
+                message=f"STT is falling behind ({depth} segments queued)…",
+                level="warning",
+                code="STT_BACKPRESSURE",
+            )
+        return accepted
+
+    def _next_job(self):
+        with self._cv:
+            while not self._ready:
+                self._cv.wait()
+            worker = self._ready.popleft()
+            job = worker._pending.popleft()
+            worker._in_flight = True
+            worker._current = job
+            self._busy += 1
+            now = time.monotonic()
+            if job.trace is not None:
+                job.trace.dequeued = now
+            self._wait.add((now - job.enqueued) * 1000.0)
+            return worker, job
+
+    def _job_done(self, worker: "GeminiWorker", elapsed_ms: float):
+        relieved = False
+        with self._cv:
+            job, worker._current = worker._current, None
+            worker._in_flight = False
+            self._busy -= 1
+            self._completed += 1
+            self._transcribe.add(elapsed_ms)
+            if worker._pending and worker.session_id in self._sessions:
+                self._ready.append(worker)
+                self._cv.notify()
+            finals_pending = sum(1 for j in worker._pending if j.kind == "final")
+            if worker._backpressured and finals_pending < self.backpressure_depth:
+                worker._backpressured = False
+                relieved = True
+        if job is not None:
+            get_stt_metrics().finish(job.trace)
+        if relieved:
+            worker._emit_status(message="STT caught up.", level="info", code="STT_OK")
+
+    def _dispatch_async(self, worker: "GeminiWorker", job: SegmentJob):
+        t0 = time.monotonic()
+
+        def _done(fut):
+            self._async_slots.release()
+            exc = fut.exception()
+            if exc is not None:
+                _mark_outcome(job, "error")
+                logger.error("Gemini live transcription worker failed", exc_info=exc)
+                worker._emit_status(message="STT error: worker failure.", level="warning", code="STT_ERROR")
+            self._job_done(worker, (time.monotonic() - t0) * 1000.0)
+
+        try:
+            client = self._clients.get()
+            if job.kind == "partial":
+                coro = _transcribe_partial_async(worker, client, job)
+            else:
+                coro = _transcribe_segment_async(worker, client, job.pcm, job.lang)
+            fut = get_stt_event_loop().submit(coro)
+        except Exception:
+            _mark_outcome(job, "error")
+            logger.exception("Gemini live transcription worker failed")
+            worker._emit_status(message="STT error: worker failure.", level="warning", code="STT_ERROR")
+            self._async_slots.release()
+            self._job_done(worker, (time.monotonic() - t0) * 1000.0)
+            return
+        fut.add_done_callback(_done)
+
+    def _worker_loop(self):
+        while True:
+            if self._async_slots is not None:
+                self._async_slots.acquire()
+                worker, job = self._next_job()
+                self._dispatch_async(worker, job)
+                continue
+
+            worker, job = self._next_job()
+            t0 = time.monotonic()
+            try:
+                client = self._clients.get()
+                if job.kind == "partial":
+                    _transcribe_partial(worker, client, job)
+                else:
+                    _transcribe_segment(worker, client, job.pcm, job.lang)
+            except Exception:
+                _mark_outcome(job, "error")
+                logger.exception("Gemini live transcription worker failed")
+                worker._emit_status(
+                    message="STT error: worker failure.",
+                    level="warning",
+                    code="STT_ERROR",
+                )
+            finally:
+                self._job_done(worker, (time.monotonic() - t0) * 1000.0)
+
+    # -- observability -------------------------------------------------------
+    def metrics(self) -> dict:
+        with self._cv:
+            depths = [len(w._pending) for w in self._sessions.values()]
+            return {
+                "workers": len(self._threads),
+                "async": self.use_async,
+                "in_flight": self._busy,
+                "sessions": len(self._sessions),
+                "queue_depth": sum(depths),
+                "max_session_queue_depth": max(depths) if depths else 0,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "dropped": self._dropped,
+                "partials_superseded": self._superseded,
+                "wait": self._wait.snapshot(),
+                "transcribe": self._transcribe.snapshot(),
+                "whisper": _WHISPER_STATS.snapshot(),
+                "whisper_batches": get_whisper_batcher().metrics() if WHISPER_BATCHING else None,
+                "circuit_breakers": circuit_breakers_snapshot(),
+            }
+
+
+_DISPATCHER: Optional[STTDispatcher] = None
+_DISPATCHER_LOCK = threading.Lock()
+
+
+def get_stt_dispatcher() -> STTDispatcher:
+    """Return the process-wide dispatcher, starting its pool on first use."""
+    global _DISPATCHER
+    if _DISPATCHER is None:
+        with _DISPATCHER_LOCK:
+            if _DISPATCHER is None:
+                _DISPATCHER = STTDispatcher()
+    return _DISPATCHER
+
+
 class GeminiWorker:
-    """Background worker that batches PCM segments and returns transcript text.
+    """Per-session handle onto the shared STT dispatcher.
 
     Emits events:
+      - {"type": "partial", "text": "...", "engine": "..."}  (EMIT_PARTIALS only)
       - {"type": "final", "text": "...", "engine": "..."}
       - {"type": "status", "level": "warning|info", "message": "...", "code": "..."}
 
-    Includes retry/backoff + model fallbacks for 503 overload.
-    Includes optional local faster-whisper fallback on persistent overload.
+    Segments are transcribed by the process-wide STTDispatcher pool (retry/backoff,
+    model fallbacks and optional local faster-whisper fallback included); this
+    object only owns the session's pending segments and its outgoing events.
     """
 
-    def __init__(self):
-        self.q_in: "queue.Queue[tuple[bytes, str]]" = queue.Queue()
-        self.q_out: "queue.Queue[dict]" = queue.Queue()
-        self.stop = threading.Event()
-        self.thread = threading.Thread(target=self._run, daemon=True)
-        self.thread.start()
+    def __init__(self, dispatcher: Optional[STTDispatcher] = None):
+        self.session_id = uuid.uuid4().hex
+        self.dispatcher = dispatcher or get_stt_dispatcher()
+        self.q_out: "queue.Queue[dict]" = queue.Queue(maxsize=STT_SESSION_MAX_EVENTS)
+        self._pending: "deque[SegmentJob]" = deque()
+        self._current: Optional[SegmentJob] = None  # the one in-flight job (dispatcher-owned)
+        self.partials = PartialsEngine()
+        self._in_flight = False
+        self._backpressured = False
+        self.dispatcher.register(self)
+
+    def submit(self, pcm_segment: bytes, lang: str, **trace_fields) -> bool:
+        return self.dispatcher.submit(self, pcm_segment, lang, **trace_fields)
+
+    def submit_partial(self, pcm_window: bytes, lang: str, full: bool = False) -> bool:
+        job = SegmentJob(
+            pcm=pcm_window, lang=lang, kind="partial", generation=self.partials.generation, full=full,
+            trace=get_stt_metrics().new_trace(self.session_id, "partial", pcm_window),
+        )
+        return self.dispatcher.submit_partial(self, job)
 
-    def submit(self, pcm_segment: bytes, lang: str):
-        self.q_in.put((pcm_segment, lang))
+    def finalize_utterance(self, pcm_segment: Optional[bytes], lang: str, **trace_fields) -> bool:
+        """Close the current utterance: late partials for it are dropped from now on.
+
+        `trace_fields` (voiced_ratio, buffer_ms) are recorded on the segment trace.
+        """
+        self.partials.reset()
+        if pcm_segment is None:
+            self.dispatcher.cancel_partials(self)
+            return True
+        return self.submit(pcm_segment, lang, **trace_fields)
 
     def get_event(self, timeout: float = 0.01) -> Optional[dict]:
         try:
@@ -457,136 +2336,142 @@ class GeminiWorker:
         except queue.Empty:
             return None
 
-    def _emit_status(self, message: str, level: str = "warning", code: str = "STT_DEGRADED"):
-        self.q_out.put({"type": "status", "level": level, "message": message, "code": code, "ts": time.time()})
+    def close(self):
+        self.dispatcher.unregister(self)
 
-    def _emit_final(self, text: str, engine: str):
-        self.q_out.put({"type": "final", "text": text, "engine": engine, "ts": time.time()})
+    def _put_event(self, evt: dict):
+        # Never block a pool worker on a slow/abandoned socket: drop the oldest event instead.
+        while True:
+            try:
+                self.q_out.put_nowait(evt)
+                return
+            except queue.Full:
+                try:
+                    self.q_out.get_nowait()
+                except queue.Empty:
+                    pass
 
-    def _run(self):
-        # Reuse one client per worker thread to reduce overhead
-        try:
-            client = _gemini_client()
-        except Exception:
-            logger.exception("Failed to initialize Gemini client in worker")
-            client = None
+    def _emit_status(self, message: str, level: str = "warning", code: str = "STT_DEGRADED"):
+        self._put_event({"type": "status", "level": level, "message": message, "code": code, "ts": time.time()})
 
-        while not self.stop.is_set():
-            try:
-                pcm_segment, lang = self.q_in.get(timeout=0.2)
-            except queue.Empty:
-                continue
+    def _emit_transcript(self, kind: str, text: str, engine: str):
+        evt = {"type": kind, "text": text, "engine": engine, "ts": time.time()}
+        trace = _worker_trace(self)
+        if trace is not None:
+            evt["seg"] = trace.segment_id
+            get_stt_metrics().emitted(trace, engine)
+        self._put_event(evt)
 
-            try:
-                if client is None:
-                    client = _gemini_client()
+    def _emit_partial(self, text: str, engine: str):
+        self._emit_transcript("partial", text, engine)
 
-                wav_bytes = write_wav_bytes(pcm_segment, sample_rate=SAMPLE_RATE)
-                prompt = _lang_prompt(lang)
+    def _emit_final(self, text: str, engine: str):
+        self._emit_transcript("final", text, engine)
 
-                audio_part = genai_types.Part.from_bytes(data=wav_bytes, mime_type="audio/wav")
 
-                contents = [
-                    genai_types.Content(
-                        role="user",
-                        parts=[
-                            genai_types.Part.from_text(text=prompt),
-                            audio_part,
-                        ],
-                    )
-                ]
-
-                def _on_retry(model: str, attempt: int, max_attempts: int, sleep_s: float):
-                    # Tell the browser this may be delayed
-                    self._emit_status(
-                        message=f"STT delayed: Gemini model overloaded; retrying ({attempt}/{max_attempts})…",
-                        level="warning",
-                        code="STT_RETRYING",
-                    )
+# -----------------------------------------------------------------------------
+# Live segmentation (shared by /ws/stt and benchmarks/stt_replay.py)
+# -----------------------------------------------------------------------------
+class LiveSegmenter:
+    """Cuts one session's PCM stream into segments and hands them to its worker.
 
-                def _on_switch(new_model: str):
-                    self._emit_status(
-                        message=f"STT delayed: switching to fallback model ({new_model})…",
-                        level="warning",
-                        code="STT_MODEL_FALLBACK",
-                    )
+    A segment is finalized after STT_SEGMENT_SILENCE_MS of silence (once it
+    holds at least 350 ms of audio) or after STT_MAX_SEGMENT_MS; tail-window
+    partials go out while voice is active when `emit_partials` is on.
 
-                try:
-                    resp = gemini_generate_with_retry(
-                        client=client,
-                        contents=contents,
-                        config=genai_types.GenerateContentConfig(temperature=0.0),
-                        on_retry=_on_retry,
-                        on_model_switch=_on_switch,
-                    )
-                    text = (resp.text or "").strip()
-                    if text:
-                        self._emit_final(text=text, engine=_effective_engine_name())
-                        # Clear banner hint once we get a clean final
-                        self._emit_status(message="STT recovered.", level="info", code="STT_OK")
-                        continue
+    Time comes from the wall clock by default. With `audio_clock=True` it is
+    derived from the PCM pushed so far, so a replay at N x speed makes the
+    same cuts as a real-time stream.
+    """
 
-                except Exception as e:
-                    # If overload persists: fallback locally (optional)
-                    if _is_overload_error(e):
-                        if USE_LOCAL_WHISPER_FALLBACK and _get_whisper_model() is not None:
-                            self._emit_status(
-                                message="STT degraded: Gemini is overloaded; using local Whisper fallback.",
-                                level="warning",
-                                code="STT_FALLBACK_LOCAL",
-                            )
-                            local_text = whisper_transcribe_pcm16(pcm_segment, lang)
-                            if local_text:
-                                self._emit_final(text=local_text, engine="local/faster-whisper")
-                                self._emit_status(message="STT recovered.", level="info", code="STT_OK")
-                                continue
-
-                        # If no fallback, surface degraded status (but don't kill the worker)
-                        self._emit_status(
-                            message="STT degraded: Gemini is overloaded and no fallback is available. You may miss a few seconds.",
-                            level="warning",
-                            code="STT_DEGRADED",
-                        )
-                        continue
+    def __init__(
+        self,
+        worker: "GeminiWorker",
+        lang: str,
+        emit_partials: bool = EMIT_PARTIALS,
+        audio_clock: bool = False,
+    ):
+        self.worker = worker
+        self.lang = lang
+        self.emit_partials = emit_partials
+        self.audio_clock = audio_clock
+        self.vad = webrtcvad.Vad(STT_VAD_AGGRESSIVENESS)
+        self.audio_s = 0.0
+        self.segment = bytearray()
+        self.last_voiced_ts = self._now()
+        self.seg_start_ts = self._now()
+        self.finals_submitted = 0
+
+    def _now(self) -> float:
+        return self.audio_s if self.audio_clock else time.time()
+
+    def push(self, block: bytes):
+        """Consume one decoded PCM block (SAMPLE_RATE s16le mono)."""
+        self.audio_s += len(block) / 2 / SAMPLE_RATE
+        segment = self.segment
+        segment += block
+
+        voiced_ratio = vad_voiced_ratio(bytes(segment), SAMPLE_RATE, self.vad, VAD_FRAME_MS)
+        audio_f32 = pcm_s16le_bytes_to_float32(bytes(segment))
+        rms = rms_level_f32(audio_f32)
+
+        now = self._now()
+        is_voiced = voiced_ratio >= VAD_VOICED_RATIO_MIN and rms > 0.002
+        if is_voiced:
+            self.last_voiced_ts = now
+
+        # Optional partials: send only the tail window while voice is active.
+        if self.emit_partials and is_voiced:
+            window = self.worker.partials.next_window(segment, now)
+            if window:
+                self.worker.submit_partial(window[0], self.lang, full=window[1])
+
+        silence_ms = (now - self.last_voiced_ts) * 1000.0
+        seg_ms = (now - self.seg_start_ts) * 1000.0
+
+        should_finalize = (
+            (silence_ms >= STT_SEGMENT_SILENCE_MS and len(segment) >= int(SAMPLE_RATE * 0.35) * 2)
+            or (seg_ms >= STT_MAX_SEGMENT_MS)
+        )
+        if should_finalize:
+            self._finalize(seg_ms)
 
-                    # Non-overload errors: log + surface a status (still keep worker alive)
-                    logger.exception("Gemini live transcription worker failed")
-                    self._emit_status(
-                        message="STT error: transcription failed for a segment.",
-                        level="warning",
-                        code="STT_ERROR",
-                    )
+    def flush(self):
+        """End of stream: submit whatever is buffered if it holds speech."""
+        if self.segment:
+            self._finalize((self._now() - self.seg_start_ts) * 1000.0)
 
-            except Exception:
-                logger.exception("Gemini live transcription worker failed")
-                self._emit_status(
-                    message="STT error: worker failure.",
-                    level="warning",
-                    code="STT_ERROR",
-                )
+    def _finalize(self, seg_ms: float):
+        segment = self.segment
+        # Only submit if there's some speechy content
+        seg_voiced = vad_voiced_ratio(bytes(segment), SAMPLE_RATE, self.vad, VAD_FRAME_MS)
+        if seg_voiced >= 0.15:
+            self.worker.finalize_utterance(bytes(segment), self.lang, voiced_ratio=seg_voiced, buffer_ms=seg_ms)
+            self.finals_submitted += 1
+        else:
+            self.worker.finalize_utterance(None, self.lang)
+
+        segment.clear()
+        self.seg_start_ts = self._now()
+        self.last_voiced_ts = self._now()
 
 
 def register_ws_routes(sock):
+    # Warm the local fallback now rather than on the first overloaded segment
+    preload_whisper_model()
+    if STT_DECODER == "ffmpeg_pool" and shutil.which(FFMPEG_BIN):
+        get_ffmpeg_pool()
+
     @sock.route("/ws/stt")
     def stt(ws):
         lang = parse_lang_query(ws.environ.get("QUERY_STRING") or "")
-        vad = webrtcvad.Vad(STT_VAD_AGGRESSIVENESS)
         worker = GeminiWorker()
+        segmenter = LiveSegmenter(worker, lang)
 
-        ff = start_ffmpeg_decoder()
+        decoder = open_pcm_decoder()
         stop = threading.Event()
-        pcm_q: "queue.Queue[bytes]" = queue.Queue()
-
-        def read_pcm():
-            try:
-                chunk_bytes = int(SAMPLE_RATE * 0.1) * 2
-                while not stop.is_set():
-                    data = ff.stdout.read(chunk_bytes)
-                    if not data:
-                        break
-                    pcm_q.put(data)
-            finally:
-                stop.set()
+        metrics = get_stt_metrics()
+        first_feed_at: list[float] = []
 
         def write_webm():
             try:
@@ -594,24 +2479,23 @@ def register_ws_routes(sock):
                     msg = ws.receive()
                     if msg is None:
                         break
-                    ff.stdin.write(msg)
-                    ff.stdin.flush()
+                    if not first_feed_at:
+                        first_feed_at.append(time.monotonic())
+                    decoder.feed(msg)
             except Exception:
                 pass
             finally:
-                try:
-                    ff.stdin.close()
-                except Exception:
-                    pass
+                decoder.close_input()
                 stop.set()
 
-        threading.Thread(target=read_pcm, daemon=True).start()
         threading.Thread(target=write_webm, daemon=True).start()
 
-        segment = bytearray()
-        last_voiced_ts = time.time()
-        seg_start_ts = time.time()
-        last_partial_emit = 0.0
+        def send_event(evt: dict):
+            t0 = time.monotonic()
+            ws.send(json.dumps(evt))
+            metrics.mark_sent(evt.get("seg"), (time.monotonic() - t0) * 1000.0, evt.get("type", "status"))
+
+        decode_observed = False
 
         # Tell UI we're ready
         try:
@@ -620,66 +2504,35 @@ def register_ws_routes(sock):
             pass
 
         try:
-            while not stop.is_set():
-                try:
-                    block = pcm_q.get(timeout=0.5)
-                except queue.Empty:
+            while not stop.is_set() and not decoder.finished:
+                block = decoder.read(timeout=0.5)
+                if block is None:
                     # drain events
                     evt = worker.get_event(timeout=0.001)
                     if evt:
-                        ws.send(json.dumps(evt))
+                        send_event(evt)
                     continue
 
-                segment += block
-
-                voiced_ratio = vad_voiced_ratio(bytes(segment), SAMPLE_RATE, vad, VAD_FRAME_MS)
-                audio_f32 = pcm_s16le_bytes_to_float32(bytes(segment))
-                rms = rms_level_f32(audio_f32)
-
-                now = time.time()
-                is_voiced = voiced_ratio >= VAD_VOICED_RATIO_MIN and rms > 0.002
-                if is_voiced:
-                    last_voiced_ts = now
-
-                # Optional partials: submit the whole buffer occasionally while voice is active.
-                if EMIT_PARTIALS:
-                    if (now - last_partial_emit) * 1000.0 >= STT_PARTIAL_MIN_INTERVAL_MS:
-                        if len(segment) >= int(SAMPLE_RATE * 0.8) * 2 and is_voiced:
-                            worker.submit(bytes(segment), lang)
-                            last_partial_emit = now
-
-                silence_ms = (now - last_voiced_ts) * 1000.0
-                seg_ms = (now - seg_start_ts) * 1000.0
-
-                should_finalize = (
-                    (silence_ms >= STT_SEGMENT_SILENCE_MS and len(segment) >= int(SAMPLE_RATE * 0.35) * 2)
-                    or (seg_ms >= STT_MAX_SEGMENT_MS)
-                )
-
-                if should_finalize:
-                    # Only submit if there's some speechy content
-                    if vad_voiced_ratio(bytes(segment), SAMPLE_RATE, vad, VAD_FRAME_MS) >= 0.15:
-                        worker.submit(bytes(segment), lang)
+                if not decode_observed and first_feed_at and decoder.first_pcm_at:
+                    decode_observed = True
+                    metrics.observe("decode_first_pcm", "session", (decoder.first_pcm_at - first_feed_at[0]) * 1000.0)
 
-                    segment.clear()
-                    seg_start_ts = time.time()
-                    last_voiced_ts = time.time()
-                    last_partial_emit = 0.0
+                segmenter.push(block)
 
                 # Drain worker events
                 while True:
                     evt = worker.get_event(timeout=0.001)
                     if not evt:
                         break
-                    ws.send(json.dumps(evt))
+                    send_event(evt)
 
         finally:
             stop.set()
             try:
-                worker.stop.set()
+                worker.close()
             except Exception:
                 pass
             try:
-                ff.terminate()
+                decoder.close()
             except Exception:
                 pass
@@ -0,0 +1,159 @@
+# symptoms.py
+"""Symptom lexicon and tagging.
+
+Shared by admin analytics and message ingestion (models.log_message tags
+patient messages into message_symptoms), so it has no Flask/DB imports.
+
+The tagger is a word-level trie built once at import. Text is tokenized in
+one pass and matched leftmost-longest, non-overlapping ("chest pain" wins
+over "pain"). Mentions inside a negation scope ("no fever", "sina homa")
+are reported separately and left out of the counts.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+# Bump when the lexicon or matching rules change: messages tagged with an
+# older version are re-tagged by models.backfill_message_symptoms().
+SYMPTOM_LEXICON_VERSION = 2
+
+SYMPTOM_LEXICON = [
+    "fever","cough","wheezing","shortness of breath","breathlessness","chest pain","headache",
+    "nausea","vomiting","fatigue","dizziness","joint pain","swelling","stiffness","back pain",
+    "sore throat","runny nose","rash","abdominal pain","diarrhea","constipation","weight loss",
+    "night sweats","palpitations","fainting","tingling","numbness","weakness","pain"
+]
+CANON = {s: s for s in SYMPTOM_LEXICON}
+CANON.update({
+    "sob": "shortness of breath",
+    "dyspnea": "shortness of breath",
+    "tiredness": "fatigue",
+    "lightheadedness": "dizziness",
+    "chest tightness": "chest pain",
+    "loose stools": "diarrhea",
+    "constipated": "constipation",
+    "weightloss": "weight loss",
+})
+
+# Swahili phrases -> canonical (English) symptom
+CANON_SW = {
+    "homa": "fever",
+    "kikohozi": "cough",
+    "kukohoa": "cough",
+    "kupumua kwa shida": "shortness of breath",
+    "kushindwa kupumua": "shortness of breath",
+    "maumivu ya kifua": "chest pain",
+    "maumivu ya kichwa": "headache",
+    "kichwa kuuma": "headache",
+    "kichefuchefu": "nausea",
+    "kutapika": "vomiting",
+    "uchovu": "fatigue",
+    "kizunguzungu": "dizziness",
+    "maumivu ya viungo": "joint pain",
+    "uvimbe": "swelling",
+    "maumivu ya mgongo": "back pain",
+    "maumivu ya koo": "sore throat",
+    "kamasi": "runny nose",
+    "upele": "rash",
+    "maumivu ya tumbo": "abdominal pain",
+    "kuhara": "diarrhea",
+    "kuvimbiwa": "constipation",
+    "kupungua uzito": "weight loss",
+    "jasho usiku": "night sweats",
+    "moyo kwenda mbio": "palpitations",
+    "kuzimia": "fainting",
+    "ganzi": "numbness",
+    "udhaifu": "weakness",
+    "maumivu": "pain",
+}
+
+# A cue negates the mentions that follow it in the same clause, up to
+# NEGATION_WINDOW items away (a matched symptom counts as one item;
+# conjunctions don't count, so "no fever or cough" negates both).
+NEGATION_CUES = {
+    # English
+    "no", "not", "without", "denies", "denied", "deny", "never", "nor", "none",
+    "don't", "dont", "doesn't", "doesnt", "didn't", "didnt", "haven't", "havent", "hasn't", "hasnt",
+    # Swahili
+    "sina", "huna", "hana", "hatuna", "hamna", "hawana", "hakuna", "bila", "sijawahi", "sijapata",
+}
+NEGATION_CONJUNCTIONS = {"or", "and", "any", "wala", "au", "na", "a", "an"}
+CLAUSE_BREAK_WORDS = {"but", "however", "although", "lakini", "ila", "isipokuwa"}
+NEGATION_WINDOW = 3
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?|[.,;:!?]")
+
+
+@dataclass
+class SymptomTags:
+    counts: Counter = field(default_factory=Counter)     # affirmed mentions
+    negated: Counter = field(default_factory=Counter)    # "no fever", "sina homa"
+
+
+class SymptomTagger:
+    """Word-trie tagger; build once, call tag()/tag_many() from any thread."""
+
+    def __init__(self, phrases: dict[str, str]):
+        self._root: dict = {}
+        for phrase, canon in phrases.items():
+            node = self._root
+            for word in _TOKEN_RE.findall(phrase.lower()):
+                node = node.setdefault(word, {})
+            node[None] = canon          # terminal marker
+
+    def tag(self, text: str) -> SymptomTags:
+        tags = SymptomTags()
+        tokens = _TOKEN_RE.findall((text or "").lower())
+        root = self._root
+        n = len(tokens)
+        i = 0
+        items = 0            # position counter for the negation window
+        cue_at = None        # item position of the last negation cue in this clause
+        while i < n:
+            tok = tokens[i]
+            if not tok[0].isalnum() or tok in CLAUSE_BREAK_WORDS:
+                cue_at = None
+                i += 1
+                continue
+
+            # longest match starting at i
+            node, j, canon, end = root, i, None, i
+            while j < n and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if None in node:
+                    canon, end = node[None], j
+
+            if canon is not None:
+                items += 1
+                if cue_at is not None and items - cue_at <= NEGATION_WINDOW:
+                    tags.negated[canon] += 1
+                else:
+                    tags.counts[canon] += 1
+                i = end
+                continue
+
+            if tok in NEGATION_CUES:
+                items += 1
+                cue_at = items
+            elif tok not in NEGATION_CONJUNCTIONS:
+                items += 1
+            i += 1
+        return tags
+
+    def tag_many(self, texts) -> list[SymptomTags]:
+        tag = self.tag
+        return [tag(t) for t in texts]
+
+
+TAGGER = SymptomTagger({**CANON, **CANON_SW})
+
+
+def extract_symptoms(text: str) -> Counter:
+    """Affirmed symptom mentions in `text`, keyed by canonical name."""
+    return TAGGER.tag(text).counts
+
+
+def extract_symptoms_many(texts) -> list[Counter]:
+    """Batch form of extract_symptoms (one Counter per input text)."""
+    return [t.counts for t in TAGGER.tag_many(texts)]
@@ -0,0 +1,48 @@
+"""
+Server-side conversation transcripts (conversation_store) on the SQLite backend.
+"""
+import os
+import sys
+
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from models import init_db, create_conversation, delete_conversation_by_id
+from conversation_store import ConversationStore, SQLiteTurnBackend
+
+
+def test_store_caches_lru_bounded_and_sees_other_workers_turns():
+    init_db()
+    a, b, c = (create_conversation() for _ in range(3))
+    store = ConversationStore(SQLiteTurnBackend(), max_conversations=2, max_turns=3)
+
+    assert store.append(a, "patient", "I have a cough") == [{"role": "patient", "message": "I have a cough"}]
+    store.append(a, "clinician", "Since when?")
+    assert [t["message"] for t in store.get(a)] == ["I have a cough", "Since when?"]
+    assert store.stats["hits"] == 1 and store.stats["misses"] == 1
+
+    # returned lists are copies
+    store.get(a).append({"role": "x", "message": "y"})
+    assert len(store.get(a)) == 2
+
+    # another worker (its own store over the same table) appends; our cached copy is refreshed
+    other = ConversationStore(SQLiteTurnBackend())
+    other.append(a, "patient", "two weeks")
+    assert [t["message"] for t in store.get(a)][-1] == "two weeks"
+    assert [t["message"] for t in store.append(a, "patient", "and fever")] == [
+        "Since when?", "two weeks", "and fever"]      # newest max_turns kept
+
+    # LRU: a third conversation evicts the least recently used one
+    store.append(b, "patient", "headache")
+    store.get(a)
+    store.append(c, "patient", "rash")
+    assert len(store) == 2 and store.stats["evictions"] == 1
+    assert store.get(b) == [{"role": "patient", "message": "headache"}]   # reloaded from SQLite
+
+    store.clear(b)
+    assert store.get(b) == []
+    delete_conversation_by_id(c)
+    assert other.get(c) == []
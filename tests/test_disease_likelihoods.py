@@ -0,0 +1,71 @@
+"""
+Cached per-conversation disease likelihoods. The FAISS side is a small
+stand-in exposing the two things disease_likelihoods uses (index_version and
+search_similar_cases_batch), so this runs without faiss/sentence-transformers.
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from models import init_db, create_conversation, log_message
+from disease_likelihoods import get_likelihoods, refresh_likelihoods, conversation_texts
+
+
+class _CaseIndex:
+    def __init__(self, version):
+        self.index_version = version
+        self.batches = []
+
+    def search_similar_cases_batch(self, queries, k=5, similarity_threshold=0.5, batch_size=64):
+        self.batches.append(list(queries))
+        out = []
+        for q in queries:
+            hits = [SimpleNamespace(case_id="c-flu", similarity_score=0.8, Suspected_illness={"Influenza": 1})]
+            if "lump" in q:
+                hits.append(SimpleNamespace(case_id="c-bc", similarity_score=0.6, Suspected_illness="Breast cancer"))
+            out.append(hits[:k])
+        return out
+
+
+def test_likelihoods_cached_until_text_or_index_changes():
+    init_db()
+    a = create_conversation()
+    b = create_conversation()
+    log_message(a, "patient", "fever and cough", "00:00:01")
+    log_message(a, "clinician", "how long?", "00:00:02")
+    log_message(b, "clinician", "only clinician text so far", "00:00:03")
+
+    texts = conversation_texts([a, b])
+    assert texts[a] == "fever and cough"
+    assert texts[b] == "only clinician text so far"      # falls back to the transcript
+
+    idx = _CaseIndex("v1")
+    stats = refresh_likelihoods(idx, batch_size=8)
+    assert stats["computed"] >= 2
+    assert refresh_likelihoods(idx)["computed"] == 0     # everything fresh
+
+    out = get_likelihoods(idx, a)
+    assert out["cached"] and out["index_version"] == "v1"
+    assert out["top_diseases"][0]["disease"] == "Influenza"
+    assert out["symptoms"] == {"fever": 1, "cough": 1}
+
+    # A new patient message only makes that conversation stale
+    log_message(a, "patient", "and a lump in my breast", "00:00:04")
+    idx.batches.clear()
+    assert refresh_likelihoods(idx)["computed"] == 1
+    assert idx.batches == [["fever and cough and a lump in my breast"]]
+    out = get_likelihoods(idx, a)
+    assert out["cached"]
+    assert {d["disease"] for d in out["top_diseases"]} == {"Influenza", "Breast cancer"}
+
+    # A rebuilt index invalidates the cache on read
+    out = get_likelihoods(_CaseIndex("v2"), a)
+    assert not out["cached"] and out["index_version"] == "v2"
+
+    assert get_likelihoods(idx, "no-such-conversation") is None
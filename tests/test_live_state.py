@@ -0,0 +1,129 @@
+import os
+import sys
+import threading
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from live_state import LiveStateStore
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_live_state_evicts_idle_lru_and_over_budget_entries():
+    clock = _Clock()
+    store = LiveStateStore(max_entries=3, max_bytes=0, idle_ttl_s=60, clock=clock)
+
+    st, lock = store.get_or_create(("1", "a"))
+    with lock:
+        st["history"].append({"role": "patient", "message": "x" * 5000})
+    assert store.metrics()["bytes"] > 5000            # re-measured when the lock was released
+    assert store.get_or_create(("1", "a"))[0] is st
+
+    # idle TTL: expired entries are dropped by the sweeper and on access
+    clock.now += 30
+    store.get_or_create(("1", "b"))
+    clock.now += 45
+    assert store.sweep() == 1 and store.get(("1", "a")) is None
+    clock.now += 60
+    fresh, _ = store.get_or_create(("1", "b"))
+    assert fresh["history"] == [] and store.metrics()["evictions"]["idle"] == 2
+
+    # LRU by entry count
+    for cid in "cdef":
+        store.get_or_create(("2", cid))
+    assert len(store) == 3 and store.get(("1", "b")) is None and store.get(("2", "c")) is None
+
+    # LRU by accounted bytes; the entry just written is never the victim
+    store.max_bytes = 20000
+    big, big_lock = store.get_or_create(("3", "big"))
+    with big_lock:
+        big["post_stop"] = {"convo_text": "y" * 15000}
+    m = store.metrics()
+    assert m["bytes"] <= 20000 and store.get(("3", "big")) is big
+    assert m["evictions"]["lru"] >= 3
+
+    store.pop(("3", "big"))
+    assert store.metrics()["entries"] == len(store) and store.metrics()["evictions"]["reset"] == 1
+
+
+def test_live_state_locks_are_per_session():
+    store = LiveStateStore()
+    _a, lock_a = store.get_or_create(("1", "a"))
+    b, lock_b = store.get_or_create(("1", "b"))
+    done = threading.Event()
+
+    def other_session():
+        with lock_b:
+            b["last_reco_ts"] = 1.0
+        done.set()
+
+    with lock_a:                       # holding one session's lock doesn't block another
+        t = threading.Thread(target=other_session)
+        t.start()
+        assert done.wait(2)
+    t.join()
+    assert b["last_reco_ts"] == 1.0
+
+
+def test_sqlite_live_state_is_shared_and_atomic_across_workers(tmp_path):
+    """Two backends on one WAL database (two workers): no lost updates, shared reads, sweep."""
+    from datetime import datetime, timedelta
+    from sqlalchemy import update
+    import models
+    from live_state import LiveSession, SQLiteLiveStateBackend, make_live_state_backend
+
+    url = f"sqlite:///{tmp_path / 'live.db'}"
+    worker_a = make_live_state_backend(url)
+    worker_b = SQLiteLiveStateBackend(models.make_engine(url), max_entries=2)
+    key = ("7", "conv-1")
+
+    def bump(backend, n):
+        live = LiveSession(backend, key)
+        for _ in range(n):
+            with live.transaction() as st:
+                hits = st["questions"].get("q", {}).get("hits", 0)
+                st["questions"]["q"] = {"question": "Any fever?", "hits": hits + 1}
+                st["history"].append({"role": "patient", "message": "x"})
+
+    threads = [threading.Thread(target=bump, args=(b, 25)) for b in (worker_a, worker_b) * 4]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    st = worker_b.get(key)
+    assert st["questions"]["q"]["hits"] == 200 and len(st["history"]) == 200
+    assert worker_a.metrics()["entries"] == 1 and worker_a.metrics()["bytes"] > 0
+
+    # an exception inside the transaction leaves the stored state untouched
+    try:
+        with LiveSession(worker_a, key).transaction() as st:
+            st["history"].clear()
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert len(worker_b.get(key)["history"]) == 200
+
+    # idle sessions and sessions beyond max_entries are swept
+    for cid in ("conv-2", "conv-3", "conv-4"):
+        with LiveSession(worker_b, ("7", cid)).transaction():
+            pass
+    with worker_b.engine.begin() as conn:
+        conn.execute(update(models.LiveSessionState)
+                     .where(models.LiveSessionState.conversation_id == "conv-1")
+                     .values(updated_at=datetime.utcnow() - timedelta(days=1)))
+    assert worker_b.sweep() == 2
+    assert worker_a.get(key) is None and worker_b.metrics()["entries"] == 2
+
+    LiveSession(worker_a, ("7", "conv-4")).reset()
+    assert worker_b.get(("7", "conv-4")) is None
+    worker_a.engine.dispose()
+    worker_b.engine.dispose()
@@ -31,3 +31,242 @@ def test_create_conversation_persists_in_db():
     ids = {c.id for c in conversations}
     assert cid in ids
 
+
+
+def test_message_writer_batches_rows_and_falls_back_when_full(tmp_path):
+    """Queued rows land in a few bulk transactions; a full queue writes synchronously."""
+    from datetime import datetime
+    from sqlalchemy import create_engine, func, select
+    from models import Base, Message, MessageWriter
+
+    eng = create_engine(f"sqlite:///{tmp_path / 'writer.db'}", future=True)
+    Base.metadata.create_all(eng)
+
+    def row(i):
+        return {"id": f"m{i}", "conversation_id": "c1", "role": "patient", "type": "message",
+                "message": f"hello {i}", "timestamp": "00:00:00", "created_at": datetime.utcnow()}
+
+    writer = MessageWriter(bind=eng, flush_interval_ms=50, max_rows=100, max_queue=1000).start()
+    for i in range(250):
+        assert writer.submit(row(i))
+    assert writer.flush(timeout=5.0)
+    with eng.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Message.__table__)).scalar() == 250
+    m = writer.metrics()
+    assert m["written"] == 250 and m["batches"] <= 10 and m["depth"] == 0
+
+    # Not started + capacity 1: second row can't queue, so it is written inline
+    small = MessageWriter(bind=eng, max_queue=1)
+    assert small.submit(row(1000)) is True
+    assert small.submit(row(1001)) is False
+    small.stop()
+    with eng.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Message.__table__)).scalar() == 252
+    assert small.metrics()["sync_writes"] == 1
+    writer.stop()
+
+
+def test_make_engine_applies_sqlite_profile_and_read_only(tmp_path):
+    """File DBs get WAL + pragmas; the reporting engine refuses writes."""
+    import pytest
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from models import Base, make_engine
+
+    url = f"sqlite:///{tmp_path / 'profile.db'}"
+    eng = make_engine(url)
+    Base.metadata.create_all(eng)
+    with eng.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2   # MEMORY
+
+    ro = make_engine(url, read_only=True)
+    with ro.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM conversations")).scalar() == 0
+        with pytest.raises(OperationalError):
+            conn.execute(text("INSERT INTO roles (name) VALUES ('x')"))
+    eng.dispose()
+    ro.dispose()
+
+
+def test_run_migrations_upgrades_legacy_db_once_and_rolls_back_failures(tmp_path, monkeypatch):
+    """Old-shaped DBs get columns + indexes; re-runs are no-ops; a failing step leaves nothing behind."""
+    import pytest
+    from sqlalchemy import inspect, text
+    import models
+
+    eng = models.make_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR(255) NOT NULL, "
+                          "password_hash VARCHAR(255) NOT NULL, is_active BOOLEAN, email_verified BOOLEAN, "
+                          "created_at DATETIME)"))
+        conn.execute(text("CREATE TABLE roles (id INTEGER PRIMARY KEY, name VARCHAR(32) NOT NULL UNIQUE)"))
+        conn.execute(text("CREATE TABLE user_roles (user_id INTEGER, role_id INTEGER)"))
+        conn.execute(text("CREATE TABLE conversations (id VARCHAR PRIMARY KEY, created_at DATETIME, "
+                          "owner_user_id INTEGER)"))
+        conn.execute(text("CREATE TABLE messages (id VARCHAR PRIMARY KEY, conversation_id VARCHAR, role VARCHAR, "
+                          "type VARCHAR, message TEXT, timestamp VARCHAR, created_at DATETIME)"))
+
+    assert models.run_migrations(eng) == [v for v, _n, _f in models.MIGRATIONS]
+    insp = inspect(eng)
+    assert "username" in {c["name"] for c in insp.get_columns("users")}
+    assert "patient_id" in {c["name"] for c in insp.get_columns("conversations")}
+    assert "patients" in insp.get_table_names()
+    assert {"ix_messages_conversation_created", "ix_messages_conversation_role_created"} <= {
+        ix["name"] for ix in insp.get_indexes("messages")}
+    assert models.run_migrations(eng) == []
+    version = models.current_schema_version(eng)
+
+    def _broken(conn):
+        conn.execute(text("CREATE INDEX ix_half_done ON messages (type)"))
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(models, "MIGRATIONS", models.MIGRATIONS + [(version + 1, "broken", _broken)])
+    with pytest.raises(RuntimeError):
+        models.run_migrations(eng)
+    assert models.current_schema_version(eng) == version
+    assert "ix_half_done" not in {ix["name"] for ix in inspect(eng).get_indexes("messages")}
+    eng.dispose()
+
+
+def test_query_plans_use_composite_indexes_on_1m_messages(tmp_path):
+    """EXPLAIN QUERY PLAN for the hot query shapes on a 1M-message database."""
+    from sqlalchemy import text
+    import models
+
+    eng = models.make_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    models.Base.metadata.create_all(eng)
+    models.run_migrations(eng)
+    with eng.begin() as conn:
+        conn.execute(text(
+            "WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < 9999) "
+            "INSERT INTO conversations (id, created_at, owner_user_id) "
+            "SELECT 'c' || i, datetime('2024-01-01', '+' || i || ' minutes'), i % 50 FROM n"))
+        conn.execute(text(
+            "WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < 999999) "
+            "INSERT INTO messages (id, conversation_id, role, type, message, timestamp, created_at) "
+            "SELECT 'm' || i, 'c' || (i % 10000), CASE i % 3 WHEN 0 THEN 'patient' WHEN 1 THEN 'clinician' "
+            "ELSE 'Question Recommender' END, 'message', 'msg', '00:00:00', "
+            "datetime('2024-01-01', '+' || i || ' seconds') FROM n"))
+        conn.execute(text("ANALYZE"))
+
+    def plan(sql):
+        with eng.connect() as conn:
+            return " | ".join(str(r[-1]) for r in conn.execute(text("EXPLAIN QUERY PLAN " + sql)))
+
+    shapes = {
+        "ix_conversations_owner_created":
+            "SELECT id FROM conversations WHERE owner_user_id = 7 ORDER BY created_at DESC, id DESC LIMIT 50",
+        "ix_messages_conversation_created":
+            "SELECT id FROM messages WHERE conversation_id = 'c42' ORDER BY created_at DESC, id DESC LIMIT 100",
+        "ix_messages_conversation_role_created":
+            "SELECT message FROM messages WHERE conversation_id = 'c42' AND role = 'patient' ORDER BY created_at",
+    }
+    for index, sql in shapes.items():
+        p = plan(sql)
+        assert index in p, p
+        assert "TEMP B-TREE" not in p, p
+    eng.dispose()
+
+
+def test_admin_counters_follow_writes_and_reconcile_drift(tmp_path):
+    """Triggers keep the dashboard rollups exact; a full recount repairs tampering."""
+    from datetime import datetime
+    from sqlalchemy import text, update
+    import models
+
+    eng = models.make_engine(f"sqlite:///{tmp_path / 'counters.db'}")
+    models.Base.metadata.create_all(eng)
+    models.run_migrations(eng)
+    now = datetime(2025, 3, 1, 9, 30)
+    with eng.begin() as conn:
+        conn.execute(models.Role.__table__.insert(), [{"id": 1, "name": "clinician"}, {"id": 2, "name": "admin"}])
+        conn.execute(models.User.__table__.insert(), [
+            {"id": i, "email": f"u{i}@x.org", "username": f"doc{i}", "password_hash": "x",
+             "is_active": True, "email_verified": True, "created_at": now} for i in (1, 2, 3)])
+        conn.execute(models.user_roles.insert(), [
+            {"user_id": 1, "role_id": 1}, {"user_id": 2, "role_id": 1}, {"user_id": 3, "role_id": 2}])
+        conn.execute(models.Conversation.__table__.insert(), [
+            {"id": "a", "created_at": now, "owner_user_id": 1},
+            {"id": "b", "created_at": now, "owner_user_id": 1},
+            {"id": "c", "created_at": datetime(2025, 3, 2), "owner_user_id": 2}])
+        conn.execute(models.Message.__table__.insert(), [
+            {"id": f"m{i}", "conversation_id": "abc"[i % 3], "role": role, "type": typ, "created_at": now}
+            for i, (role, typ) in enumerate([("patient", "message"), ("clinician", "message"),
+                                             ("Question Recommender", "question_recommender"),
+                                             ("patient", "message"), (None, "message")])])
+        conn.execute(text("DELETE FROM messages WHERE id = 'm3'"))
+        conn.execute(text("UPDATE conversations SET owner_user_id = 2 WHERE id = 'b'"))
+
+    summary = models.read_admin_summary(eng)
+    assert summary["incremental"] and summary["reconciled_at"] is not None
+    assert summary["counters"] == {
+        "users": 3, "clinicians": 2, "admins": 1, "conversations": 3, "messages": 4,
+        "messages_patient": 1, "messages_clinician": 1, "messages_recommended": 1,
+    }
+    assert summary["per_day"] == [("2025-03-01", 2), ("2025-03-02", 1)]
+    assert [(r.username, r.value) for r in summary["top_clinicians"]] == [("doc2", 2), ("doc1", 1)]
+
+    with eng.begin() as conn:
+        conn.execute(update(models.admin_counters).where(models.admin_counters.c.name == "messages").values(value=99))
+    assert models.reconcile_admin_counters(eng) == {"messages": (99, 4)}
+    assert models.read_admin_summary(eng)["counters"]["messages"] == 4
+    assert models.reconcile_admin_counters(eng) == {}
+    eng.dispose()
+
+
+def test_patient_identifiers_unique_under_concurrent_allocation(tmp_path, monkeypatch):
+    """Many threads creating patients at once get distinct, gapless P### identifiers."""
+    import threading
+    import pytest
+    from sqlalchemy import select, text
+    from sqlalchemy.exc import IntegrityError
+    import models
+
+    eng = models.make_engine(f"sqlite:///{tmp_path / 'patients.db'}")
+    # legacy rows: a racy duplicate and a hand-entered P007 the sequence must skip past
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE patients (id INTEGER PRIMARY KEY, identifier VARCHAR(64) NOT NULL, "
+                          "display_name VARCHAR(255), clinician_id INTEGER, created_at DATETIME)"))
+        conn.execute(text("INSERT INTO patients (id, identifier) VALUES (1, 'P001'), (2, 'P001'), (3, 'P007')"))
+    models.Base.metadata.create_all(eng)
+    models.run_migrations(eng)
+    with eng.connect() as conn:
+        assert conn.execute(text("SELECT identifier FROM patients WHERE id = 2")).scalar() == "P001-2"
+    monkeypatch.setattr(models, "engine", eng)
+    monkeypatch.setattr(models, "SessionLocal", models.scoped_session(models.sessionmaker(bind=eng)))
+    assert models.get_next_global_patient_identifier() == "P008"
+
+    threads_n, per_thread = 16, 10
+    made, errors = [], []
+    start = threading.Barrier(threads_n)
+
+    def worker(i):
+        start.wait()
+        try:
+            for _ in range(per_thread):
+                made.append(models.allocate_patient(clinician_id=i)[1])
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(threads_n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(made) == len(set(made)) == threads_n * per_thread
+    assert sorted(made) == [f"P{n:03d}" for n in range(8, 8 + threads_n * per_thread)]
+    with eng.connect() as conn:
+        idents = conn.execute(select(models.Patient.identifier)).scalars().all()
+    assert len(idents) == len(set(idents))
+
+    # explicit identifiers: duplicates are rejected, a higher P### moves the sequence on
+    with pytest.raises(IntegrityError):
+        models.create_patient(identifier="P007")
+    models.create_patient(identifier="P500")
+    assert models.allocate_patient()[1] == "P501"
+    eng.dispose()
@@ -142,3 +142,253 @@ def test_update_conversation_patient_then_list_shows_label():
     plabels = _build_patient_labels(patients)
     label = _patient_label_for_conversation(c, plabels)
     assert label == "Patient 1" or label == "Patient 2", f"Expected numbered label, got {label!r}"
+
+
+def test_conversation_summaries_single_query_with_cursor_pages():
+    """History list: counts + first-message preview in one SELECT per page, empty convos skipped."""
+    from sqlalchemy import event
+    import models
+    from models import list_conversation_summaries_for_user, log_message
+
+    init_db()
+    db = SessionLocal()
+    try:
+        u = User(email="summary_test@example.com", username="summary_test_user",
+                 password_hash="fake", email_verified=False)
+        db.add(u)
+        db.commit()
+        user_id = u.id
+    finally:
+        db.close()
+
+    cids = [create_conversation(owner_user_id=user_id) for _ in range(4)]
+    create_conversation(owner_user_id=user_id)  # stays empty
+    for n, cid in enumerate(cids):
+        log_message(cid, "patient", f"first message of {n} " + "x" * 100, "00:00:00")
+        for i in range(n):
+            log_message(cid, "clinician", f"reply {i}", "00:00:01")
+
+    statements = []
+
+    def _count(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append(statement)
+
+    event.listen(models.engine, "before_cursor_execute", _count)
+    try:
+        page1, cursor = list_conversation_summaries_for_user(user_id, limit=3)
+        page2, cursor2 = list_conversation_summaries_for_user(user_id, limit=3, cursor=cursor)
+    finally:
+        event.remove(models.engine, "before_cursor_execute", _count)
+
+    assert len(statements) == 2
+    assert cursor and cursor2 is None
+    rows = page1 + page2
+    assert [r["id"] for r in rows] == list(reversed(cids))  # newest first, no empty conversation
+    by_id = {r["id"]: r for r in rows}
+    for n, cid in enumerate(cids):
+        assert by_id[cid]["message_count"] == n + 1
+        assert by_id[cid]["first_message"].startswith(f"first message of {n} ")
+        assert len(by_id[cid]["first_message"]) == models.CONVERSATION_PREVIEW_CHARS + 1
+
+
+def test_conversation_messages_keyset_pages():
+    """Transcript pages: newest page first, "load older" walks back, forward reads match, index used."""
+    import pytest
+    from sqlalchemy import text
+    import models
+    from models import (
+        get_conversation_messages_page,
+        iter_conversation_messages,
+        count_conversation_messages,
+        log_message,
+    )
+
+    init_db()
+    cid = create_conversation()
+    for i in range(7):
+        log_message(cid, "patient" if i % 2 else "clinician", f"m{i}", "00:00:00")
+    expected = [f"m{i}" for i in range(7)]
+
+    newest, older = get_conversation_messages_page(cid, limit=3)
+    assert [m.message for m in newest] == expected[4:]
+    mid, older2 = get_conversation_messages_page(cid, limit=3, before=older)
+    assert [m.message for m in mid] == expected[1:4]
+    oldest, older3 = get_conversation_messages_page(cid, limit=3, before=older2)
+    assert [m.message for m in oldest] == expected[:1] and older3 is None
+
+    forward, nxt = get_conversation_messages_page(cid, limit=4, from_start=True)
+    rest, end = get_conversation_messages_page(cid, limit=4, after=nxt)
+    assert [m.message for m in forward + rest] == expected and end is None
+    assert [m.message for m in iter_conversation_messages(cid, batch_size=2)] == expected
+    assert count_conversation_messages(cid) == 7
+
+    with pytest.raises(ValueError):
+        get_conversation_messages_page(cid, before="not-a-cursor")
+
+    with models.engine.connect() as conn:
+        plan = " ".join(str(r[-1]) for r in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM messages WHERE conversation_id = :c "
+            "ORDER BY created_at DESC, id DESC LIMIT 4"), {"c": cid}))
+    assert "ix_messages_conversation_created" in plan and "TEMP B-TREE" not in plan
+
+
+def test_history_detail_renders_newest_page_and_cursor_loads_older(monkeypatch):
+    """/history/<id> shows the newest page; its load-older cursor fetches the page before it."""
+    import re
+    import pytest
+    from models import log_message
+
+    app_module = pytest.importorskip("app")
+    monkeypatch.setattr(app_module, "MESSAGE_PAGE_DEFAULT", 3)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        u = User(email="detail_test@example.com", username="detail_test_user",
+                 password_hash="fake", email_verified=False)
+        db.add(u)
+        db.commit()
+        user_id = u.id
+    finally:
+        db.close()
+    cid = create_conversation(owner_user_id=user_id)
+    for i in range(5):
+        log_message(cid, "patient", f"detail message {i}", "00:00:00")
+
+    flask_app = app_module.app
+    flask_app.config["TESTING"] = True
+    client = flask_app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+
+    page = client.get(f"/history/{cid}")
+    assert page.status_code == 200
+    html = page.get_data(as_text=True)
+    assert "detail message 1" not in html and "detail message 4" in html
+    btn = re.search(r'id="load-older-btn"\s+data-cursor="([^"]+)" data-page-size="(\d+)"', html)
+    assert btn and btn.group(2) == "3"
+
+    older = client.get(f"/api/conversations/{cid}/messages",
+                       query_string={"limit": btn.group(2), "before": btn.group(1)}).get_json()
+    assert [m["message"] for m in older["messages"]] == ["detail message 0", "detail message 1"]
+    assert older["older_cursor"] is None
+
+
+def test_symptoms_tagged_on_ingest_backfilled_and_tallied():
+    """Patient messages land in message_symptoms at log time; old rows via backfill; tallies filter."""
+    from datetime import datetime, timedelta
+    import models
+    from models import (
+        log_message,
+        Message,
+        MessageSymptom,
+        backfill_message_symptoms,
+        symptom_backfill_pending,
+        symptom_tallies,
+        delete_conversation_by_id,
+    )
+
+    init_db()
+    db = SessionLocal()
+    try:
+        u = User(email="symptoms_test@example.com", username="symptoms_test_user",
+                 password_hash="fake", email_verified=False)
+        db.add(u)
+        db.commit()
+        user_id = u.id
+    finally:
+        db.close()
+
+    c1 = create_conversation(owner_user_id=user_id)
+    c2 = create_conversation(owner_user_id=user_id)
+    log_message(c1, "patient", "Fever since Monday, and a cough. The fever is worse at night.", "00:00:01")
+    log_message(c1, "clinician", "Any fever or headache?", "00:00:02")   # not a patient utterance
+    log_message(c2, "patient", "Just a headache", "00:00:03")
+
+    # A message from before tagging existed
+    db = SessionLocal()
+    try:
+        db.add(Message(id="legacy-symptom-msg", conversation_id=c2, role="Patient",
+                       message="some dyspnea and a cough", created_at=datetime.utcnow()))
+        db.commit()
+    finally:
+        db.close()
+    assert symptom_backfill_pending()
+    assert backfill_message_symptoms() >= 1
+    assert not symptom_backfill_pending()
+
+    t = symptom_tallies(clinician_id=user_id)
+    assert dict(t["global"]) == {"fever": 2, "cough": 2, "headache": 1, "shortness of breath": 1}
+    assert t["total"] == 2
+    per_conv = {c.id: dict(s) for c, s in t["conversations"]}
+    assert per_conv[c1] == {"fever": 2, "cough": 1}
+    assert per_conv[c2] == {"headache": 1, "cough": 1, "shortness of breath": 1}
+
+    page2 = symptom_tallies(clinician_id=user_id, page=2, size=1)
+    assert len(page2["conversations"]) == 1 and page2["total"] == 2
+    future = datetime.utcnow() + timedelta(days=1)
+    assert symptom_tallies(clinician_id=user_id, start=future)["global"] == []
+
+    delete_conversation_by_id(c1)
+    db = SessionLocal()
+    try:
+        assert db.query(MessageSymptom).filter(MessageSymptom.conversation_id == c1).count() == 0
+    finally:
+        db.close()
+    assert models.symptom_tallies(clinician_id=user_id)["total"] == 1
+
+
+def test_patient_ordinals_one_query_cached_and_invalidated():
+    """'Patient N' maps for many clinicians in one windowed query, cached until create_patient."""
+    from sqlalchemy import event
+    import models
+    from models import patient_ordinals, invalidate_patient_ordinals, Patient
+
+    init_db()
+    db = SessionLocal()
+    try:
+        users = [User(email=f"ordinal{i}@example.com", username=f"ordinal_user_{i}",
+                      password_hash="fake", email_verified=False) for i in range(3)]
+        db.add_all(users)
+        db.commit()
+        uids = [u.id for u in users]
+    finally:
+        db.close()
+    p = {uid: [create_patient(identifier=f"O{uid}-{k}", clinician_id=uid) for k in range(uid % 3 + 1)]
+         for uid in uids}
+
+    statements = []
+
+    def _count(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    invalidate_patient_ordinals()
+    event.listen(models.engine, "before_cursor_execute", _count)
+    try:
+        first = patient_ordinals(uids)
+        again = patient_ordinals(uids, [p[uids[0]][0]])
+    finally:
+        event.remove(models.engine, "before_cursor_execute", _count)
+    assert len(statements) == 1 and "ROW_NUMBER" in statements[0].upper()
+    assert first == again
+    for uid in uids:
+        assert first[uid] == {pid: n + 1 for n, pid in enumerate(p[uid])}
+
+    # create_patient drops that clinician's map
+    new_pid = create_patient(identifier="O-new", clinician_id=uids[0])
+    assert patient_ordinals([uids[0]])[uids[0]][new_pid] == len(p[uids[0]]) + 1
+
+    # a patient added behind the cache's back (another worker) is picked up on demand
+    db = SessionLocal()
+    try:
+        ghost = Patient(identifier="O-ghost", clinician_id=uids[1])
+        db.add(ghost)
+        db.commit()
+        ghost_id = ghost.id
+    finally:
+        db.close()
+    assert ghost_id not in patient_ordinals([uids[1]])[uids[1]]
+    assert patient_ordinals([uids[1]], [ghost_id])[uids[1]][ghost_id] == len(p[uids[1]]) + 1
@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from question_matcher import EmbeddingMatcher, add_question, ensure_index, match_asked
+
+
+def _state():
+    return {"questions": {}, "history": []}
+
+
+def test_matcher_indexes_plan_and_marks_phrase_and_overlap_matches():
+    st = _state()
+    for q in ("Do you have a cough?", "How long have you had the fever?",
+              "Any blood in your stool?", "Do you have a cough?"):
+        add_question(st, q, "t0")
+    assert len(st["questions"]) == 3
+    assert st["q_index"]["cough"] == ["do you have a cough"]
+
+    # nothing shared -> nothing checked or marked
+    assert match_asked(st, "Habari za asubuhi") == ([], [])
+
+    # phrase contained in the transcript
+    asked, _ = match_asked(st, "Okay. Do you have a cough? Sometimes at night")
+    assert asked == ["do you have a cough"] and st["questions"]["do you have a cough"]["asked"]
+    assert "cough" not in st["q_index"]                   # asked questions leave the index
+
+    # enough overlapping tokens, reworded
+    asked, _ = match_asked(st, "how long has the fever been there")
+    assert asked == ["how long have you had the fever"]
+
+    # a partial word is not a phrase match ("stool" != "stools" and too little overlap)
+    asked, near = match_asked(st, "blood in stools")
+    assert asked == [] and near == [("any blood in your stool", "Any blood in your stool?")]
+
+    # survives a JSON round trip (shared live-state backends) and old states get an index
+    st = json.loads(json.dumps(st))
+    legacy = {"questions": {nq: {k: v for k, v in q.items() if k != "tokens"}
+                            for nq, q in st["questions"].items()}}
+    assert ensure_index(legacy) == st["q_index"]
+
+
+class _Model:
+    """Bag-of-words 'embedding' with a call log, standing in for MiniLM."""
+
+    VOCAB = ["blood", "stool", "stools", "poo", "bleeding", "cough", "fever"]
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, normalize_embeddings=True, show_progress_bar=False):
+        self.encoded.extend(texts)
+        out = []
+        for t in texts:
+            words = t.lower().split()
+            v = np.array([float(any(w.startswith(x) or x.startswith(w) for w in words)) for x in self.VOCAB]) + 1e-6
+            out.append(v / np.linalg.norm(v))
+        return np.array(out)
+
+
+def test_embedding_matcher_checks_candidates_and_caches_question_vectors():
+    model = _Model()
+    m = EmbeddingMatcher(model, threshold=0.7)
+    near = [("any blood in your stool", "Any blood in your stool?")]
+    assert m.matches("blood stools", near) == ["any blood in your stool"]
+    assert m.matches("fever", near) == []
+    assert model.encoded.count("any blood in your stool") == 1
+    assert m.matches("anything", []) == [] and "anything" not in model.encoded
@@ -0,0 +1,485 @@
+"""
+Tests for the live STT engine (no network: Gemini and Whisper are stubbed).
+
+Run:
+  pytest tests/test_stt_gemini.py -v
+"""
+import os
+import sys
+import threading
+import time
+
+from google.genai import errors as genai_errors
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import stt_gemini
+from stt_gemini import STTDispatcher, GeminiWorker, CircuitBreaker
+
+
+def _drain(worker, n, want_type="final", timeout=2.0):
+    out = []
+    deadline = time.time() + timeout
+    while len(out) < n and time.time() < deadline:
+        evt = worker.get_event(timeout=0.02)
+        if evt and evt["type"] == want_type:
+            out.append(evt)
+    return out
+
+
+def test_dispatcher_keeps_per_session_order_and_shares_pool(monkeypatch):
+    """Many sessions share a small pool; each session's finals arrive in submit order."""
+    seen_threads = set()
+
+    def fake_transcribe(worker, client, pcm, lang):
+        seen_threads.add(threading.current_thread().name)
+        time.sleep(0.005)
+        worker._emit_final(text=pcm.decode(), engine="stub")
+
+    monkeypatch.setattr(stt_gemini, "_transcribe_segment", fake_transcribe)
+    monkeypatch.setattr(stt_gemini._GeminiClientPool, "get", lambda self: object())
+
+    d = STTDispatcher(pool_size=2, client_pool_size=1, max_pending=16, backpressure_depth=16, use_async=False)
+    workers = [GeminiWorker(dispatcher=d) for _ in range(5)]
+    for i in range(4):
+        for w_i, w in enumerate(workers):
+            w.submit(f"{w_i}-{i}".encode(), "english")
+
+    for w_i, w in enumerate(workers):
+        finals = _drain(w, 4)
+        assert [e["text"] for e in finals] == [f"{w_i}-{i}" for i in range(4)]
+
+    assert len(seen_threads) <= 2
+    deadline = time.time() + 1.0
+    while d.metrics()["completed"] < 20 and time.time() < deadline:
+        time.sleep(0.01)
+    m = d.metrics()
+    assert m["completed"] == 20
+    assert m["queue_depth"] == 0
+    assert m["wait"]["count"] == 20
+
+
+def test_dispatcher_backpressure_and_drop(monkeypatch):
+    """A deep session queue emits STT_BACKPRESSURE, then drops the oldest segment when full."""
+    gate = threading.Event()
+
+    def blocking_transcribe(worker, client, pcm, lang):
+        gate.wait(2.0)
+        worker._emit_final(text=pcm.decode(), engine="stub")
+
+    monkeypatch.setattr(stt_gemini, "_transcribe_segment", blocking_transcribe)
+    monkeypatch.setattr(stt_gemini._GeminiClientPool, "get", lambda self: object())
+
+    d = STTDispatcher(pool_size=1, client_pool_size=1, max_pending=3, backpressure_depth=2, use_async=False)
+    w = GeminiWorker(dispatcher=d)
+    w.submit(b"in-flight", "english")
+    time.sleep(0.05)  # let the pool pick it up
+    for i in range(4):
+        w.submit(f"q{i}".encode(), "english")
+
+    codes = []
+    while True:
+        evt = w.get_event(timeout=0.01)
+        if not evt:
+            break
+        codes.append(evt.get("code"))
+    assert "STT_BACKPRESSURE" in codes
+    assert "STT_DROPPED" in codes
+    assert d.metrics()["dropped"] == 1
+
+    gate.set()
+    finals = [e["text"] for e in _drain(w, 4)]
+    assert finals == ["in-flight", "q1", "q2", "q3"]
+    w.close()
+
+
+class _FlakyAsyncModels:
+    """Stands in for client.aio.models: 503 for the first `fail` calls, then succeeds."""
+
+    def __init__(self, fail):
+        self.fail = fail
+        self.calls = 0
+
+    async def generate_content(self, model, contents, config):
+        self.calls += 1
+        if self.calls <= self.fail:
+            raise genai_errors.ServerError(503, {"error": {"code": 503, "message": "overloaded"}})
+        return type("Resp", (), {"text": f"ok from {model}"})()
+
+
+class _FakeAsyncClient:
+    def __init__(self, fail):
+        self.aio = type("Aio", (), {})()
+        self.aio.models = _FlakyAsyncModels(fail)
+
+
+def test_async_retry_backs_off_without_blocking_threads(monkeypatch):
+    """Async retry keeps on_retry semantics and runs every segment on the one loop thread."""
+    monkeypatch.setattr(stt_gemini, "_gemini_model_candidates", lambda: ["m1"])
+    loop = stt_gemini.get_stt_event_loop()
+    retries = []
+    client = _FakeAsyncClient(fail=2)
+
+    resp = loop.run(stt_gemini.gemini_generate_with_retry_async(
+        client, contents=[], config=None, base_delay=0.01, max_delay=0.02,
+        on_retry=lambda model, attempt, max_attempts, sleep_s: retries.append(attempt),
+    ))
+    assert resp.text == "ok from m1"
+    assert retries == [1, 2]
+
+    async def fake_transcribe_async(worker, client, pcm, lang):
+        await stt_gemini.asyncio.sleep(0.05)
+        worker._emit_final(text=threading.current_thread().name, engine="stub")
+
+    monkeypatch.setattr(stt_gemini, "_transcribe_segment_async", fake_transcribe_async)
+    monkeypatch.setattr(stt_gemini._GeminiClientPool, "get", lambda self: object())
+    d = STTDispatcher(max_pending=4, use_async=True)
+    workers = [GeminiWorker(dispatcher=d) for _ in range(50)]
+    threads_before = threading.active_count()
+    t0 = time.time()
+    for w in workers:
+        w.submit(b"x", "english")
+    finals = [_drain(w, 1) for w in workers]
+    assert all(f and f[0]["text"] == "stt-asyncio" for f in finals)
+    # 50 concurrent 50ms segments finish together instead of serially
+    assert time.time() - t0 < 1.5
+    assert threading.active_count() <= threads_before + 1
+
+
+class _OverloadedModels:
+    """Stands in for client.models (sync): always 503."""
+
+    def generate_content(self, model, contents, config):
+        raise genai_errors.ServerError(503, {"error": {"code": 503, "message": "overloaded"}})
+
+
+def test_retry_does_not_back_off_after_the_last_attempt(monkeypatch):
+    """A 503 on the final attempt falls through without paying another backoff."""
+    monkeypatch.setattr(stt_gemini, "_gemini_model_candidates", lambda: ["m-last"])
+    retries = []
+    client = _FakeAsyncClient(fail=5)
+    client.models = _OverloadedModels()
+
+    t0 = time.time()
+    try:
+        stt_gemini.gemini_generate_with_retry(
+            client, contents=[], config=None, max_attempts=1, base_delay=1.0,
+            on_retry=lambda *a: retries.append(a),
+        )
+    except genai_errors.ServerError:
+        pass
+    try:
+        stt_gemini.get_stt_event_loop().run(stt_gemini.gemini_generate_with_retry_async(
+            client, contents=[], config=None, max_attempts=2, base_delay=0.05, max_delay=0.05,
+            on_retry=lambda model, attempt, max_attempts, sleep_s: retries.append(attempt),
+        ))
+    except genai_errors.ServerError:
+        pass
+    assert retries == [1]                      # only the async path's first attempt backs off
+    assert time.time() - t0 < 0.5
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    """503s open the breaker; after the cooldown one half-open trial decides its fate."""
+    now = [0.0]
+    br = CircuitBreaker("m", window_s=30, min_calls=3, failure_rate=0.5, open_s=10,
+                        half_open_trials=1, clock=lambda: now[0])
+    for _ in range(3):
+        assert br.allow()
+        br.record_overload(500.0)
+    assert br.state == CircuitBreaker.OPEN
+    assert not br.allow()
+
+    now[0] += 10
+    assert br.allow()            # the single half-open trial
+    assert not br.allow()
+    br.record_overload(400.0)    # still failing -> open again
+    assert br.state == CircuitBreaker.OPEN
+
+    now[0] += 10
+    assert br.allow()
+    br.record_success(120.0)
+    assert br.state == CircuitBreaker.CLOSED
+    snap = br.snapshot()
+    assert snap["opens"] == 2 and snap["calls"] == 0
+
+
+def test_open_breaker_routes_segments_straight_to_local_whisper(monkeypatch):
+    """With every model short-circuited, a segment never reaches Gemini."""
+    monkeypatch.setattr(stt_gemini, "_gemini_model_candidates", lambda: ["down-model"])
+    monkeypatch.setattr(stt_gemini, "_local_fallback_ready", lambda: True)
+    monkeypatch.setattr(stt_gemini, "_whisper_transcribe_batch", lambda pcms, language: ["local text"] * len(pcms))
+    br = stt_gemini.get_circuit_breaker("down-model")
+    for _ in range(br.min_calls):
+        br.record_overload(1000.0)
+    assert br.state == CircuitBreaker.OPEN
+
+    class _ExplodingClient:
+        @property
+        def models(self):
+            raise AssertionError("Gemini must not be called while the breaker is open")
+
+    d = STTDispatcher(pool_size=1, use_async=False)
+    w = GeminiWorker(dispatcher=d)
+    t0 = time.time()
+    stt_gemini._transcribe_segment(w, _ExplodingClient(), b"\0\0" * 160, "english")
+    finals = _drain(w, 1, timeout=0.5)
+    assert finals[0]["engine"] == "local/faster-whisper"
+    assert time.time() - t0 < 0.5
+    w.close()
+
+
+def test_whisper_batcher_groups_concurrent_segments_by_language(monkeypatch):
+    """Segments from many sessions inside one window share a decode pass per language."""
+    calls = []
+
+    def fake_batch(pcms, language):
+        calls.append((language, len(pcms)))
+        return [f"{language}:{p.decode()}" for p in pcms]
+
+    monkeypatch.setattr(stt_gemini, "_whisper_transcribe_batch", fake_batch)
+    batcher = stt_gemini.WhisperBatchScheduler(window_ms=50, max_batch=4)
+    futs = [batcher.submit(f"s{i}".encode(), "english" if i % 2 else "swahili") for i in range(6)]
+    futs.append(batcher.submit(b"auto", "bilingual"))
+
+    results = [f.result(timeout=2) for f in futs]
+    assert results[:2] == ["sw:s0", "en:s1"]
+    assert results[-1] == "None:auto"
+    assert sorted(calls, key=str) == sorted([("en", 3), ("sw", 3), (None, 1)], key=str)
+    assert batcher.metrics()["largest_batch"] == 3
+
+
+def test_batched_decode_maps_segments_to_clips_by_time(monkeypatch):
+    """Equal segment/clip counts don't imply one per clip: attribution goes by timestamp."""
+    from types import SimpleNamespace
+
+    class _Pipeline:
+        def transcribe(self, audio, **kw):
+            (_a, b) = kw["clip_timestamps"]
+            # nothing heard in the first clip, two segments in the second
+            segs = [SimpleNamespace(start=b["start"] + 0.1, end=b["start"] + 0.4, text=" cough "),
+                    SimpleNamespace(start=b["start"] + 0.5, end=b["start"] + 0.9, text="at night")]
+            return iter(segs), None
+
+    monkeypatch.setattr(stt_gemini, "_get_whisper_model", lambda: object())
+    monkeypatch.setattr(stt_gemini, "_get_whisper_pipeline", lambda model: _Pipeline())
+    one_second = b"\x00\x00" * stt_gemini.WHISPER_SAMPLE_RATE
+    assert stt_gemini._whisper_transcribe_batch([one_second, one_second], "en") == ["", "cough at night"]
+
+
+def test_unbatched_local_decode_runs_off_the_calling_thread(monkeypatch):
+    caller = threading.get_ident()
+    monkeypatch.setattr(stt_gemini, "WHISPER_BATCHING", False)
+    monkeypatch.setattr(stt_gemini, "whisper_transcribe_pcm16", lambda pcm, lang: threading.get_ident())
+    assert stt_gemini.whisper_transcribe_async(b"\x00\x00", "english").result(timeout=2) != caller
+
+
+def _cat_proc():
+    import subprocess
+    return subprocess.Popen(["cat"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+
+
+def test_ffmpeg_pool_hands_out_prewarmed_decoders(monkeypatch):
+    """Pool keeps processes spawned ahead of time; a decoder streams bytes through one."""
+    monkeypatch.setattr(stt_gemini, "start_ffmpeg_decoder", _cat_proc)
+    pool = stt_gemini.FFmpegProcessPool(size=2)
+    deadline = time.time() + 2.0
+    while pool.metrics()["idle"] < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert pool.metrics()["idle"] == 2
+
+    dec = stt_gemini.FFmpegDecoder(pool.acquire())
+    assert pool.metrics()["hits"] == 1
+    payload = b"\x01\x02" * 4000
+    dec.feed(payload)
+    dec.close_input()
+    out = bytearray()
+    while not dec.finished and time.time() < deadline:
+        block = dec.read(timeout=0.1)
+        if block:
+            out += block
+    assert bytes(out) == payload
+    assert dec.first_pcm_at is not None
+    dec.close()
+
+
+def test_upload_decode_streams_in_memory_and_enforces_cap():
+    """Uploads are piped through the decoder into memory; oversize uploads kill the process."""
+    import io
+    payload = b"\x03\x04" * 50000
+    dec = stt_gemini.FFmpegDecoder(_cat_proc())
+    assert stt_gemini.decode_stream_to_pcm(io.BytesIO(payload), decoder=dec) == payload
+    assert dec.proc.poll() is not None
+
+    dec = stt_gemini.FFmpegDecoder(_cat_proc())
+    try:
+        stt_gemini.decode_stream_to_pcm(io.BytesIO(payload), max_input_bytes=1000, decoder=dec)
+    except stt_gemini.AudioTooLargeError:
+        pass
+    else:
+        raise AssertionError("expected AudioTooLargeError")
+    assert dec.proc.poll() is not None
+
+
+def test_batch_chunks_split_on_pauses_and_stitch_in_order(monkeypatch):
+    """Long uploads are cut inside pauses, transcribed concurrently and joined in order."""
+    frame = int(stt_gemini.SAMPLE_RATE * stt_gemini.VAD_FRAME_MS / 1000) * 2
+    # 3 "words" of 10 voiced frames separated by 10 silent frames, then trailing silence
+    flags = ([True] * 10 + [False] * 10) * 3 + [False] * 20
+    pcm = b"".join(bytes([i % 256]) * frame for i in range(len(flags)))
+    monkeypatch.setattr(stt_gemini, "_vad_frame_flags", lambda p, frame_ms=30: flags)
+
+    ms = stt_gemini.VAD_FRAME_MS
+    chunks = stt_gemini.split_pcm_on_vad(pcm, target_ms=10 * ms, max_ms=100 * ms, cut_silence_ms=4 * ms)
+    # cuts land mid-pause (frames 12 and 32); the all-silent tail is dropped
+    assert [c[0] for c in chunks] == [0, 12, 32]
+    assert [len(c) // frame for c in chunks] == [12, 20, 20]
+
+    async def fake_chunk(client, chunk, lang):
+        # later chunks finish first; output must still follow input order
+        idx = chunks.index(chunk)
+        await stt_gemini.asyncio.sleep(0.03 * (len(chunks) - idx))
+        return f"c{idx}"
+
+    monkeypatch.setattr(stt_gemini, "split_pcm_on_vad", lambda p: chunks)
+    monkeypatch.setattr(stt_gemini, "_transcribe_chunk_async", fake_chunk)
+    monkeypatch.setattr(stt_gemini, "_gemini_client", lambda: object())
+    t0 = time.time()
+    assert stt_gemini.gemini_transcribe_pcm(pcm, "english") == "c0 c1 c2"
+    assert time.time() - t0 < 0.15  # concurrent, not 0.18 s serial
+
+
+def test_partial_stitching_aligns_overlapping_windows():
+    stitch = stt_gemini.stitch_partial_text
+    # exact suffix/prefix overlap
+    assert stitch("I have had a cough", "had a cough for two weeks") == "I have had a cough for two weeks"
+    # window cut clipped the first word; newer hypothesis revises the tail
+    assert stitch("pain in my chest when I bread", "est when I breathe at night") == \
+        "pain in my chest when I breathe at night"
+    # punctuation/case differences don't break alignment
+    assert stitch("Nina homa,", "homa na kikohozi") == "Nina homa, na kikohozi"
+    # nothing in common: append
+    assert stitch("hello", "doctor") == "hello doctor"
+
+    eng = stt_gemini.PartialsEngine(window_ms=1000, min_interval_ms=0, min_ms=100)
+    seg = b"\x00\x00" * stt_gemini.SAMPLE_RATE * 3
+    window, full = eng.next_window(seg, now=1.0)
+    assert len(window) == stt_gemini.SAMPLE_RATE * 2 and not full
+    gen = eng.generation
+    eng.merge(gen, "one two three", full=True)
+    assert eng.merge(gen, "three four", full=False) == "one two three four"
+    eng.reset()
+    assert eng.merge(gen, "late result", full=False) is None  # stale generation
+
+
+def test_newer_partials_supersede_queued_ones(monkeypatch):
+    """Only the newest queued partial is transcribed; a final drops any waiting partial."""
+    gate = threading.Event()
+    ran = []
+
+    def fake_transcribe(worker, client, pcm, lang):
+        gate.wait(2.0)
+        ran.append(("final", pcm))
+        worker._emit_final(text=pcm.decode(), engine="stub")
+
+    def fake_partial(worker, client, job):
+        ran.append(("partial", job.pcm))
+        worker._emit_partial(text=job.pcm.decode(), engine="stub")
+
+    monkeypatch.setattr(stt_gemini, "_transcribe_segment", fake_transcribe)
+    monkeypatch.setattr(stt_gemini, "_transcribe_partial", fake_partial)
+    monkeypatch.setattr(stt_gemini._GeminiClientPool, "get", lambda self: object())
+    d = STTDispatcher(pool_size=1, max_pending=8, use_async=False)
+    w = GeminiWorker(dispatcher=d)
+
+    w.submit(b"f0", "english")           # occupies the session while we queue partials
+    time.sleep(0.05)
+    for i in range(3):
+        w.submit_partial(f"p{i}".encode(), "english")
+    assert d.metrics()["partials_superseded"] == 2
+    gate.set()
+    assert [e["text"] for e in _drain(w, 1, want_type="partial")] == ["p2"]
+
+    gate.clear()
+    w.submit(b"f1", "english")
+    time.sleep(0.05)
+    w.submit_partial(b"p3", "english")
+    w.finalize_utterance(b"f2", "english")  # p3 is for the finished utterance
+    gate.set()
+    assert [e["text"] for e in _drain(w, 2)] == ["f1", "f2"]
+    assert ran == [("final", b"f0"), ("partial", b"p2"), ("final", b"f1"), ("final", b"f2")]
+    w.close()
+
+
+def test_segment_traces_feed_stage_histograms(monkeypatch):
+    """A segment's trace covers queue wait, provider attempts and the socket send."""
+    monkeypatch.setattr(stt_gemini, "_gemini_model_candidates", lambda: ["m-trace"])
+    monkeypatch.setattr(stt_gemini, "_STT_METRICS", stt_gemini.STTMetrics())
+
+    class _Models:
+        calls = 0
+
+        def generate_content(self, model, contents, config):
+            _Models.calls += 1
+            if _Models.calls == 1:
+                raise genai_errors.ServerError(503, {"error": {"message": "overloaded"}})
+            return type("R", (), {"text": "habari"})()
+
+    client = type("C", (), {"models": _Models()})()
+    monkeypatch.setattr(stt_gemini._GeminiClientPool, "get", lambda self: client)
+    monkeypatch.setattr(stt_gemini, "_build_segment_contents", lambda pcm, lang: [])
+    d = STTDispatcher(pool_size=1, use_async=False)
+    w = GeminiWorker(dispatcher=d)
+    w.finalize_utterance(b"\x00\x01" * 800, "swahili", voiced_ratio=0.9, buffer_ms=1500.0)
+
+    evt = _drain(w, 1)[0]
+    assert evt["text"] == "habari" and evt["seg"]
+    metrics = stt_gemini.get_stt_metrics()
+    metrics.mark_sent(evt["seg"], 0.4, evt["type"])
+    w.close()
+
+    snap = metrics.snapshot()
+    trace = snap["recent"][-1]
+    assert trace["segment_id"] == evt["seg"]
+    assert trace["model"] == "m-trace" and trace["attempts"] == 2 and trace["outcome"] == "ok"
+    assert trace["voiced_ratio"] == 0.9 and trace["end_to_end_ms"] is not None
+    for stage in ("vad_buffer", "queue_wait", "provider", "end_to_end"):
+        assert snap["histograms"][f"{stage}:final"]["count"] == 1
+    assert snap["histograms"]["ws_send:final"]["buckets"]["25"] == 1
+
+    text = metrics.prometheus_text()
+    assert 'stt_stage_latency_ms_bucket{stage="end_to_end",kind="final",le="+Inf"} 1' in text
+    assert 'outcome="ok"} 1' in text
+
+
+def test_live_segmenter_cuts_on_pauses_with_audio_clock():
+    """The shared segmenter makes the same cuts however fast audio is pushed."""
+    import numpy as np
+
+    class _Recorder:
+        partials = stt_gemini.PartialsEngine()
+
+        def __init__(self):
+            self.finals = []
+
+        def finalize_utterance(self, pcm, lang, **trace_fields):
+            if pcm is not None:
+                self.finals.append((len(pcm), trace_fields))
+
+    sr = stt_gemini.SAMPLE_RATE
+    t = np.arange(int(sr * 1.5)) / sr
+    burst = 0.3 * np.sin(2 * np.pi * 4 * t) ** 2 * (np.sin(2 * np.pi * 150 * t) + 0.4 * np.sin(2 * np.pi * 1250 * t))
+    audio = np.concatenate([burst, np.zeros(int(sr * 1.5)), burst, np.zeros(int(sr * 1.5))])
+    pcm = (audio * 32767).astype(np.int16).tobytes()
+
+    rec = _Recorder()
+    seg = stt_gemini.LiveSegmenter(rec, "english", emit_partials=False, audio_clock=True)
+    step = stt_gemini.PCM_READ_CHUNK_BYTES
+    for i in range(0, len(pcm), step):
+        seg.push(pcm[i:i + step])  # unpaced: ~6 s of audio in well under a second
+    seg.flush()
+    assert seg.finals_submitted == 2
+    assert all(f[1]["voiced_ratio"] >= 0.15 for f in rec.finals)
+    assert abs(seg.audio_s - 6.0) < 0.01
@@ -0,0 +1,43 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from symptoms import TAGGER, extract_symptoms, extract_symptoms_many
+
+
+def test_longest_match_non_overlapping_and_synonyms():
+    assert extract_symptoms("Chest pain, then more pain. Also SOB and chest tightness") == {
+        "chest pain": 2, "pain": 1, "shortness of breath": 1,
+    }
+    assert extract_symptoms("back-pain and weightloss") == {"back pain": 1, "weight loss": 1}
+    assert extract_symptoms("") == {}
+
+
+def test_swahili_phrases_map_to_canonical_names():
+    assert extract_symptoms("Nina maumivu ya kichwa na homa, pia kikohozi") == {
+        "headache": 1, "fever": 1, "cough": 1,
+    }
+    # "maumivu ya tumbo" wins over bare "maumivu"
+    assert extract_symptoms("maumivu ya tumbo") == {"abdominal pain": 1}
+
+
+def test_negation_scope_stops_at_clause_breaks():
+    t = TAGGER.tag("No fever or cough, but a headache. Denies nausea; vomiting twice")
+    assert t.counts == {"headache": 1, "vomiting": 1}
+    assert t.negated == {"fever": 1, "cough": 1, "nausea": 1}
+
+    t = TAGGER.tag("sina homa wala kikohozi lakini kizunguzungu")
+    assert t.counts == {"dizziness": 1}
+    assert t.negated == {"fever": 1, "cough": 1}
+
+    # cue too far back to apply
+    assert extract_symptoms("no, it has been a long week with fever") == {"fever": 1}
+    assert extract_symptoms("no complaints until today when the fever started") == {"fever": 1}
+
+
+def test_batch_matches_single_calls():
+    texts = ["fever", "no fever", "homa na kikohozi", None, "pain"]
+    assert extract_symptoms_many(texts) == [extract_symptoms(t) for t in texts]